@@ -0,0 +1,230 @@
+"""
+In-process cost of one chat turn, with a zero-latency fake model.
+
+Cases, each timed per operation:
+  - session history lookup (existing and new sessions)
+  - message object creation
+  - ChatPromptTemplate formatting for growing histories
+  - the agent chain (trim + prompt + model) without history handling
+  - RunnableWithMessageHistory around the same chain
+  - AgentBase.chat_with_history and astream_with_history, the full turn
+  - logging a reply, and a call filtered out by level
+History sizes are set with --history (messages already in the session).
+
+Results can be written as JSON with --output and compared with an earlier run with
+--compare, which exits non-zero when a case got slower than --threshold.
+
+Usage:
+    python benchmarks/agent_hot_path_bench.py [--history 0,10,50,200] [--repeat 200]
+        [--output hot_path.json] [--compare baseline.json --threshold 0.2]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+CALLER_DIR = os.getcwd()
+sys.path.insert(0, SRC_DIR)
+# Prompt and content paths are relative to src, as when running the app
+os.chdir(SRC_DIR)
+os.environ.setdefault("RESPONSE_CACHE", "false")
+os.environ.setdefault("MODEL_HEDGING", "false")
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+import azure_openai
+from utils.logger import LOG, log_format
+
+REPLY = "That's a great answer! Let's try another sentence with the past tense. " * 3
+
+
+class InstantChatModel(BaseChatModel):
+    """Fake model answering immediately, streamed in a few chunks"""
+
+    @property
+    def _llm_type(self):
+        return "instant"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=REPLY))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for word in REPLY.split(" ")[:8]:
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+
+
+def conversation(length):
+    messages = []
+    for turn in range(length // 2):
+        messages.append(HumanMessage(content=f"Learner message number {turn}, practising English."))
+        messages.append(AIMessage(content=REPLY))
+    return messages
+
+
+def measure(fn, repeat, number=1, setup=None):
+    """
+    Time ``fn``
+    :param repeat: timed samples
+    :param number: calls per sample, for operations too fast to time one by one
+    :param setup: untimed callable run before each sample
+    :return: per-operation statistics in microseconds
+    """
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number * 1e6)
+    samples.sort()
+    return {
+        "median_us": statistics.median(samples),
+        "mean_us": statistics.fmean(samples),
+        "min_us": samples[0],
+        "p95_us": samples[int(len(samples) * 0.95) - 1 if len(samples) > 1 else 0],
+        "samples": len(samples),
+    }
+
+
+def run_cases(history_sizes, repeat):
+    from agents.conversation_agent import ConversationAgent
+    from agents.session_history import get_session_history
+
+    # Logging goes to a file, as the app's app.log sink, instead of the terminal
+    log_dir = tempfile.mkdtemp()
+    LOG.remove()
+    LOG.add(os.path.join(log_dir, "bench.log"), level="DEBUG", format=log_format)
+
+    azure_openai.chat_model = InstantChatModel()
+    azure_openai.hedge_model = None
+    agent = ConversationAgent()
+    results = {}
+
+    get_session_history("bench:existing")
+    results["session_history.get_existing"] = measure(lambda: get_session_history("bench:existing"), repeat, 100)
+    counter = iter(range(10 ** 9))
+    results["session_history.get_new"] = measure(lambda: get_session_history(f"bench:new:{next(counter)}"), repeat, 100)
+
+    results["messages.create_turn"] = measure(
+        lambda: (HumanMessage(content="What does serendipity mean?"), AIMessage(content=REPLY)), repeat, 100
+    )
+
+    template = ChatPromptTemplate.from_messages([
+        ("system", agent.prompt),
+        MessagesPlaceholder(variable_name="messages"),
+    ])
+    for size in history_sizes:
+        messages = conversation(size) + [HumanMessage(content="latest")]
+        results[f"prompt.format[h={size}]"] = measure(lambda: template.invoke({"messages": messages}), repeat, 10)
+        results[f"chain.invoke[h={size}]"] = measure(
+            lambda: agent.chatbot.invoke(messages, {"configurable": {"session_id": f"bench:chain:{size}"}}),
+            repeat, 5,
+        )
+
+        session_id = f"bench:turn:{size}"
+        base = conversation(size)
+
+        def reset():
+            history = get_session_history(session_id)
+            history.clear()
+            if base:
+                history.add_messages(base)
+
+        results[f"rwmh.invoke[h={size}]"] = measure(
+            lambda: agent.chatbot_with_history.invoke(
+                [HumanMessage(content="latest")], {"configurable": {"session_id": session_id}}
+            ),
+            repeat, setup=reset,
+        )
+        results[f"agent.chat_with_history[h={size}]"] = measure(
+            lambda: agent.chat_with_history("latest", session_id), repeat, setup=reset
+        )
+
+        async def stream_turn():
+            async for _ in agent.astream_with_history("latest", session_id):
+                pass
+
+        loop = asyncio.new_event_loop()
+        results[f"agent.astream_with_history[h={size}]"] = measure(
+            lambda: loop.run_until_complete(stream_turn()), repeat, setup=reset
+        )
+        loop.close()
+
+    results["logging.debug_reply"] = measure(lambda: LOG.debug(f"[ChatBot][conversation] {REPLY}"), repeat, 100)
+    results["logging.filtered"] = measure(lambda: LOG.trace(f"[ChatBot][conversation] {REPLY}"), repeat, 100)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(results, baseline=None):
+    for case, stats in results.items():
+        line = f"{case:<40} median={stats['median_us']:10.1f}us  p95={stats['p95_us']:10.1f}us"
+        previous = (baseline or {}).get(case)
+        if previous:
+            line += f"  vs baseline {stats['median_us'] / previous['median_us'] - 1:+7.1%}"
+        print(line)
+
+
+def regressions(results, baseline, threshold):
+    return [
+        case for case, stats in results.items()
+        if case in baseline and stats["median_us"] > baseline[case]["median_us"] * (1 + threshold)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--history", default="0,10,50,200", help="comma separated history sizes in messages")
+    parser.add_argument("--repeat", type=int, default=200, help="samples per case")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown reported as a regression")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(os.path.join(CALLER_DIR, args.compare), "r", encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+
+    results = run_cases([int(size) for size in args.history.split(",")], args.repeat)
+    report(results, baseline)
+
+    if args.output:
+        with open(os.path.join(CALLER_DIR, args.output), "w", encoding="utf-8") as file:
+            json.dump({
+                "benchmark": "agent_hot_path",
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "results": results,
+            }, file, indent=2)
+
+    if baseline is not None:
+        slower = regressions(results, baseline, args.threshold)
+        if slower:
+            print(f"Regressions over {args.threshold:.0%}: {', '.join(slower)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Bytes sent and received per chat turn by the browser.
+
+The conversation tab is served twice, with the gr.ChatInterface wiring it had before
+and with the current chat panel, and an N-turn session is driven against each over
+HTTP the way the browser does it: the events a message submit triggers are read from
+the app's config and followed (then and change events), requests are posted to the
+run and queue endpoints, and the streamed responses are applied to the component
+values. Browser-side (js) events are run with node and cost no bytes. The agent is a
+stand-in streaming a fixed bilingual reply, so only the wiring is measured. Counted are
+request and response bodies; HTTP headers and the session's heartbeat are not.
+
+Usage:
+    python benchmarks/chat_payload_bench.py [--turns 50] [--reply-chars 1200] [--chunk-chars 4]
+        [--output payload.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import time
+import uuid
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+CALLER_DIR = os.getcwd()
+sys.path.insert(0, SRC_DIR)
+os.chdir(SRC_DIR)
+for name, value in {
+    "AZURE_OPENAI_API_KEY": "x", "AZURE_OPENAI_ENDPOINT": "http://x",
+    "OPENAI_API_VERSION": "2024-01-01", "AZURE_MODEL": "m", "LOG_LEVEL": "WARNING", "LOG_FILE": "",
+}.items():
+    os.environ.setdefault(name, value)
+
+import gradio as gr
+import httpx
+from gradio_client.utils import apply_diff
+
+import tabs.conversation_tab as conversation_tab
+from tabs.chat_panel import create_chat_panel
+
+FEEDBACK = (
+    "Great effort! 你的句子基本正确，但是 'I go to the park yesterday' 应该用过去时："
+    "'I went to the park yesterday.' Let's keep going — tell me what you did there. "
+)
+
+# Runs a js event the way the browser does: fn(...inputs), a single output may be returned bare
+NODE_SCRIPT = """
+const [source, args] = JSON.parse(require("fs").readFileSync(0, "utf8"));
+Promise.resolve(eval(source)(...args)).then((result) => process.stdout.write(JSON.stringify(result ?? null)));
+"""
+
+
+class FakeAgent:
+    """
+    Streams the same reply to every message
+    """
+    name = "conversation"
+
+    def __init__(self, reply, chunk_chars):
+        self.chunks = [reply[i:i + chunk_chars] for i in range(0, len(reply), chunk_chars)]
+
+    def get_session_id(self, session_hash):
+        return f"conversation:{session_hash}"
+
+    async def astream_with_history(self, user_input, session_id):
+        for chunk in self.chunks:
+            await asyncio.sleep(0)
+            yield chunk
+
+
+async def handle_conversation_legacy(user_input, chat_history, request: gr.Request = None):
+    # The handler's signature under gr.ChatInterface, which posts the chat history along
+    async for reply in conversation_tab.handle_conversation(user_input, request):
+        yield reply
+
+
+def build_app(wiring):
+    with gr.Blocks() as demo:
+        chatbot = gr.Chatbot()
+        if wiring == "chat_interface":
+            gr.ChatInterface(fn=handle_conversation_legacy, chatbot=chatbot)
+        else:
+            create_chat_panel(conversation_tab.handle_conversation, chatbot)
+    return demo
+
+
+def run_js(source, args, n_outputs):
+    result = subprocess.run(
+        ["node", "-e", NODE_SCRIPT], input=json.dumps([source, args]), capture_output=True, text=True, check=True,
+    )
+    result = json.loads(result.stdout)
+    if result is None:
+        return []
+    return [result] if n_outputs == 1 and not isinstance(result, list) else result
+
+
+class Browser:
+    """
+    Follows a Blocks app's events like the Gradio frontend, counting the bytes it exchanges
+    """
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        self.http = httpx.Client(timeout=60)
+        config = self.http.get(f"{self.url}/config").json()
+        self.api = f"{self.url}{config.get('api_prefix', '/gradio_api')}"
+        self.dependencies = config["dependencies"]
+        self.values = {c["id"]: c.get("props", {}).get("value") for c in config["components"]}
+        self.session_hash = uuid.uuid4().hex[:11]
+        self.sent = 0
+        self.received = 0
+
+    def trigger(self, component_id, event):
+        for dependency in self.dependencies:
+            if [component_id, event] in [list(target) for target in dependency["targets"]]:
+                self.run(dependency)
+
+    def run(self, dependency):
+        if not dependency["backend_fn"] and not dependency["js"]:
+            # Only cancels other events, none is running here
+            return
+        inputs = [self.values.get(i) for i in dependency["inputs"]]
+        if dependency["backend_fn"]:
+            outputs = self.call(dependency, inputs)
+        else:
+            outputs = run_js(dependency["js"], inputs, len(dependency["outputs"]))
+        # All outputs are set before the change events they cause run
+        changed = []
+        for component_id, value in zip(dependency["outputs"], outputs):
+            if isinstance(value, dict) and value.get("__type__") == "update":
+                if "value" not in value:
+                    continue
+                value = value["value"]
+            if value != self.values.get(component_id):
+                changed.append(component_id)
+            self.values[component_id] = value
+        for component_id in changed:
+            self.trigger(component_id, "change")
+        for then in self.dependencies:
+            if then.get("trigger_after") == dependency["id"]:
+                self.run(then)
+
+    def post(self, path, body):
+        payload = json.dumps(body).encode()
+        self.sent += len(payload)
+        response = self.http.post(f"{self.api}{path}", content=payload, headers={"Content-Type": "application/json"})
+        self.received += len(response.content)
+        response.raise_for_status()
+        return response.json()
+
+    def call(self, dependency, inputs):
+        body = {
+            "data": inputs, "fn_index": dependency["id"], "trigger_id": None,
+            "session_hash": self.session_hash, "event_data": None,
+        }
+        if not dependency["queue"]:
+            return self.post("/run/predict", body)["data"]
+
+        event_id = self.post("/queue/join", body)["event_id"]
+        outputs = None
+        with self.http.stream("GET", f"{self.api}/queue/data", params={"session_hash": self.session_hash}) as response:
+            for line in response.iter_lines():
+                self.received += len(line) + 1
+                if not line.startswith("data:"):
+                    continue
+                message = json.loads(line[5:])
+                if message.get("event_id") != event_id:
+                    continue
+                data = message.get("output", {}).get("data")
+                if message["msg"] == "process_generating":
+                    # The first update carries the values, the next ones diffs against them
+                    outputs = list(data) if outputs is None else [apply_diff(o, d) for o, d in zip(outputs, data)]
+                elif message["msg"] == "process_completed":
+                    if not message.get("success", True):
+                        raise RuntimeError(message["output"])
+                    if outputs is None:
+                        outputs = data
+                    break
+        return outputs or []
+
+    def send(self, textbox_id, message):
+        self.values[textbox_id] = message
+        sent, received = self.sent, self.received
+        self.trigger(textbox_id, "submit")
+        return self.sent - sent, self.received - received
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure(wiring, turns, reply):
+    demo = build_app(wiring)
+    port = free_port()
+    demo.queue().launch(server_port=port, prevent_thread_lock=True, quiet=True, show_error=True)
+    try:
+        browser = Browser(f"http://127.0.0.1:{port}/")
+        textbox_id = next(
+            target[0] for d in browser.dependencies for target in d["targets"] if target[1] == "submit"
+        )
+        chatbot_id = min(c for c, v in browser.values.items() if isinstance(v, list))
+        per_turn = []
+        for turn in range(turns):
+            sent, received = browser.send(textbox_id, f"Turn {turn}: Yesterday I go to the park with my friends.")
+            per_turn.append({"sent": sent, "received": received})
+        shown = browser.values[chatbot_id] or []
+        if len(shown) != 2 * turns or shown[-1]["content"][0]["text"] != reply:
+            raise AssertionError(f"{wiring}: chatbot shows {len(shown)} messages, expected {2 * turns}")
+    finally:
+        demo.close()
+
+    def summary(turn_range):
+        rows = [per_turn[i] for i in turn_range]
+        return {
+            "sent_bytes": sum(r["sent"] for r in rows) / len(rows),
+            "received_bytes": sum(r["received"] for r in rows) / len(rows),
+        }
+
+    return {
+        "first_turn": summary(range(0, 1)),
+        "last_turn": summary(range(turns - 1, turns)),
+        "mean_per_turn": summary(range(turns)),
+        "session_total_bytes": sum(r["sent"] + r["received"] for r in per_turn),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=50, help="turns in the session")
+    parser.add_argument("--reply-chars", type=int, default=1200, help="length of each reply")
+    parser.add_argument("--chunk-chars", type=int, default=4, help="characters per streamed chunk")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    if shutil.which("node") is None:
+        sys.exit("node is needed to run the browser-side events")
+    reply = (FEEDBACK * (args.reply_chars // len(FEEDBACK) + 1))[:args.reply_chars]
+    conversation_tab.conversation_agent = FakeAgent(reply, args.chunk_chars)
+
+    results = {wiring: measure(wiring, args.turns, reply) for wiring in ["chat_interface", "chat_panel"]}
+    for wiring, stats in results.items():
+        for row in ["first_turn", "last_turn", "mean_per_turn"]:
+            print(
+                f"{wiring:<15} {row:<14} sent={stats[row]['sent_bytes'] / 1024:9.1f} KB  "
+                f"received={stats[row]['received_bytes'] / 1024:9.1f} KB"
+            )
+        print(f"{wiring:<15} session total  {stats['session_total_bytes'] / 1024:9.1f} KB")
+
+    if args.output:
+        with open(os.path.join(CALLER_DIR, args.output), "w", encoding="utf-8") as file:
+            json.dump({
+                "benchmark": "chat_payload",
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "options": vars(args),
+                "results": results,
+            }, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+"""
+End-to-end load test of the Gradio app.
+
+Simulated learners each hold their own Gradio session (one gradio_client Client) and
+keep practising until the test ends. They pick a tab at random, then:
+  - scenario: choose a scenario and chat for --turns turns
+  - conversation: chat for --turns turns
+  - vocab: start a new round and answer for --turns turns
+They wait a random think time between turns.
+
+By default the mock LLM server (mock_llm_server.py) and the app are started here, with
+the app pointed at the mock. Pass --url to drive an app that is already running (and
+--app-pid to include its memory). Reported: turn throughput, time to first streamed
+output (TTFT), p50/p95/p99 latency per operation, error rate and app memory per session.
+
+Usage:
+    python benchmarks/load_test.py [--learners 20] [--duration 60] [--turns 4] [--think-time 1.0]
+        [--ttft lognormal:0.5:0.4] [--token-rate 60] [--error-rate 0.0] [--app-env KEY=VALUE]
+        [--url http://127.0.0.1:7860/ --app-pid 1234] [--output load.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCH_DIR, "..", "src")
+
+SCENARIOS = ["hotel_checkin", "job_interview", "renting_house", "airport_checkin"]
+
+LEARNER_INPUTS = [
+    "Hello, I have a reservation under the name Li Wei.",
+    "Could you tell me what time breakfast is served?",
+    "I think I would like to try that again.",
+    "Yesterday I go to the park with my friends.",
+    "What does this word mean?",
+    "Sorry, can you say it more slowly please?",
+    "I am interested in this position because I like solving problems.",
+    "How much is the rent per month, and is water included?",
+]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args} exited with {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.1):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"nothing listening on port {port} after {timeout}s")
+
+
+def rss_bytes(pid):
+    """
+    Resident memory of a process, from /proc (Linux only)
+    :return: bytes, or None when unavailable
+    """
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="utf-8") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+class MemorySampler:
+    """
+    Samples the app's resident memory in the background and keeps the peak
+    """
+    def __init__(self, pid, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self.peak = None
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        if self.pid is not None:
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            rss = rss_bytes(self.pid)
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+
+
+class Learner:
+    """
+    One simulated learner with its own Gradio session
+    """
+    def __init__(self, index, url, args, deadline, rng):
+        self.index = index
+        self.url = url
+        self.args = args
+        self.deadline = deadline
+        self.rng = rng
+        self.results = []
+        self.sessions = set()
+        self.client = None
+
+    def run(self):
+        from gradio_client import Client
+
+        try:
+            self.client = Client(self.url, verbose=False)
+        except Exception as e:
+            self.results.append({"tab": "connect", "op": "connect", "ok": False, "error": str(e)})
+            return
+        tabs = list(self.args.tab_weights)
+        weights = [self.args.tab_weights[tab] for tab in tabs]
+        while time.perf_counter() < self.deadline:
+            tab = self.rng.choices(tabs, weights=weights)[0]
+            getattr(self, f"practise_{tab}")()
+
+    def practise_scenario(self):
+        scenario = self.rng.choice(SCENARIOS)
+        self.sessions.add(scenario)
+        self.call("scenario", "start", False, scenario, api_name="/change_scenario")
+        self.chat("scenario", "/handle_scenario", scenario)
+
+    def practise_conversation(self):
+        self.sessions.add("conversation")
+        self.chat("conversation", "/handle_conversation")
+
+    def practise_vocab(self):
+        self.sessions.add("vocab_study")
+        self.call("vocab", "start", False, api_name="/restart_vocab_study_chatbot")
+        self.chat("vocab", "/handle_vocab")
+
+    def chat(self, tab, api_name, *extra):
+        for _ in range(self.args.turns):
+            if time.perf_counter() >= self.deadline:
+                return
+            self.think()
+            self.call(tab, "turn", True, self.rng.choice(LEARNER_INPUTS), *extra, api_name=api_name)
+
+    def think(self):
+        if self.args.think_time > 0:
+            time.sleep(self.rng.expovariate(1 / self.args.think_time))
+
+    def call(self, tab, op, streamed, *inputs, api_name):
+        started = time.perf_counter()
+        result = {"tab": tab, "op": op, "ok": True, "ttft": None}
+        try:
+            job = self.client.submit(*inputs, api_name=api_name)
+            if streamed:
+                for _ in job:
+                    if result["ttft"] is None:
+                        result["ttft"] = time.perf_counter() - started
+            job.result()
+        except Exception as e:
+            result["ok"] = False
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["latency"] = time.perf_counter() - started
+        self.results.append(result)
+
+    def close(self):
+        if self.client is not None:
+            try:
+                self.client.close()
+            except Exception:
+                pass
+
+
+def percentiles(values):
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def at(q):
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": at(0.50),
+        "p95_ms": at(0.95),
+        "p99_ms": at(0.99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def summarize(results, elapsed, sessions, rss_before, rss_after, rss_peak):
+    turns = [r for r in results if r["op"] == "turn"]
+    ok_turns = [r for r in turns if r["ok"]]
+    errors = [r for r in results if not r["ok"]]
+    grown = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+    summary = {
+        "elapsed_s": elapsed,
+        "requests": len(results),
+        "turns": len(turns),
+        "turns_per_s": len(ok_turns) / elapsed if elapsed else 0.0,
+        "error_rate": len(errors) / len(results) if results else 0.0,
+        "errors": sorted({r.get("error", "") for r in errors})[:10],
+        "ttft": percentiles([r["ttft"] for r in ok_turns if r["ttft"] is not None]),
+        "turn_latency": percentiles([r["latency"] for r in ok_turns]),
+        "by_tab": {},
+        "sessions": sessions,
+        "rss_before_mb": rss_before / 2 ** 20 if rss_before is not None else None,
+        "rss_after_mb": rss_after / 2 ** 20 if rss_after is not None else None,
+        "rss_peak_mb": rss_peak / 2 ** 20 if rss_peak is not None else None,
+        "memory_per_session_kb": grown / sessions / 1024 if grown is not None and sessions else None,
+    }
+    for tab in sorted({r["tab"] for r in results}):
+        summary["by_tab"][tab] = {
+            op: percentiles([r["latency"] for r in results if r["tab"] == tab and r["op"] == op and r["ok"]])
+            for op in sorted({r["op"] for r in results if r["tab"] == tab})
+        }
+    return summary
+
+
+def report(summary):
+    def line(name, stats):
+        if not stats.get("count"):
+            return f"{name:<22} n=0"
+        return (f"{name:<22} n={stats['count']:<6} p50={stats['p50_ms']:8.1f}ms  p95={stats['p95_ms']:8.1f}ms  "
+                f"p99={stats['p99_ms']:8.1f}ms")
+
+    print(f"turns={summary['turns']}  throughput={summary['turns_per_s']:.2f} turns/s  "
+          f"error_rate={summary['error_rate']:.2%}  sessions={summary['sessions']}")
+    print(line("ttft", summary["ttft"]))
+    print(line("turn latency", summary["turn_latency"]))
+    for tab, ops in summary["by_tab"].items():
+        for op, stats in ops.items():
+            print(line(f"{tab}/{op}", stats))
+    if summary["memory_per_session_kb"] is not None:
+        print(f"rss before={summary['rss_before_mb']:.1f}MB after={summary['rss_after_mb']:.1f}MB "
+              f"peak={summary['rss_peak_mb'] or 0:.1f}MB  per session={summary['memory_per_session_kb']:.1f}KB")
+    for error in summary["errors"]:
+        print(f"error: {error}")
+
+
+def start_stack(args):
+    """
+    Start the mock LLM server and the app pointed at it
+    :return: (app url, app process, processes to stop)
+    """
+    mock_port, app_port = free_port(), free_port()
+    mock = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, "mock_llm_server.py"), "--port", str(mock_port),
+         "--ttft", args.ttft, "--token-rate", str(args.token_rate), "--completion-tokens", args.completion_tokens,
+         "--rate-limit-rate", str(args.rate_limit_rate), "--error-rate", str(args.error_rate),
+         "--seed", str(args.seed)],
+    )
+    env = dict(
+        os.environ,
+        AZURE_OPENAI_ENDPOINT=f"http://127.0.0.1:{mock_port}",
+        AZURE_OPENAI_API_KEY="mock",
+        AZURE_API_VERSION=os.getenv("AZURE_API_VERSION", "2024-02-01"),
+        AZURE_MODEL="mock",
+        GRADIO_SERVER_PORT=str(app_port),
+        GRADIO_SHARE="false",
+        GRADIO_ANALYTICS_ENABLED="False",
+    )
+    for item in args.app_env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    app = subprocess.Popen(
+        [sys.executable, "main.py"], cwd=SRC_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    processes = [app, mock]
+    try:
+        wait_for_port(mock_port, mock, 30)
+        wait_for_port(app_port, app, 120)
+    except Exception:
+        stop(processes)
+        raise
+    return f"http://127.0.0.1:{app_port}/", app, processes
+
+
+def stop(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def parse_tab_weights(value):
+    weights = {}
+    for item in value.split(","):
+        tab, _, weight = item.partition("=")
+        if tab not in ("scenario", "conversation", "vocab"):
+            raise argparse.ArgumentTypeError(f"unknown tab {tab!r}")
+        weights[tab] = float(weight or 1)
+    return weights
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--learners", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds of load")
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which learners join")
+    parser.add_argument("--turns", type=int, default=4, help="turns per tab visit")
+    parser.add_argument("--think-time", type=float, default=1.0, help="mean seconds between turns")
+    parser.add_argument("--tab-weights", type=parse_tab_weights, default=parse_tab_weights("scenario=2,conversation=1,vocab=1"))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--url", help="drive an already running app instead of starting one")
+    parser.add_argument("--app-pid", type=int, help="pid of the app given by --url, for memory figures")
+    parser.add_argument("--app-env", action="append", default=[], help="KEY=VALUE for the started app")
+    parser.add_argument("--ttft", default="lognormal:0.5:0.4")
+    parser.add_argument("--token-rate", type=float, default=60.0)
+    parser.add_argument("--completion-tokens", default="uniform:40:200")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    processes = []
+    if args.url:
+        url, app_pid = args.url, args.app_pid
+    else:
+        url, app, processes = start_stack(args)
+        app_pid = app.pid
+
+    learners = []
+    try:
+        rss_before = rss_bytes(app_pid) if app_pid else None
+        sampler = MemorySampler(app_pid).start()
+        started = time.perf_counter()
+        deadline = started + args.ramp + args.duration
+        threads = []
+        for index in range(args.learners):
+            learner = Learner(index, url, args, deadline, random.Random(args.seed * 1000 + index))
+            learners.append(learner)
+            thread = threading.Thread(target=learner.run, daemon=True)
+            thread.start()
+            threads.append(thread)
+            time.sleep(args.ramp / max(args.learners, 1))
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        # Measured while every learner is still connected and its sessions are alive
+        rss_after = rss_bytes(app_pid) if app_pid else None
+        sampler.stop()
+    finally:
+        for learner in learners:
+            learner.close()
+        stop(processes)
+
+    results = [result for learner in learners for result in learner.results]
+    sessions = sum(len(learner.sessions) for learner in learners)
+    summary = summarize(results, elapsed, sessions, rss_before, rss_after, sampler.peak)
+    report(summary)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({
+                "benchmark": "load",
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "config": {key: value for key, value in vars(args).items() if key != "output"},
+                "results": summary,
+            }, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
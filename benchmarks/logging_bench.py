@@ -0,0 +1,156 @@
+"""
+Per-turn logging overhead on the request thread.
+
+Compares how a chat turn was logged before, with synchronous DEBUG sinks and the full
+response written twice (agent and tab handler), with the current per-turn record: one
+record with the turn's fields, the response sampled and truncated, written by background
+writers. Each configuration writes to stdout and a log file. Stdout goes to /dev/null
+here, and with --slow-stdout-ms every write to it is delayed, as a blocked container log
+pipe would. The time for the background writers to drain is reported separately, the
+turn does not spend it.
+
+Usage:
+    python benchmarks/logging_bench.py [--repeat 2000] [--response-chars 1200] [--slow-stdout-ms 0]
+        [--output logging.json]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+CALLER_DIR = os.getcwd()
+sys.path.insert(0, SRC_DIR)
+os.chdir(SRC_DIR)
+
+from agents.agent_base import AgentBase
+import utils.logger as logger_module
+from utils.logger import LOG, configure_logging, flush_logs, log_format
+from utils.metrics import start_turn
+
+
+def measure(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        "median_us": statistics.median(samples),
+        "mean_us": statistics.fmean(samples),
+        "p95_us": samples[int(len(samples) * 0.95) - 1],
+        "p99_us": samples[int(len(samples) * 0.99) - 1],
+    }
+
+
+class SlowStream:
+    def __init__(self, stream, delay):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, text):
+        if self.delay:
+            time.sleep(self.delay)
+        self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def legacy_sinks(log_file):
+    # As logged before: DEBUG everywhere, written on the calling thread
+    LOG.remove()
+    LOG.add(sys.stdout, level="DEBUG", format=log_format, colorize=True)
+    LOG.add(sys.stderr, level="ERROR", format=log_format, colorize=True)
+    LOG.add(log_file, rotation="1 MB", level="DEBUG", format=log_format)
+
+
+def log_bytes(log_dir, name):
+    return sum(os.path.getsize(os.path.join(log_dir, f)) for f in os.listdir(log_dir) if f.startswith(name))
+
+
+def run_cases(repeat, response_chars, sample_rate, max_chars, slow_stdout_ms):
+    response = ("That's a great answer! Let's try another sentence with the past tense. " * 50)[:response_chars]
+    log_dir = tempfile.mkdtemp()
+    agent = SimpleNamespace(name="conversation")
+    turn = start_turn("conversation")
+    turn.first_token()
+    turn.finish("ok", 850, 120)
+
+    def legacy_turn():
+        LOG.debug(f"[ChatBot][conversation] {response}")
+        LOG.info(f"[Conversation ChatBot]: {response}")
+
+    def current_turn():
+        AgentBase.log_turn(agent, turn, "conversation:abc", response)
+
+    logger_module.RESPONSE_SAMPLE_RATE, logger_module.RESPONSE_MAX_CHARS = sample_rate, max_chars
+    results = {}
+    cases = [
+        ("legacy.sync_debug_full_response_x2", legacy_turn, lambda path: legacy_sinks(path)),
+        ("current.background_text", current_turn,
+         lambda path: configure_logging("INFO", structured=False, enqueue=True, log_file=path)),
+        ("current.background_json", current_turn,
+         lambda path: configure_logging("INFO", structured=True, enqueue=True, log_file=path)),
+        ("current.sync_json", current_turn,
+         lambda path: configure_logging("INFO", structured=True, enqueue=False, log_file=path)),
+        ("current.level_warning", current_turn,
+         lambda path: configure_logging("WARNING", structured=True, enqueue=True, log_file=path)),
+    ]
+    with open(os.devnull, "w") as devnull:
+        stdout = sys.stdout
+        sys.stdout = SlowStream(devnull, slow_stdout_ms / 1000)
+        try:
+            for name, fn, setup in cases:
+                path = os.path.join(log_dir, f"{name}.log")
+                setup(path)
+                for _ in range(50):
+                    fn()
+                results[name] = measure(fn, repeat)
+                start = time.perf_counter()
+                flush_logs(timeout=600)
+                results[name]["drain_ms"] = (time.perf_counter() - start) * 1000
+                LOG.remove()
+                results[name]["log_bytes_per_turn"] = log_bytes(log_dir, name) / (repeat + 50)
+        finally:
+            sys.stdout = stdout
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000, help="turns logged per case")
+    parser.add_argument("--response-chars", type=int, default=1200, help="length of the logged response")
+    parser.add_argument("--sample-rate", type=float, default=0.05, help="LOG_RESPONSE_SAMPLE_RATE")
+    parser.add_argument("--max-chars", type=int, default=200, help="LOG_RESPONSE_MAX_CHARS")
+    parser.add_argument("--slow-stdout-ms", type=float, default=0.0, help="delay of every write to stdout")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = run_cases(args.repeat, args.response_chars, args.sample_rate, args.max_chars, args.slow_stdout_ms)
+    for case, stats in results.items():
+        print(
+            f"{case:<38} median={stats['median_us']:8.1f}us  p99={stats['p99_us']:8.1f}us  "
+            f"drain={stats['drain_ms']:7.1f}ms  {stats['log_bytes_per_turn']:7.0f} B/turn"
+        )
+
+    if args.output:
+        with open(os.path.join(CALLER_DIR, args.output), "w", encoding="utf-8") as file:
+            json.dump({
+                "benchmark": "logging",
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "options": vars(args),
+                "results": results,
+            }, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Fake Azure OpenAI / OpenAI chat completions server for load tests.
+
+Answers ``/openai/deployments/<deployment>/chat/completions`` (Azure) and
+``/v1/chat/completions`` (OpenAI), streamed or not, with generated English text.
+Time to first token and reply length are drawn from configurable distributions and
+tokens are sent at ``--token-rate`` tokens per second, so the app sees realistic model
+timing without calling a real model. Rate limiting (429 with Retry-After), server
+errors and hung requests can be injected at given rates. ``GET /mock/stats`` reports
+what the server has seen.
+
+Distributions are written ``kind:params``:
+    fixed:0.5            always 0.5
+    uniform:0.2:1.5      uniform between 0.2 and 1.5
+    normal:0.6:0.2       mean 0.6, standard deviation 0.2 (clamped at 0)
+    lognormal:0.5:0.4    median 0.5, sigma 0.4
+    exponential:0.5      mean 0.5
+
+Point the app at it with
+    AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8100 AZURE_OPENAI_API_KEY=mock AZURE_MODEL=mock
+
+Usage:
+    python benchmarks/mock_llm_server.py [--port 8100] [--ttft lognormal:0.5:0.4] [--token-rate 60]
+        [--completion-tokens uniform:40:200] [--rate-limit-rate 0.0] [--error-rate 0.0] [--hang-rate 0.0]
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+import uuid
+
+WORDS = (
+    "great answer let us practice another sentence together remember to use the past tense "
+    "when you talk about yesterday could you tell me more about your plans for the weekend "
+    "that is a very natural way to say it try again with a question word here is a new word "
+    "for you schedule meeting reservation passport luggage interview salary apartment"
+).split()
+
+
+class Distribution:
+    """
+    A random distribution parsed from ``kind:params``
+    """
+    KINDS = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exponential": 1}
+
+    def __init__(self, spec):
+        kind, *params = spec.split(":")
+        if kind not in self.KINDS or len(params) != self.KINDS[kind]:
+            raise ValueError(f"Invalid distribution {spec!r}, expected e.g. fixed:0.5 or lognormal:0.5:0.4")
+        self.spec = spec
+        self.kind = kind
+        self.params = [float(p) for p in params]
+
+    def sample(self, rng):
+        a = self.params[0]
+        b = self.params[1] if len(self.params) > 1 else None
+        if self.kind == "fixed":
+            return a
+        if self.kind == "uniform":
+            return rng.uniform(a, b)
+        if self.kind == "normal":
+            return max(rng.gauss(a, b), 0.0)
+        if self.kind == "lognormal":
+            return rng.lognormvariate(math.log(a), b)
+        return rng.expovariate(1 / a) if a > 0 else 0.0
+
+    def __repr__(self):
+        return self.spec
+
+
+class MockStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.streams = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.hangs = 0
+        self.completion_tokens = 0
+        self.started_at = time.time()
+
+    def begin(self, stream):
+        with self._lock:
+            self.requests += 1
+            self.streams += int(stream)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def end(self, tokens=0):
+        with self._lock:
+            self.in_flight -= 1
+            self.completion_tokens += tokens
+
+    def count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            return {key: value for key, value in vars(self).items() if not key.startswith("_")}
+
+
+def estimate_prompt_tokens(messages):
+    return sum(len(str(message.get("content") or "")) for message in messages) // 4 + 3 * len(messages)
+
+
+def create_app(ttft="lognormal:0.5:0.4", token_rate=60.0, completion_tokens="uniform:40:200",
+               rate_limit_rate=0.0, retry_after=1.0, error_rate=0.0, hang_rate=0.0, hang_seconds=120.0,
+               seed=None):
+    """
+    Build the fake server as an ASGI app
+    :return: (FastAPI app, MockStats)
+    """
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    app = FastAPI(title="Mock LLM")
+    stats = MockStats()
+    rng = random.Random(seed)
+    ttft_dist = Distribution(ttft)
+    length_dist = Distribution(completion_tokens)
+
+    def reply_words():
+        count = max(int(length_dist.sample(rng)), 1)
+        return [rng.choice(WORDS) for _ in range(count)]
+
+    def injected_error():
+        roll = rng.random()
+        if roll < rate_limit_rate:
+            stats.count("rate_limited")
+            return JSONResponse(
+                {"error": {"code": "429", "message": "Rate limit is exceeded. Try again later."}},
+                status_code=429,
+                headers={"retry-after": str(retry_after), "retry-after-ms": str(int(retry_after * 1000))},
+            )
+        if roll < rate_limit_rate + error_rate:
+            stats.count("errors")
+            return JSONResponse({"error": {"code": "500", "message": "Mock server error"}}, status_code=500)
+        return None
+
+    async def chat_completions(request: Request, model):
+        body = await request.json()
+        stream = bool(body.get("stream"))
+        messages = body.get("messages") or []
+        error = injected_error()
+        if error is not None:
+            return error
+        if rng.random() < hang_rate:
+            stats.count("hangs")
+            await asyncio.sleep(hang_seconds)
+
+        prompt_tokens = estimate_prompt_tokens(messages)
+        words = reply_words()
+        delay = ttft_dist.sample(rng)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(words),
+            "total_tokens": prompt_tokens + len(words),
+        }
+
+        if not stream:
+            stats.begin(False)
+            try:
+                await asyncio.sleep(delay + len(words) / token_rate)
+            finally:
+                stats.end(len(words))
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": " ".join(words)},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+
+        def chunk(delta, finish_reason=None):
+            return "data: " + json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }) + "\n\n"
+
+        async def events():
+            stats.begin(True)
+            sent = 0
+            try:
+                await asyncio.sleep(delay)
+                yield chunk({"role": "assistant", "content": ""})
+                for index, word in enumerate(words):
+                    if index:
+                        await asyncio.sleep(1 / token_rate)
+                    sent += 1
+                    yield chunk({"content": word if index == 0 else " " + word})
+                yield chunk({}, "stop")
+                if include_usage:
+                    yield "data: " + json.dumps({
+                        "id": completion_id, "object": "chat.completion.chunk", "created": created,
+                        "model": model, "choices": [], "usage": usage,
+                    }) + "\n\n"
+                yield "data: [DONE]\n\n"
+            finally:
+                stats.end(sent)
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/openai/deployments/{deployment}/chat/completions")
+    async def azure_chat_completions(deployment: str, request: Request):
+        return await chat_completions(request, deployment)
+
+    @app.post("/v1/chat/completions")
+    @app.post("/chat/completions")
+    async def openai_chat_completions(request: Request):
+        return await chat_completions(request, "mock")
+
+    @app.get("/openai/models")
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "mock", "object": "model"}]}
+
+    @app.get("/mock/stats")
+    async def mock_stats():
+        return stats.snapshot()
+
+    return app, stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--ttft", default="lognormal:0.5:0.4", help="seconds to the first token")
+    parser.add_argument("--token-rate", type=float, default=60.0, help="tokens per second after the first")
+    parser.add_argument("--completion-tokens", default="uniform:40:200", help="reply length in tokens")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests answered 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After of injected 429s")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered 500")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="share of requests that hang")
+    parser.add_argument("--hang-seconds", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    app, _ = create_app(
+        ttft=args.ttft, token_rate=args.token_rate, completion_tokens=args.completion_tokens,
+        rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after, error_rate=args.error_rate,
+        hang_rate=args.hang_rate, hang_seconds=args.hang_seconds, seed=args.seed,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
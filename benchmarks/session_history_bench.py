@@ -0,0 +1,70 @@
+"""
+Per-turn overhead of the session history backends.
+
+Simulates the history work of one chat turn (registry lookup, reading the messages
+that go into the prompt, appending the human/AI pair) for the in-memory and the
+SQLite write-behind backends.
+
+Usage:
+    python benchmarks/session_history_bench.py [--sessions 200] [--turns 40]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from langchain_core.chat_history import InMemoryChatMessageHistory
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agents.session_registry import SessionRegistry
+from agents.sqlite_history import SQLiteChatMessageHistory, SQLiteMessageStore
+
+REPLY = "That's a great answer! " * 20
+
+
+def run_turns(registry, sessions, turns):
+    timings = []
+    for turn in range(turns):
+        for s in range(sessions):
+            start = time.perf_counter()
+            history = registry.get(f"session-{s}")
+            prompt_messages = history.messages + [HumanMessage(content=f"turn {turn}")]
+            history.add_messages([prompt_messages[-1], AIMessage(content=REPLY)])
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    p50 = timings[len(timings) // 2] * 1e6
+    p99 = timings[int(len(timings) * 0.99)] * 1e6
+    mean = statistics.fmean(timings) * 1e6
+    print(f"{name:<10} turns={len(timings):<7} mean={mean:8.1f}us  p50={p50:8.1f}us  p99={p99:8.1f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=40)
+    args = parser.parse_args()
+
+    memory = SessionRegistry(lambda session_id: InMemoryChatMessageHistory())
+    report("memory", run_turns(memory, args.sessions, args.turns))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        message_store = SQLiteMessageStore(os.path.join(tmp, "sessions.db"))
+        sqlite = SessionRegistry(lambda session_id: SQLiteChatMessageHistory(session_id, message_store))
+        report("sqlite", run_turns(sqlite, args.sessions, args.turns))
+
+        start = time.perf_counter()
+        message_store.flush()
+        print(f"sqlite drain of pending writes after run: {(time.perf_counter() - start) * 1e3:.1f}ms")
+        message_store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Application startup time.
+
+Measures, each in a fresh interpreter:
+  - import time of ``main`` (everything imported before the UI is built)
+  - time to listening: from starting ``python main.py`` until the Gradio port accepts
+    connections, with sharing disabled
+
+Results can be written as JSON with --output to compare releases.
+
+Usage:
+    python benchmarks/startup_bench.py [--runs 5] [--timeout 60] [--output startup.json]
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def app_env(port=None):
+    env = dict(os.environ, GRADIO_SHARE="false", GRADIO_ANALYTICS_ENABLED="False", PYTHONDONTWRITEBYTECODE="1")
+    if port is not None:
+        env["GRADIO_SERVER_PORT"] = str(port)
+    return env
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def import_time():
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET], cwd=SRC_DIR, env=app_env(),
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def time_to_listening(timeout):
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "main.py"], cwd=SRC_DIR, env=app_env(port),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"main.py exited with {process.returncode} before listening")
+            try:
+                with socket.create_connection(("127.0.0.1", port), timeout=0.1):
+                    return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.02)
+        raise TimeoutError(f"main.py was not listening on port {port} after {timeout}s")
+    finally:
+        process.kill()
+        process.wait()
+
+
+def summarize(timings):
+    return {
+        "runs": len(timings),
+        "mean_s": statistics.fmean(timings),
+        "median_s": statistics.median(timings),
+        "min_s": min(timings),
+        "max_s": max(timings),
+    }
+
+
+def report(name, summary):
+    print(f"{name:<18} runs={summary['runs']:<3} mean={summary['mean_s']:6.2f}s  "
+          f"median={summary['median_s']:6.2f}s  min={summary['min_s']:6.2f}s  max={summary['max_s']:6.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {
+        "import_main": summarize([import_time() for _ in range(args.runs)]),
+        "time_to_listening": summarize([time_to_listening(args.timeout) for _ in range(args.runs)]),
+    }
+    for name, summary in results.items():
+        report(name, summary)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({
+                "benchmark": "startup",
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "results": results,
+            }, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,60 +1,456 @@
+import hashlib
 import json
+import os
 from abc import ABC, abstractmethod
 
-from azure_openai import chat_model
+import azure_openai
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
 from langchain_core.runnables.history import RunnableWithMessageHistory
 
-from agents.session_history import get_session_history
-from utils.logger import LOG
+from agents.hedging import hedged_model_from_env
+from agents.history_window import HistoryWindow, estimate_tokens
+from agents.response_cache import response_cache
+from agents.session_history import get_session_history, learner_session_id
+from utils.admission import AdmissionRejected, PRIORITY_INTERACTIVE, model_admission, usage_tokens
+from utils.asset_cache import asset_cache
+from utils.concurrency import model_call_limiter
+from utils.logger import LOG, response_preview
+from utils.metrics import start_turn
+from utils.tracing import set_attributes, span, traced, traced_iter, traced_stream
+
+def history_token_budget_from_env(name):
+    """
+    Token budget for an agent: HISTORY_TOKEN_BUDGET_<NAME> overrides HISTORY_TOKEN_BUDGET
+    :param name: agent name
+    :return: budget in tokens, 0 disables trimming
+    """
+    value = os.getenv(f"HISTORY_TOKEN_BUDGET_{name.upper()}", os.getenv("HISTORY_TOKEN_BUDGET", "6000"))
+    return int(value)
+
+def _turn_attributes(agent, user_input, session_id=None):
+    return {"agent.name": agent.name, "session.id": session_id or agent.session_id}
 
 class AgentBase(ABC):
-    def __init__(self, name, prompt_file, intro_file=None, session_id=None):
+    response_cache = None
+    history_window = None
+    chat_model = None
+
+    def __init__(self, name, prompt_file, intro_file=None, session_id=None, history_token_budget=None):
         self.name = name
         self.prompt_file = prompt_file
         self.intro_file = intro_file
         self.session_id = session_id if session_id else self.name
+        self.history_token_budget = (
+            history_token_budget if history_token_budget is not None else history_token_budget_from_env(name)
+        )
+        self.expected_completion_tokens = int(os.getenv("MODEL_EXPECTED_COMPLETION_TOKENS", "300"))
+        self.summary_memory = None
+        self.response_cache = response_cache
         self.prompt = self.load_prompt()
         self.intro_messages = self.load_intro() if self.intro_file else []
         self.create_chatbot()
+        # Edits to the mounted prompt and content files apply without a restart
+        asset_cache.watch(self.prompt_file, self.on_asset_changed)
+        if self.intro_file:
+            asset_cache.watch(self.intro_file, self.on_asset_changed)
 
 
     def load_prompt(self):
         try:
-            with open(self.prompt_file, "r", encoding="utf-8") as file:
-                return file.read().strip()
+            return asset_cache.read_text(self.prompt_file).strip()
         except FileNotFoundError:
             raise FileNotFoundError(f"Prompt file {self.prompt_file} not found")
 
 
     def load_intro(self):
         try:
-            with open(self.intro_file, "r", encoding="utf-8") as file:
-                return json.load(file)
+            return asset_cache.read_json(self.intro_file)
         except FileNotFoundError:
             raise FileNotFoundError(f"Intro file {self.intro_file} not found")
         except json.JSONDecodeError:
             raise ValueError(f"Intro file {self.intro_file} is invalid")
 
+    def on_asset_changed(self, path):
+        """
+        Reload the prompt or intro messages after their file changed on disk
+        :param path: absolute path of the changed file
+        """
+        if path == os.path.abspath(self.prompt_file):
+            self.reload_prompt()
+        elif self.intro_file and path == os.path.abspath(self.intro_file):
+            self.intro_messages = self.load_intro()
+            LOG.info(f"[ChatBot][{self.name}] reloaded intro messages")
+
+    def reload_prompt(self):
+        """
+        Rebuild the prompt template from the current prompt file. Turns already running
+        finish with the chain they started with
+        :return: True if the prompt changed
+        """
+        prompt = self.load_prompt()
+        if prompt == self.prompt:
+            return False
+        self.build_chain(prompt)
+        LOG.info(f"[ChatBot][{self.name}] reloaded prompt {self.prompt_file}")
+        return True
+
+    def get_session_id(self, learner_id=None):
+        """
+        Session id for one learner's conversation with this agent
+        :param learner_id: e.g. the Gradio session hash; falls back to the agent's default session
+        :return: session id
+        """
+        if not learner_id:
+            return self.session_id
+        return learner_session_id(self.name, learner_id)
+
     def create_chatbot(self):
+        self.history_window = HistoryWindow(self.history_token_budget, fixed_tokens=estimate_tokens(self.prompt))
+        self.chat_model = hedged_model_from_env(self.name, azure_openai.chat_model, azure_openai.hedge_model)
+        self.build_chain(self.prompt)
+
+    def build_chain(self, prompt):
+        """
+        Build the prompt template and chains for a system prompt and swap them in together
+        :param prompt:
+        """
         system_prompt = ChatPromptTemplate.from_messages([
-            ("system", self.prompt),
+            ("system", prompt),
             MessagesPlaceholder(variable_name="messages"),
         ])
+        chatbot = RunnableLambda(self.trim_history) | system_prompt | self.chat_model
+        chatbot_with_history = RunnableWithMessageHistory(chatbot, get_session_history)
+        cache_scope = f"{self.name}:{hashlib.sha1(prompt.encode('utf-8')).hexdigest()}"
+
+        self.history_window.fixed_tokens = estimate_tokens(prompt)
+        self.prompt, self.cache_scope, self.chatbot, self.chatbot_with_history = (
+            prompt, cache_scope, chatbot, chatbot_with_history
+        )
+
+    def trim_history(self, messages, config=None):
+        """
+        Fit the history into the agent's token budget, dropping the oldest turns first.
+        With a summary memory, already summarized turns are replaced by the summary beforehand
+        :param messages: history followed by the new input
+        :param config: runnable config carrying the session id
+        :return: messages to send
+        """
+        session_id = (config or {}).get("configurable", {}).get("session_id")
+        window_key = session_id
+        if self.summary_memory is not None:
+            messages = self.summary_memory.apply(messages, session_id)
+            # The summarized list starts with the summary, not the stored history that
+            # estimate_call_tokens counts under session_id: keep their estimate caches apart
+            window_key = f"{session_id}:summary" if session_id is not None else None
+        kept, dropped_tokens = self.history_window.trim(messages, window_key)
+        if dropped_tokens:
+            LOG.debug(
+                f"[ChatBot][{self.name}] dropped {len(messages) - len(kept)} messages "
+                f"(~{dropped_tokens} tokens) to fit budget {self.history_token_budget}"
+            )
+        return kept
+
+    def lookup_cached_response(self, messages, user_input):
+        """
+        Check the response cache for an input at the start of a session
+        :param messages: session history before the input
+        :param user_input:
+        :return: (cache key or None, cached response or None)
+        """
+        if self.response_cache is None:
+            return None, None
+        cache_key = self.response_cache.key(self.cache_scope, messages, user_input)
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            LOG.debug(f"[ChatBot][{self.name}] response cache hit")
+        return cache_key, cached
+
+    def estimate_call_tokens(self, messages, session_id=None):
+        """
+        Estimated tokens of a model call: system prompt, history within the budget and completion
+        :param messages: history followed by the new input
+        :param session_id:
+        :return: token estimate
+        """
+        prompt_tokens = self.history_window.count(messages, session_id)
+        if self.history_token_budget > 0:
+            prompt_tokens = min(prompt_tokens, self.history_token_budget)
+        return prompt_tokens + self.expected_completion_tokens
 
-        self.chatbot = system_prompt | chat_model
+    def admit(self, messages, session_id=None, priority=PRIORITY_INTERACTIVE):
+        """
+        Wait for the call to fit the TPM/RPM quotas
+        :param messages: history followed by the new input
+        :param session_id:
+        :param priority:
+        :return: tokens taken from the quota
+        """
+        if not model_admission.enabled:
+            return 0
+        tokens = self.estimate_call_tokens(messages, session_id)
+        model_admission.admit(tokens, priority)
+        return tokens
 
-        self.chatbot_with_history = RunnableWithMessageHistory(self.chatbot, get_session_history)
+    async def aadmit(self, messages, session_id=None, priority=PRIORITY_INTERACTIVE):
+        """
+        Async version of admit
+        """
+        if not model_admission.enabled:
+            return 0
+        tokens = self.estimate_call_tokens(messages, session_id)
+        await model_admission.aadmit(tokens, priority)
+        return tokens
 
+    def settle_stream(self, tokens, messages, session_id, chunks, usage):
+        """
+        Correct the quota taken for a streamed call once it ends, completed or not. Streams
+        rarely report usage, the real size is then estimated from the text received
+        :param tokens: tokens taken at admission
+        :param messages: history followed by the new input
+        :param session_id:
+        :param chunks: text chunks received
+        :param usage: usage_metadata of the stream, if reported
+        """
+        if not tokens:
+            return
+        actual = usage.get("total_tokens") if isinstance(usage, dict) else None
+        if not actual:
+            prompt_tokens = self.estimate_call_tokens(messages, session_id) - self.expected_completion_tokens
+            actual = prompt_tokens + estimate_tokens("".join(chunks))
+        model_admission.settle(tokens, actual)
+
+    def model_span_attributes(self):
+        return {"agent.name": self.name, "model.class": type(self.chat_model).__name__}
+
+    def finish_turn(self, turn, messages, session_id, response, usage=None, backend=None):
+        """
+        Record a completed model turn with its token usage, estimated when the model did not report it
+        :param turn: metrics Turn
+        :param messages: history followed by the new input
+        :param session_id:
+        :param response: reply text
+        :param usage: usage_metadata of the reply
+        :param backend: backend that answered, as tagged by the circuit breaker
+        """
+        if backend:
+            set_attributes({"model.backend": backend})
+        usage = usage if isinstance(usage, dict) else {}
+        prompt_tokens = usage.get("input_tokens")
+        if not prompt_tokens and self.history_window is not None:
+            prompt_tokens = self.estimate_call_tokens(messages, session_id) - self.expected_completion_tokens
+        turn.finish("ok", prompt_tokens, usage.get("output_tokens") or estimate_tokens(response), backend)
+        self.log_turn(turn, session_id, response, backend)
+
+    def log_turn(self, turn, session_id, response, backend=None):
+        """
+        Log one record per turn with its timings, tokens and backend, and a sampled, truncated part of the response
+        :param turn: finished metrics Turn
+        :param session_id:
+        :param response: reply text
+        :param backend: backend that answered, as tagged by the circuit breaker
+        """
+        fields = {**turn.log_fields(), "backend": backend or turn.backend}
+        preview = response_preview(response)
+        LOG.bind(session_id=session_id, **fields).info(
+            "[ChatBot][{}] turn {} {} in {} ms, {}+{} tokens{}{}",
+            self.name, turn.id, turn.outcome, fields["latency_ms"], turn.prompt_tokens, turn.completion_tokens,
+            f" from {fields['backend']}" if fields["backend"] else "",
+            f": {preview}" if preview is not None else "",
+        )
+
+    @traced("agent.chat_with_history", _turn_attributes)
     def chat_with_history(self, user_input, session_id=None):
         if session_id is None:
             session_id = self.session_id
 
-        response = self.chatbot_with_history.invoke(
-            [HumanMessage(content=user_input)],
-            {"configurable": {"session_id": session_id}},
+        turn = start_turn(self.name)
+        history = get_session_history(session_id)
+        user_message = HumanMessage(content=user_input)
+        with span("session.load_messages"):
+            messages = history.messages
+
+        cache_key, cached = self.lookup_cached_response(messages, user_input)
+        if cached is not None:
+            history.add_messages([user_message, AIMessage(content=cached)])
+            turn.finish("cached")
+            return cached
+
+        try:
+            tokens = self.admit(messages + [user_message], session_id)
+        except AdmissionRejected as e:
+            LOG.warning(f"[ChatBot][{self.name}] {e}")
+            turn.finish("rejected")
+            return e.user_message
+
+        with model_call_limiter, turn.model_call(), span("model.invoke", self.model_span_attributes()):
+            response = self.chatbot_with_history.invoke(
+                [user_message],
+                {"configurable": {"session_id": session_id}},
+            )
+
+        model_admission.settle(tokens, usage_tokens(response))
+        self.finish_turn(
+            turn, messages + [user_message], session_id, response.content, response.usage_metadata,
+            response.response_metadata.get("backend"),
+        )
+        if cache_key is not None:
+            self.response_cache.put(cache_key, response.content)
+        return response.content
+
+    @traced("agent.stream_with_history", _turn_attributes)
+    def stream_with_history(self, user_input, session_id=None):
+        """
+        Stream the reply token by token, then append the turn to the session history
+        :param user_input:
+        :param session_id:
+        :return: generator of text chunks
+        """
+        if session_id is None:
+            session_id = self.session_id
+
+        turn = start_turn(self.name)
+        history = get_session_history(session_id)
+        user_message = HumanMessage(content=user_input)
+        with span("session.load_messages"):
+            messages = history.messages
+
+        cache_key, cached = self.lookup_cached_response(messages, user_input)
+        if cached is not None:
+            history.add_messages([user_message, AIMessage(content=cached)])
+            turn.finish("cached")
+            yield cached
+            return
+
+        try:
+            tokens = self.admit(messages + [user_message], session_id)
+        except AdmissionRejected as e:
+            LOG.warning(f"[ChatBot][{self.name}] {e}")
+            turn.finish("rejected")
+            yield e.user_message
+            return
+
+        chunks = []
+        usage = backend = None
+        try:
+            with model_call_limiter, turn.model_call():
+                for chunk in traced_iter("model.stream", self.chatbot.stream(
+                    messages + [user_message],
+                    {"configurable": {"session_id": session_id}},
+                ), self.model_span_attributes()):
+                    usage = chunk.usage_metadata or usage
+                    backend = backend or chunk.response_metadata.get("backend")
+                    if chunk.content:
+                        turn.first_token()
+                        chunks.append(chunk.content)
+                        yield chunk.content
+        finally:
+            self.settle_stream(tokens, messages + [user_message], session_id, chunks, usage)
+
+        response = "".join(chunks)
+        history.add_messages([user_message, AIMessage(content=response)])
+        self.finish_turn(turn, messages + [user_message], session_id, response, usage, backend)
+        if cache_key is not None:
+            self.response_cache.put(cache_key, response)
+
+    @traced("agent.achat_with_history", _turn_attributes)
+    async def achat_with_history(self, user_input, session_id=None):
+        """
+        Async version of chat_with_history
+        :param user_input:
+        :param session_id:
+        :return: response text
+        """
+        if session_id is None:
+            session_id = self.session_id
+
+        turn = start_turn(self.name)
+        history = get_session_history(session_id)
+        user_message = HumanMessage(content=user_input)
+        with span("session.load_messages"):
+            messages = await history.aget_messages()
+
+        cache_key, cached = self.lookup_cached_response(messages, user_input)
+        if cached is not None:
+            await history.aadd_messages([user_message, AIMessage(content=cached)])
+            turn.finish("cached")
+            return cached
+
+        try:
+            tokens = await self.aadmit(messages + [user_message], session_id)
+        except AdmissionRejected as e:
+            LOG.warning(f"[ChatBot][{self.name}] {e}")
+            turn.finish("rejected")
+            return e.user_message
+
+        async with model_call_limiter, turn.amodel_call():
+            with span("model.invoke", self.model_span_attributes()):
+                response = await self.chatbot_with_history.ainvoke(
+                    [user_message],
+                    {"configurable": {"session_id": session_id}},
+                )
+
+        model_admission.settle(tokens, usage_tokens(response))
+        self.finish_turn(
+            turn, messages + [user_message], session_id, response.content, response.usage_metadata,
+            response.response_metadata.get("backend"),
         )
+        if cache_key is not None:
+            self.response_cache.put(cache_key, response.content)
+        return response.content
+
+    @traced("agent.astream_with_history", _turn_attributes)
+    async def astream_with_history(self, user_input, session_id=None):
+        """
+        Async version of stream_with_history
+        :param user_input:
+        :param session_id:
+        :return: async generator of text chunks
+        """
+        if session_id is None:
+            session_id = self.session_id
+
+        turn = start_turn(self.name)
+        history = get_session_history(session_id)
+        user_message = HumanMessage(content=user_input)
+        with span("session.load_messages"):
+            messages = await history.aget_messages()
+
+        cache_key, cached = self.lookup_cached_response(messages, user_input)
+        if cached is not None:
+            await history.aadd_messages([user_message, AIMessage(content=cached)])
+            turn.finish("cached")
+            yield cached
+            return
+
+        try:
+            tokens = await self.aadmit(messages + [user_message], session_id)
+        except AdmissionRejected as e:
+            LOG.warning(f"[ChatBot][{self.name}] {e}")
+            turn.finish("rejected")
+            yield e.user_message
+            return
+
+        chunks = []
+        usage = backend = None
+        try:
+            async with model_call_limiter, turn.amodel_call():
+                async for chunk in traced_stream("model.stream", self.chatbot.astream(
+                    messages + [user_message],
+                    {"configurable": {"session_id": session_id}},
+                ), self.model_span_attributes()):
+                    usage = chunk.usage_metadata or usage
+                    backend = backend or chunk.response_metadata.get("backend")
+                    if chunk.content:
+                        turn.first_token()
+                        chunks.append(chunk.content)
+                        yield chunk.content
+        finally:
+            self.settle_stream(tokens, messages + [user_message], session_id, chunks, usage)
 
-        LOG.debug(f"[ChatBot][{self.name}] {response.content}")
-        return response.content
\ No newline at end of file
+        response = "".join(chunks)
+        await history.aadd_messages([user_message, AIMessage(content=response)])
+        self.finish_turn(turn, messages + [user_message], session_id, response, usage, backend)
+        if cache_key is not None:
+            self.response_cache.put(cache_key, response)
@@ -0,0 +1,291 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any
+
+import openai
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.pydantic_v1 import PrivateAttr
+
+from utils.logger import LOG
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised when the primary model is unavailable and there is no fallback
+    """
+
+
+def is_backend_failure(error):
+    """
+    Whether an error says the backend is unhealthy, rather than that the request was bad
+    :param error:
+    :return: bool
+    """
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return True
+
+
+class CircuitBreakerChatModel(BaseChatModel):
+    """
+    Chat model that fails over from the primary model to a local fallback during outages.
+
+    Outcomes of primary calls over the last ``window_seconds`` are tracked. Once at least
+    ``min_calls`` have been made and the share of failures reaches ``failure_rate``, or
+    the share of calls slower than ``slow_call_seconds`` (to the first chunk) reaches
+    ``slow_rate``, the circuit opens and every call goes to ``fallback`` without waiting
+    on the primary. After ``open_seconds`` the circuit half-opens: up to
+    ``half_open_probes`` calls try the primary again, and their outcome closes or reopens
+    it. A failed primary call is retried on the fallback while closed as well, and async
+    calls give up on the primary after ``call_timeout`` seconds without a first chunk.
+    Replies carry the backend that served them in ``response_metadata["backend"]``.
+    """
+    primary: Any
+    fallback: Any = None
+    primary_name: str = "azure"
+    fallback_name: str = "local"
+    window_seconds: float = 60.0
+    min_calls: int = 10
+    failure_rate: float = 0.5
+    slow_rate: float = 0.5
+    slow_call_seconds: float = 10.0
+    open_seconds: float = 30.0
+    half_open_probes: int = 1
+    call_timeout: float = 20.0
+    clock: Any = time.monotonic
+
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _outcomes: Any = PrivateAttr(default_factory=deque)
+    _state: str = PrivateAttr(default=CLOSED)
+    _opened_at: float = PrivateAttr(default=0.0)
+    _probes: int = PrivateAttr(default=0)
+    _trips: int = PrivateAttr(default=0)
+    _fallback_calls: int = PrivateAttr(default=0)
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @property
+    def _llm_type(self):
+        return "circuit-breaker"
+
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def stats(self):
+        with self._lock:
+            self._maybe_half_open()
+            self._expire(self.clock())
+            calls = len(self._outcomes)
+            return {
+                "state": self._state,
+                "window_calls": calls,
+                "window_failures": sum(1 for _, ok, _ in self._outcomes if not ok),
+                "window_slow": sum(1 for _, _, slow in self._outcomes if slow),
+                "trips": self._trips,
+                "fallback_calls": self._fallback_calls,
+            }
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        probe = self._allow_primary()
+        if probe is not None:
+            started = self.clock()
+            try:
+                result = self.primary._generate(messages, stop=stop, **kwargs)
+            except Exception as e:
+                self._primary_failed(e, probe)
+            except BaseException:
+                self._release_probe(probe)
+                raise
+            else:
+                self._record(True, self.clock() - started, probe)
+                return self._tag_result(result, self.primary_name)
+        return self._tag_result(self._fallback_model()._generate(messages, stop=stop, **kwargs), self.fallback_name)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        probe = self._allow_primary()
+        if probe is not None:
+            started = self.clock()
+            try:
+                result = await asyncio.wait_for(
+                    self.primary._agenerate(messages, stop=stop, **kwargs), self.call_timeout
+                )
+            except Exception as e:
+                self._primary_failed(e, probe)
+            except BaseException:
+                # Cancelled, e.g. the losing side of a hedge: no outcome, but the probe is free again
+                self._release_probe(probe)
+                raise
+            else:
+                self._record(True, self.clock() - started, probe)
+                return self._tag_result(result, self.primary_name)
+        result = await self._fallback_model()._agenerate(messages, stop=stop, **kwargs)
+        return self._tag_result(result, self.fallback_name)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        probe = self._allow_primary()
+        if probe is not None:
+            started = self.clock()
+            stream = self.primary._stream(messages, stop=stop, **kwargs)
+            try:
+                first = next(stream, None)
+            except Exception as e:
+                self._primary_failed(e, probe)
+            except BaseException:
+                self._release_probe(probe)
+                raise
+            else:
+                self._record(True, self.clock() - started, probe)
+                if first is not None:
+                    yield self._tag_chunk(first, self.primary_name)
+                    yield from stream
+                return
+
+        stream = self._fallback_model()._stream(messages, stop=stop, **kwargs)
+        for index, chunk in enumerate(stream):
+            yield self._tag_chunk(chunk, self.fallback_name) if index == 0 else chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        probe = self._allow_primary()
+        if probe is not None:
+            started = self.clock()
+            stream = self.primary._astream(messages, stop=stop, **kwargs)
+            try:
+                first = await asyncio.wait_for(self._first_chunk(stream), self.call_timeout)
+            except Exception as e:
+                await stream.aclose()
+                self._primary_failed(e, probe)
+            except BaseException:
+                # Cancelled, e.g. the learner left: no outcome, but the probe is free again
+                self._release_probe(probe)
+                await stream.aclose()
+                raise
+            else:
+                self._record(True, self.clock() - started, probe)
+                if first is not None:
+                    yield self._tag_chunk(first, self.primary_name)
+                    async for chunk in stream:
+                        yield chunk
+                return
+
+        index = 0
+        async for chunk in self._fallback_model()._astream(messages, stop=stop, **kwargs):
+            yield self._tag_chunk(chunk, self.fallback_name) if index == 0 else chunk
+            index += 1
+
+    @staticmethod
+    async def _first_chunk(stream):
+        try:
+            return await stream.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    def _allow_primary(self):
+        """
+        Decide whether a call may use the primary model
+        :return: None to use the fallback, else whether the call is a half-open probe
+        """
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return False
+            if self._state == HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return True
+            return None
+
+    def _primary_failed(self, error, probe):
+        """
+        Record a failed primary call; re-raise errors that are the request's fault
+        """
+        if not is_backend_failure(error):
+            self._release_probe(probe)
+            raise error
+        self._record(False, None, probe)
+        if self.fallback is None:
+            raise error
+        LOG.warning(
+            f"[CircuitBreaker][{self.primary_name}] {type(error).__name__}: {error}, "
+            f"falling back to {self.fallback_name}"
+        )
+
+    def _release_probe(self, probe):
+        """
+        Give back a half-open probe whose call ended without an outcome
+        """
+        if probe:
+            with self._lock:
+                self._probes -= 1
+
+    def _record(self, ok, latency, probe):
+        slow = latency is not None and latency >= self.slow_call_seconds
+        with self._lock:
+            now = self.clock()
+            if probe:
+                self._probes -= 1
+                if ok and not slow:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                    LOG.info(f"[CircuitBreaker][{self.primary_name}] recovered, circuit closed")
+                elif self._state == HALF_OPEN:
+                    self._open(now)
+                return
+
+            self._outcomes.append((now, ok, slow))
+            self._expire(now)
+            calls = len(self._outcomes)
+            if self._state != CLOSED or calls < self.min_calls:
+                return
+            failures = sum(1 for _, success, _ in self._outcomes if not success)
+            slow_calls = sum(1 for _, _, was_slow in self._outcomes if was_slow)
+            if failures / calls >= self.failure_rate or slow_calls / calls >= self.slow_rate:
+                self._open(now)
+
+    def _open(self, now):
+        self._state = OPEN
+        self._opened_at = now
+        self._trips += 1
+        self._outcomes.clear()
+        LOG.warning(
+            f"[CircuitBreaker][{self.primary_name}] circuit open for {self.open_seconds:.0f}s, "
+            f"serving from {self.fallback_name}"
+        )
+
+    def _maybe_half_open(self):
+        if self._state == OPEN and self.clock() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes = 0
+
+    def _expire(self, now):
+        while self._outcomes and self._outcomes[0][0] <= now - self.window_seconds:
+            self._outcomes.popleft()
+
+    def _fallback_model(self):
+        if self.fallback is None:
+            raise CircuitOpenError(f"{self.primary_name} is unavailable and no fallback model is configured")
+        with self._lock:
+            self._fallback_calls += 1
+        LOG.debug(f"[CircuitBreaker] served by {self.fallback_name}")
+        return self.fallback
+
+    @staticmethod
+    def _tag_result(result, backend):
+        for generation in result.generations:
+            generation.message.response_metadata["backend"] = backend
+        result.llm_output = {**(result.llm_output or {}), "backend": backend}
+        return result
+
+    @staticmethod
+    def _tag_chunk(chunk, backend):
+        # Only the first chunk is tagged: string metadata is concatenated when chunks are merged
+        chunk.message.response_metadata["backend"] = backend
+        return chunk
@@ -1,7 +1,12 @@
+import os
+
 from langchain_core.messages import AIMessage
 
+import azure_openai
+
 from agents.session_history import get_session_history
 from agents.agent_base import AgentBase
+from agents.summary_memory import SummaryMemory
 from utils.logger import LOG
 
 
@@ -14,4 +19,11 @@ class ConversationAgent(AgentBase):
             name="conversation",
             prompt_file="../prompts/conversation_prompt.txt",
             session_id=session_id
-        )
\ No newline at end of file
+        )
+        if os.getenv("CONVERSATION_SUMMARY_MEMORY", "false").lower() == "true":
+            self.summary_memory = SummaryMemory(
+                azure_openai.chat_model,
+                threshold_tokens=int(os.getenv("CONVERSATION_SUMMARY_THRESHOLD_TOKENS", "3000")),
+                recent_tokens=int(os.getenv("CONVERSATION_SUMMARY_RECENT_TOKENS", "1500")),
+                agent=self.name,
+            )
\ No newline at end of file
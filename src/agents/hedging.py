@@ -0,0 +1,240 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.pydantic_v1 import Field, PrivateAttr
+
+from agents.history_window import estimate_message_tokens
+from utils.admission import model_admission
+from utils.concurrency import model_call_limiter
+from utils.logger import LOG
+
+_EXHAUSTED = object()
+
+
+class HedgedChatModel(BaseChatModel):
+    """
+    Chat model that hedges slow async calls with a second call.
+
+    If the first call has not produced its first chunk (or, for ``ainvoke``, its answer)
+    within the ``percentile`` of recently observed latencies, a second call goes to
+    ``alternate`` (or the same model, where a router may pick another deployment). The
+    first to answer wins and the other is cancelled, so callers only ever see and store
+    one reply. Hedges are limited to ``budget_ratio`` of the calls made so far, which
+    caps the extra spend, and are only sent when the concurrency limiter and the TPM/RPM
+    admission have room right away, so they count against both like any other call.
+    The delay follows the first call's own latency; when the hedge wins, the losing call
+    is cancelled straight away, giving back its slot, and the time it had taken so far
+    is recorded as a lower bound. Sync calls come from background work and are not hedged.
+    """
+    model: Any
+    alternate: Any = None
+    percentile: float = 0.9
+    min_delay: float = 0.25
+    initial_delay: float = 2.0
+    min_samples: int = 20
+    budget_ratio: float = 0.1
+    window: int = 200
+    expected_completion_tokens: int = 300
+    call_limiter: Any = Field(default_factory=lambda: model_call_limiter)
+    admission: Any = Field(default_factory=lambda: model_admission)
+
+    _first_chunk_latencies: Any = PrivateAttr()
+    _invoke_latencies: Any = PrivateAttr()
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _requests: int = PrivateAttr(default=0)
+    _hedges: int = PrivateAttr(default=0)
+    _hedge_wins: int = PrivateAttr(default=0)
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._first_chunk_latencies = deque(maxlen=self.window)
+        self._invoke_latencies = deque(maxlen=self.window)
+
+    @property
+    def _llm_type(self):
+        return "hedged"
+
+    def hedge_delay(self, samples):
+        """
+        Seconds to wait for the first call before hedging
+        :param samples: recent latencies of this kind of call
+        :return: delay
+        """
+        if len(samples) < self.min_samples:
+            return self.initial_delay
+        ordered = sorted(samples)
+        return max(ordered[int(self.percentile * (len(ordered) - 1))], self.min_delay)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "hedges": self._hedges,
+                "hedge_wins": self._hedge_wins,
+                "hedge_rate": self._hedges / self._requests if self._requests else 0.0,
+                "stream_delay_ms": self.hedge_delay(self._first_chunk_latencies) * 1000,
+                "invoke_delay_ms": self.hedge_delay(self._invoke_latencies) * 1000,
+            }
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return self.model._generate(messages, stop=stop, **kwargs)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        yield from self.model._stream(messages, stop=stop, **kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        def start(model):
+            return asyncio.ensure_future(model._agenerate(messages, stop=stop, **kwargs))
+
+        _, result = await self._race(start, self._invoke_latencies, tokens=self._estimate(messages))
+        return result
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        streams = []
+
+        async def first_chunk(stream):
+            try:
+                return await stream.__anext__()
+            except StopAsyncIteration:
+                return _EXHAUSTED
+
+        def start(model):
+            stream = model._astream(messages, stop=stop, **kwargs)
+            streams.append(stream)
+            return asyncio.ensure_future(first_chunk(stream))
+
+        async def close(index):
+            await streams[index].aclose()
+
+        winner, chunk = await self._race(start, self._first_chunk_latencies, close, tokens=self._estimate(messages))
+        stream = streams[winner]
+        try:
+            if chunk is _EXHAUSTED:
+                return
+            yield chunk
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    async def _race(self, start, samples, close=None, tokens=0):
+        """
+        Run the call, hedge it once the delay has passed and keep the first answer
+        :param start: callable(model) -> task for the call's first result
+        :param samples: latency samples for this kind of call
+        :param close: optional coroutine function(index) releasing a losing call
+        :param tokens: estimated tokens of a hedge, taken from the TPM quota
+        :return: (index of the winning call, its first result)
+        """
+        delay = self.hedge_delay(samples)
+        started = time.perf_counter()
+        tasks = [start(self.model)]
+        with self._lock:
+            self._requests += 1
+
+        hedged = False
+        try:
+            await asyncio.wait(tasks, timeout=delay)
+            if not tasks[0].done() and self._take_hedge(tokens):
+                hedged = True
+                LOG.debug(f"[Hedging][{self.name}] no answer after {delay * 1000:.0f}ms, hedging")
+                tasks.append(start(self.alternate or self.model))
+            winner = await self._first_success(tasks)
+        except BaseException:
+            await self._cancel(tasks, range(len(tasks)), close)
+            if hedged:
+                self.call_limiter.release()
+            raise
+
+        # The first call's latency; when it lost, the time so far is a lower bound of it
+        self._record_latency(samples, time.perf_counter() - started)
+        if winner != 0:
+            with self._lock:
+                self._hedge_wins += 1
+        await self._cancel(tasks, [index for index in range(len(tasks)) if index != winner], close)
+        if hedged:
+            self.call_limiter.release()
+        return winner, tasks[winner].result()
+
+    def _record_latency(self, samples, latency):
+        with self._lock:
+            samples.append(latency)
+
+    @staticmethod
+    async def _first_success(tasks):
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for index, task in enumerate(tasks):
+                if task not in done:
+                    continue
+                if task.exception() is None:
+                    return index
+                error = error or task.exception()
+        raise error
+
+    @staticmethod
+    async def _cancel(tasks, indexes, close):
+        for index in indexes:
+            task = tasks[index]
+            task.cancel()
+            try:
+                await task
+            except BaseException:
+                pass
+            if close is not None:
+                await close(index)
+
+    def _take_hedge(self, tokens):
+        """
+        Reserve a hedge against the budget, a concurrency slot and the TPM/RPM quota, without waiting
+        :param tokens: estimated tokens of the hedge
+        :return: True if the hedge may be sent; its slot is then released by the caller
+        """
+        with self._lock:
+            if self._hedges + 1 > self.budget_ratio * self._requests:
+                return False
+            self._hedges += 1
+        if self.call_limiter.try_acquire():
+            if self.admission.try_admit(tokens):
+                return True
+            self.call_limiter.release()
+        LOG.debug(f"[Hedging][{self.name}] no capacity for a hedge")
+        with self._lock:
+            self._hedges -= 1
+        return False
+
+    def _estimate(self, messages):
+        return sum(estimate_message_tokens(m) for m in messages) + self.expected_completion_tokens
+
+
+def hedged_model_from_env(name, model, alternate=None):
+    """
+    Wrap an agent's model for hedging when MODEL_HEDGING is enabled
+    :param name: agent name, for MODEL_HEDGE_BUDGET_PERCENT_<NAME>
+    :param model:
+    :param alternate: model for the second call, defaults to ``model``
+    :return: HedgedChatModel or ``model``
+    """
+    if os.getenv("MODEL_HEDGING", "false").lower() != "true":
+        return model
+    budget = os.getenv(f"MODEL_HEDGE_BUDGET_PERCENT_{name.upper()}", os.getenv("MODEL_HEDGE_BUDGET_PERCENT", "10"))
+    return HedgedChatModel(
+        model=model,
+        alternate=alternate,
+        name=name,
+        percentile=float(os.getenv("MODEL_HEDGE_PERCENTILE", "90")) / 100,
+        min_delay=float(os.getenv("MODEL_HEDGE_MIN_DELAY_MS", "250")) / 1000,
+        initial_delay=float(os.getenv("MODEL_HEDGE_INITIAL_DELAY_MS", "2000")) / 1000,
+        budget_ratio=float(budget) / 100,
+        expected_completion_tokens=int(os.getenv("MODEL_EXPECTED_COMPLETION_TOKENS", "300")),
+    )
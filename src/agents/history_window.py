@@ -0,0 +1,124 @@
+from bisect import bisect_left
+from collections import OrderedDict
+
+from langchain_core.messages import HumanMessage
+
+from utils.tracing import traced
+
+# Rough per-message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text):
+    """
+    Fast local token estimate: ~4 characters per token for ASCII text and one token
+    per character otherwise (CJK feedback in the prompts tokenizes close to that)
+    :param text:
+    :return: estimated token count
+    """
+    if not isinstance(text, str):
+        text = str(text)
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return (len(text) - non_ascii + 3) // 4 + non_ascii
+
+
+def estimate_message_tokens(message):
+    return estimate_tokens(message.content) + MESSAGE_OVERHEAD_TOKENS
+
+
+class _SessionCounts:
+    # The first and last counted messages are held, not their ids: CPython reuses the id
+    # of a freed message right away, so after a clear the new first message may share it
+    __slots__ = ("first", "last", "prefix")
+
+    def __init__(self):
+        self.first = None
+        self.last = None
+        self.prefix = [0]
+
+
+class HistoryWindow:
+    """
+    Trims the oldest turns of a conversation to fit a token budget.
+
+    The budget covers the system prompt (``fixed_tokens``), the history and the new
+    input. Messages before the first HumanMessage (a scenario's opening line, a running
+    summary) are always kept, and cuts happen on turn boundaries so the window starts
+    with a HumanMessage. Per-message estimates are cached per session as prefix sums,
+    so each turn only estimates the messages appended since the previous one.
+    """
+    def __init__(self, budget, fixed_tokens=0, max_sessions=10000):
+        self.budget = budget
+        self.fixed_tokens = fixed_tokens
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+
+    def prefix_sums(self, session_key, history):
+        """
+        Cumulative token estimates of ``history``, cached per session
+        :param session_key: None disables caching
+        :param history:
+        :return: list where item i is the estimate of history[:i]
+        """
+        counts = self._sessions.get(session_key) if session_key is not None else None
+        cached = len(counts.prefix) - 1 if counts else 0
+        if not counts or cached > len(history) or (
+            cached and (counts.first is not history[0] or counts.last is not history[cached - 1])
+        ):
+            # History was cleared, rewound or reloaded: start over
+            counts = _SessionCounts()
+            cached = 0
+
+        for message in history[cached:]:
+            counts.prefix.append(counts.prefix[-1] + estimate_message_tokens(message))
+        if history:
+            counts.first, counts.last = history[0], history[-1]
+
+        if session_key is not None:
+            self._sessions[session_key] = counts
+            self._sessions.move_to_end(session_key)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return counts.prefix
+
+    def count(self, messages, session_key=None):
+        """
+        Estimated prompt tokens for the system prompt plus ``messages``
+        :param messages: history followed by the new input
+        :param session_key:
+        :return: token estimate
+        """
+        if not messages:
+            return self.fixed_tokens
+        prefix = self.prefix_sums(session_key, messages[:-1])
+        return self.fixed_tokens + prefix[-1] + estimate_message_tokens(messages[-1])
+
+    @traced("history.trim", lambda window, messages, session_key=None: {"history.messages": len(messages)})
+    def trim(self, messages, session_key=None):
+        """
+        Drop the oldest turns until the prompt fits the budget
+        :param messages: history followed by the new input
+        :param session_key: key for the per-session estimate cache
+        :return: (kept messages, dropped token estimate)
+        """
+        if self.budget <= 0 or len(messages) < 2:
+            return messages, 0
+
+        history = messages[:-1]
+        prefix = self.prefix_sums(session_key, history)
+        pinned = 0
+        while pinned < len(history) and not isinstance(history[pinned], HumanMessage):
+            pinned += 1
+
+        available = self.budget - self.fixed_tokens - prefix[pinned] - estimate_message_tokens(messages[-1])
+        end = len(history)
+        if prefix[end] - prefix[pinned] <= available:
+            return messages, 0
+
+        start = max(bisect_left(prefix, prefix[end] - available, lo=pinned), pinned)
+        start = min(start, end)
+        while start < end and not isinstance(history[start], HumanMessage):
+            start += 1
+
+        kept = messages[:pinned] + messages[start:]
+        return kept, prefix[start] - prefix[pinned]
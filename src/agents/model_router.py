@@ -0,0 +1,330 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, List
+
+import openai
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.pydantic_v1 import Field, PrivateAttr
+
+from agents.history_window import estimate_message_tokens, estimate_tokens
+from utils.logger import LOG
+
+# Errors worth retrying on another deployment; anything else (bad request, content filter) is raised
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+QUOTA_WINDOW_SECONDS = 60.0
+
+
+def retry_after_seconds(error):
+    """
+    Delay requested by a 429 response, from the retry-after-ms or retry-after header
+    :param error:
+    :return: seconds, or None when the response does not say
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            return max(float(value) * scale, 0.0)
+        except ValueError:
+            continue
+    return None
+
+
+class Deployment:
+    """
+    One model deployment behind the router, with its observed latency and token usage
+    """
+    def __init__(self, name, model, weight=1.0, tpm=0):
+        self.name = name
+        self.model = model
+        self.weight = weight
+        self.tpm = tpm
+
+        self.ewma_latency = None
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.consecutive_failures = 0
+
+        self.requests = 0
+        self.rate_limited = 0
+        self.failures = 0
+        self._usage = deque()
+        self._used = 0
+
+    def tokens_used(self, now):
+        while self._usage and self._usage[0][0] <= now - QUOTA_WINDOW_SECONDS:
+            self._used -= self._usage.popleft()[1]
+        return self._used
+
+    def headroom(self, now):
+        if self.tpm <= 0:
+            return 1.0
+        return max(0.0, 1.0 - self.tokens_used(now) / self.tpm)
+
+    def has_quota(self, now, tokens):
+        return self.tpm <= 0 or self.tokens_used(now) + tokens <= self.tpm
+
+    def quota_frees_at(self):
+        return self._usage[0][0] + QUOTA_WINDOW_SECONDS if self._usage else 0.0
+
+    def record_usage(self, now, tokens):
+        self._usage.append((now, tokens))
+        self._used += tokens
+
+    def record_latency(self, latency, alpha):
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency = alpha * latency + (1 - alpha) * self.ewma_latency
+
+    def stats(self, now):
+        return {
+            "weight": self.weight,
+            "tpm": self.tpm,
+            "tpm_used": self.tokens_used(now),
+            "ewma_latency_ms": self.ewma_latency * 1000 if self.ewma_latency is not None else None,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "rate_limited": self.rate_limited,
+            "failures": self.failures,
+            "cooling_down": self.cooldown_until > now,
+        }
+
+
+class ModelRouter(BaseChatModel):
+    """
+    Chat model that spreads calls over several deployments.
+
+    Each call goes to a deployment picked at random with probability proportional to
+    ``weight * remaining TPM share / (EWMA latency * (1 + calls in flight))``, so slow or
+    nearly exhausted deployments get less traffic without being starved of the samples
+    that would show they recovered. Latency is the full call for ``invoke`` and the time
+    to the first chunk for streams. Deployments that answer 429 cool down for their
+    ``Retry-After`` (jittered exponential backoff when there is none) and the call fails
+    over to another one; streams only fail over before their first chunk.
+    """
+    deployments: List[Any]
+    ewma_alpha: float = 0.3
+    max_attempts: int = 4
+    backoff_base: float = 1.0
+    max_backoff: float = 30.0
+    max_wait: float = 30.0
+    clock: Any = time.monotonic
+    sleep: Any = time.sleep
+    asleep: Any = asyncio.sleep
+    rng: Any = Field(default_factory=random.Random)
+
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @property
+    def _llm_type(self):
+        return "model-router"
+
+    def stats(self):
+        now = self.clock()
+        with self._lock:
+            return {deployment.name: deployment.stats(now) for deployment in self.deployments}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._estimate(messages)
+        tried, last_error = set(), None
+        for _ in range(self.max_attempts):
+            deployment = self._wait_for_deployment(tokens, tried, last_error)
+            started = self._begin(deployment, tokens)
+            try:
+                result = deployment.model._generate(messages, stop=stop, **kwargs)
+            except Exception as e:
+                if not self._failed(deployment, e):
+                    raise
+                tried.add(deployment.name)
+                last_error = e
+                continue
+            finally:
+                self._end(deployment)
+            self._succeeded(deployment, self.clock() - started, tokens, self._result_tokens(result, tokens))
+            return result
+        raise last_error
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._estimate(messages)
+        tried, last_error = set(), None
+        for _ in range(self.max_attempts):
+            deployment = await self._await_deployment(tokens, tried, last_error)
+            started = self._begin(deployment, tokens)
+            try:
+                result = await deployment.model._agenerate(messages, stop=stop, **kwargs)
+            except Exception as e:
+                if not self._failed(deployment, e):
+                    raise
+                tried.add(deployment.name)
+                last_error = e
+                continue
+            finally:
+                self._end(deployment)
+            self._succeeded(deployment, self.clock() - started, tokens, self._result_tokens(result, tokens))
+            return result
+        raise last_error
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._estimate(messages)
+        tried, last_error = set(), None
+        for _ in range(self.max_attempts):
+            deployment = self._wait_for_deployment(tokens, tried, last_error)
+            started = self._begin(deployment, tokens)
+            latency, output = None, []
+            try:
+                for chunk in deployment.model._stream(messages, stop=stop, **kwargs):
+                    if latency is None:
+                        latency = self.clock() - started
+                    output.append(chunk.text)
+                    yield chunk
+            except Exception as e:
+                if not self._failed(deployment, e) or latency is not None:
+                    raise
+                tried.add(deployment.name)
+                last_error = e
+                continue
+            finally:
+                self._end(deployment)
+            self._succeeded(deployment, latency if latency is not None else self.clock() - started, tokens,
+                            tokens + estimate_tokens("".join(output)))
+            return
+        raise last_error
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._estimate(messages)
+        tried, last_error = set(), None
+        for _ in range(self.max_attempts):
+            deployment = await self._await_deployment(tokens, tried, last_error)
+            started = self._begin(deployment, tokens)
+            latency, output = None, []
+            try:
+                async for chunk in deployment.model._astream(messages, stop=stop, **kwargs):
+                    if latency is None:
+                        latency = self.clock() - started
+                    output.append(chunk.text)
+                    yield chunk
+            except Exception as e:
+                if not self._failed(deployment, e) or latency is not None:
+                    raise
+                tried.add(deployment.name)
+                last_error = e
+                continue
+            finally:
+                self._end(deployment)
+            self._succeeded(deployment, latency if latency is not None else self.clock() - started, tokens,
+                            tokens + estimate_tokens("".join(output)))
+            return
+        raise last_error
+
+    @staticmethod
+    def _estimate(messages):
+        return sum(estimate_message_tokens(message) for message in messages)
+
+    @staticmethod
+    def _result_tokens(result, prompt_tokens):
+        usage = (result.llm_output or {}).get("token_usage") or {}
+        if usage.get("total_tokens"):
+            return usage["total_tokens"]
+        return prompt_tokens + sum(estimate_tokens(generation.text) for generation in result.generations)
+
+    def _pick(self, tokens, tried):
+        """
+        Choose a deployment for a call
+        :param tokens: estimated prompt tokens
+        :param tried: names of deployments that already failed this call
+        :return: (deployment, 0) or (None, seconds until one may be available)
+        """
+        now = self.clock()
+        ready = [d for d in self.deployments if d.cooldown_until <= now and d.has_quota(now, tokens)]
+        candidates = [d for d in ready if d.name not in tried] or ready
+        if not candidates:
+            frees_at = [d.cooldown_until if d.cooldown_until > now else d.quota_frees_at() for d in self.deployments]
+            return None, max(min(frees_at) - now, 0.01)
+
+        known = [d.ewma_latency for d in candidates if d.ewma_latency is not None]
+        # Unmeasured deployments get the best observed latency, so they are tried early
+        default_latency = min(known) if known else 1.0
+        scores = [
+            d.weight * max(d.headroom(now), 0.01)
+            / (max(d.ewma_latency if d.ewma_latency is not None else default_latency, 1e-3) * (1 + d.in_flight))
+            for d in candidates
+        ]
+        return self.rng.choices(candidates, weights=scores)[0], 0
+
+    def _wait_for_deployment(self, tokens, tried, last_error):
+        deadline = self.clock() + self.max_wait
+        while True:
+            with self._lock:
+                deployment, wait = self._pick(tokens, tried)
+            if deployment is not None:
+                return deployment
+            self._check_deadline(wait, deadline, last_error)
+            self.sleep(wait)
+
+    async def _await_deployment(self, tokens, tried, last_error):
+        deadline = self.clock() + self.max_wait
+        while True:
+            with self._lock:
+                deployment, wait = self._pick(tokens, tried)
+            if deployment is not None:
+                return deployment
+            self._check_deadline(wait, deadline, last_error)
+            await self.asleep(wait)
+
+    def _check_deadline(self, wait, deadline, last_error):
+        if self.clock() + wait > deadline:
+            if last_error is not None:
+                raise last_error
+            raise RuntimeError("No model deployment available within the wait limit")
+        LOG.debug(f"[ModelRouter] all deployments busy, waiting {wait:.2f}s")
+
+    def _begin(self, deployment, tokens):
+        with self._lock:
+            deployment.in_flight += 1
+            deployment.requests += 1
+            # Reserve the prompt estimate now so concurrent calls see the quota being used
+            deployment.record_usage(self.clock(), tokens)
+        return self.clock()
+
+    def _end(self, deployment):
+        with self._lock:
+            deployment.in_flight -= 1
+
+    def _succeeded(self, deployment, latency, reserved_tokens, used_tokens):
+        with self._lock:
+            deployment.consecutive_failures = 0
+            deployment.record_latency(latency, self.ewma_alpha)
+            if used_tokens > reserved_tokens:
+                deployment.record_usage(self.clock(), used_tokens - reserved_tokens)
+
+    def _failed(self, deployment, error):
+        """
+        Put a deployment in cooldown after a retryable error
+        :return: True if the call should fail over
+        """
+        if not isinstance(error, RETRYABLE_ERRORS):
+            return False
+        with self._lock:
+            deployment.consecutive_failures += 1
+            delay = retry_after_seconds(error) if isinstance(error, openai.RateLimitError) else None
+            if delay is None:
+                delay = min(self.max_backoff, self.backoff_base * 2 ** (deployment.consecutive_failures - 1))
+            delay *= 1 + self.rng.uniform(0, 0.25)
+            deployment.cooldown_until = self.clock() + delay
+            if isinstance(error, openai.RateLimitError):
+                deployment.rate_limited += 1
+            else:
+                deployment.failures += 1
+        LOG.warning(f"[ModelRouter][{deployment.name}] {type(error).__name__}, cooling down for {delay:.1f}s")
+        return True
@@ -0,0 +1,124 @@
+import json
+import time
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import message_to_dict, messages_from_dict
+
+
+class RedisChatMessageHistory(BaseChatMessageHistory):
+    """
+    Chat history shared between replicas through a Redis-protocol server.
+
+    Messages live in the list ``{prefix}{session_id}`` and a generation counter in
+    ``{prefix}{session_id}:gen`` is bumped on every clear. The local copy acts as a
+    read-through cache: revalidating it is a single pipelined round trip that checks the
+    generation and fetches only messages appended by other replicas, and it is skipped
+    entirely within ``revalidate_interval`` seconds of the last check.
+    """
+    def __init__(self, session_id, client, key_prefix="lm:session:", ttl_seconds=0, revalidate_interval=1.0,
+                 clock=time.monotonic):
+        self.session_id = session_id
+        self.client = client
+        self.key = f"{key_prefix}{session_id}"
+        self.gen_key = f"{self.key}:gen"
+        self.ttl_seconds = int(ttl_seconds)
+        self.revalidate_interval = revalidate_interval
+        self.clock = clock
+
+        self._messages = None
+        self._generation = None
+        self._validated_at = None
+
+    @property
+    def loaded(self):
+        return self._messages is not None
+
+    @property
+    def messages(self):
+        if self._is_fresh():
+            return self._messages
+
+        cached = len(self._messages) if self._messages is not None else 0
+        pipe = self.client.pipeline(transaction=False)
+        pipe.get(self.gen_key)
+        pipe.lrange(self.key, cached, -1)
+        generation, tail = pipe.execute()
+        generation = int(generation or 0)
+
+        if self._messages is None or generation != self._generation:
+            # Cleared elsewhere (or first access): the tail is relative to a stale copy
+            self._messages = self._decode(self.client.lrange(self.key, 0, -1))
+        else:
+            self._messages.extend(self._decode(tail))
+
+        self._generation = generation
+        self._validated_at = self.clock()
+        return self._messages
+
+    def add_messages(self, messages):
+        messages = list(messages)
+        if not messages:
+            return
+        expected = len(self.messages) + len(messages)
+
+        pipe = self.client.pipeline(transaction=False)
+        pipe.rpush(self.key, *[json.dumps(message_to_dict(m), ensure_ascii=False) for m in messages])
+        if self.ttl_seconds > 0:
+            pipe.expire(self.key, self.ttl_seconds)
+            pipe.expire(self.gen_key, self.ttl_seconds)
+        length = pipe.execute()[0]
+
+        if length == expected:
+            self._messages.extend(messages)
+        else:
+            # Another replica appended concurrently, refetch on next access
+            self._validated_at = None
+            self._messages = None
+
+    def clear(self):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.delete(self.key)
+        pipe.incr(self.gen_key)
+        if self.ttl_seconds > 0:
+            pipe.expire(self.gen_key, self.ttl_seconds)
+        generation = pipe.execute()[1]
+
+        self._messages = []
+        self._generation = int(generation)
+        self._validated_at = self.clock()
+
+    def truncate(self, count):
+        """
+        Keep only the first ``count`` messages. Bumps the generation like a clear, so other
+        replicas reload the list instead of treating their copy as a prefix of it
+        :param count:
+        """
+        messages = self.messages[:count]
+        pipe = self.client.pipeline(transaction=False)
+        if count > 0:
+            pipe.ltrim(self.key, 0, count - 1)
+        else:
+            pipe.delete(self.key)
+        pipe.incr(self.gen_key)
+        if self.ttl_seconds > 0:
+            pipe.expire(self.gen_key, self.ttl_seconds)
+        generation = pipe.execute()[1]
+
+        self._messages = messages
+        self._generation = int(generation)
+        self._validated_at = self.clock()
+
+    def _is_fresh(self):
+        return (
+            self._messages is not None
+            and self._validated_at is not None
+            and self.clock() - self._validated_at < self.revalidate_interval
+        )
+
+    @staticmethod
+    def _decode(items):
+        return messages_from_dict([json.loads(item) for item in items])
+
+    def __str__(self):
+        cached = len(self._messages) if self._messages is not None else "not loaded"
+        return f"RedisChatMessageHistory({self.session_id}, {cached} cached)"
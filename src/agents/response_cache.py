@@ -0,0 +1,230 @@
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from utils.logger import LOG
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize_input(text):
+    """
+    Normalize learner input for cache lookups: case, punctuation and spacing are ignored
+    :param text:
+    :return: normalized text
+    """
+    return " ".join(_PUNCTUATION.sub(" ", text.lower()).split())
+
+
+def _shingles(text, size=3):
+    padded = f" {text} "
+    if len(padded) <= size:
+        return {padded}
+    return {padded[i:i + size] for i in range(len(padded) - size + 1)}
+
+
+class _Entry:
+    __slots__ = ("context", "text", "signature", "response", "stored_at")
+
+    def __init__(self, context, text, signature, response, stored_at):
+        self.context = context
+        self.text = text
+        self.signature = signature
+        self.response = response
+        self.stored_at = stored_at
+
+
+class ResponseCache:
+    """
+    Replies to near-identical learner inputs at the start of a session.
+
+    Entries are keyed by the conversation context (agent, system prompt and the short
+    history before the input) plus the normalized input. Inputs that differ slightly
+    ("how are you" / "how r you") are matched approximately: each input gets a MinHash
+    signature over character trigrams, signatures are indexed with LSH bands, and a
+    candidate is a hit when its estimated Jaccard similarity reaches
+    ``similarity_threshold``. Lookups only apply while the history has at most
+    ``max_history_messages`` messages, later turns depend on the whole conversation.
+    """
+    def __init__(self, max_entries=2000, ttl_seconds=3600, similarity_threshold=0.8, max_history_messages=1,
+                 num_perm=64, bands=16, clock=time.monotonic):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.max_history_messages = max_history_messages
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.clock = clock
+
+        # Fixed seed so signatures are comparable across restarts and replicas
+        rng = random.Random(1)
+        self._perms = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)
+        ]
+        self._entries = OrderedDict()
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+        self.lookups = 0
+        self.exact_hits = 0
+        self.approximate_hits = 0
+
+    def key(self, scope, history, user_input):
+        """
+        Cache key for ``user_input`` after ``history``
+        :param scope: agent name and prompt hash
+        :param history: session messages before the input
+        :param user_input:
+        :return: key, or None when the history is too long to cache
+        """
+        if len(history) > self.max_history_messages:
+            return None
+        text = normalize_input(user_input)
+        if not text:
+            return None
+        digest = hashlib.sha1(scope.encode("utf-8"))
+        for message in history:
+            digest.update(f"\0{message.type}\0{normalize_input(message.content)}".encode("utf-8"))
+        return digest.hexdigest(), text
+
+    def get(self, key):
+        """
+        Look up a cached response
+        :param key: from ``key``, may be None
+        :return: response text or None
+        """
+        if key is None:
+            return None
+        context, text = key
+        with self._lock:
+            self.lookups += 1
+            self._evict_expired()
+
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry):
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self.exact_hits += 1
+                self._entries.move_to_end(key)
+                return entry.response
+
+            signature = self._signature(text)
+            best, best_similarity = None, self.similarity_threshold
+            for candidate_key in self._candidates(context, signature):
+                candidate = self._entries[candidate_key]
+                if self._expired(candidate):
+                    continue
+                similarity = self._similarity(signature, candidate.signature)
+                if similarity >= best_similarity:
+                    best, best_similarity = candidate_key, similarity
+            if best is None:
+                return None
+
+            self.approximate_hits += 1
+            self._entries.move_to_end(best)
+            LOG.debug(f"[ResponseCache] '{text}' matched '{best[1]}' ({best_similarity:.2f})")
+            return self._entries[best].response
+
+    def put(self, key, response):
+        """
+        Store a response
+        :param key: from ``key``, may be None
+        :param response:
+        """
+        if key is None or not response:
+            return
+        context, text = key
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            signature = self._signature(text)
+            self._entries[key] = _Entry(context, text, signature, response, self.clock())
+            for band in self._bands(signature):
+                self._buckets.setdefault((context, band), set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def stats(self):
+        with self._lock:
+            hits = self.exact_hits + self.approximate_hits
+            return {
+                "entries": len(self._entries),
+                "lookups": self.lookups,
+                "hits": hits,
+                "exact_hits": self.exact_hits,
+                "approximate_hits": self.approximate_hits,
+                "hit_rate": hits / self.lookups if self.lookups else 0.0,
+            }
+
+    def _signature(self, text):
+        hashes = [zlib.crc32(shingle.encode("utf-8")) for shingle in _shingles(text)]
+        return tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes) for a, b in self._perms
+        )
+
+    def _bands(self, signature):
+        return [(i, signature[i * self.rows:(i + 1) * self.rows]) for i in range(self.bands)]
+
+    def _candidates(self, context, signature):
+        candidates = set()
+        for band in self._bands(signature):
+            candidates |= self._buckets.get((context, band), set())
+        return candidates
+
+    @staticmethod
+    def _similarity(a, b):
+        return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        for band in self._bands(entry.signature):
+            bucket = self._buckets.get((entry.context, band))
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[(entry.context, band)]
+
+    def _expired(self, entry):
+        return self.ttl_seconds > 0 and self.clock() - entry.stored_at >= self.ttl_seconds
+
+    def _evict_expired(self):
+        # Hits reorder entries, so this only sweeps the least recently used end; lookups
+        # check expiry of the entries they return as well
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if not self._expired(entry):
+                break
+            self._remove(key)
+
+
+def response_cache_from_env():
+    """
+    Shared response cache configured by RESPONSE_CACHE_* variables
+    :return: ResponseCache, or None when RESPONSE_CACHE is not enabled
+    """
+    if os.getenv("RESPONSE_CACHE", "false").lower() != "true":
+        return None
+    return ResponseCache(
+        max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2000")),
+        ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600")),
+        similarity_threshold=float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.8")),
+        max_history_messages=int(os.getenv("RESPONSE_CACHE_MAX_HISTORY_MESSAGES", "1")),
+    )
+
+
+response_cache = response_cache_from_env()
@@ -0,0 +1,120 @@
+import re
+import threading
+import time
+from collections import deque
+
+from utils.logger import LOG
+
+# "1: Innovate" / "2. **Resilient**" lines of the vocabulary presentation
+_WORD_LINE = re.compile(r"^\s*\d+\s*[:.]\s*\**\s*([A-Za-z][A-Za-z' -]*[A-Za-z])", re.MULTILINE)
+
+
+def round_fingerprint(text):
+    """
+    Identify a vocabulary round by its word set, falling back to the normalized text
+    :param text:
+    :return: hashable fingerprint
+    """
+    words = {match.strip().lower() for match in _WORD_LINE.findall(text)}
+    if words:
+        return frozenset(words)
+    return " ".join(text.lower().split())
+
+
+class RoundPool:
+    """
+    Pool of pre-generated opening rounds, refilled by a background worker.
+
+    ``pop`` never waits for the model: it returns a ready round or None. The worker keeps
+    up to ``depth`` rounds ready and discards rounds whose fingerprint matches one already
+    in the pool or one of the last ``recent_window`` rounds served.
+    """
+    def __init__(self, generate, depth=3, recent_window=10, retry_delay=5.0, name="pool"):
+        self.generate = generate
+        self.depth = depth
+        self.retry_delay = retry_delay
+        self.name = name
+
+        self._ready = deque()
+        self._recent = deque(maxlen=recent_window)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+        self.served = 0
+        self.misses = 0
+        self.duplicates = 0
+
+    def start(self):
+        with self._cond:
+            if self.depth <= 0 or self._stopped or (self._thread and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=self._run, name=f"round-pool-{self.name}", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def pop(self):
+        """
+        Take a ready round
+        :return: round text, or None if the pool is empty
+        """
+        self.start()
+        with self._cond:
+            if not self._ready:
+                self.misses += 1
+                return None
+            text, fingerprint = self._ready.popleft()
+            self._recent.append(fingerprint)
+            self.served += 1
+            self._cond.notify()
+        return text
+
+    def stats(self):
+        with self._cond:
+            return {
+                "ready": len(self._ready),
+                "depth": self.depth,
+                "served": self.served,
+                "misses": self.misses,
+                "duplicates": self.duplicates,
+            }
+
+    def _run(self):
+        failures = 0
+        while True:
+            with self._cond:
+                while len(self._ready) >= self.depth and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+
+            try:
+                text = self.generate()
+            except Exception as e:
+                failures += 1
+                LOG.error(f"[RoundPool][{self.name}] failed to generate a round: {e}")
+                self._backoff(failures)
+                continue
+
+            fingerprint = round_fingerprint(text)
+            with self._cond:
+                duplicate = fingerprint in self._recent or any(fp == fingerprint for _, fp in self._ready)
+                if not duplicate:
+                    self._ready.append((text, fingerprint))
+                    failures = 0
+                    continue
+                self.duplicates += 1
+
+            # Repeated duplicates mean the model keeps producing the same set, don't spin on it
+            failures += 1
+            if failures >= 3:
+                self._backoff(failures - 2)
+
+    def _backoff(self, failures):
+        delay = min(self.retry_delay * 2 ** (failures - 1), 300)
+        with self._cond:
+            self._cond.wait_for(lambda: self._stopped, timeout=delay)
@@ -10,9 +10,9 @@ class ScenarioAgent(AgentBase):
     """
     Scenario Agent
     """
-    def __init__(self, scenario_name: str, session_id: str = None):
-        prompt_file = f"../prompts/{scenario_name}_prompt.txt"
-        intro_file = f"../content/intro/{scenario_name}.json"
+    def __init__(self, scenario_name: str, session_id: str = None, prompt_file: str = None, intro_file: str = None):
+        prompt_file = prompt_file or f"../prompts/{scenario_name}_prompt.txt"
+        intro_file = intro_file or f"../content/intro/{scenario_name}.json"
         super().__init__(
             name=scenario_name,
             prompt_file=prompt_file,
@@ -29,7 +29,7 @@ class ScenarioAgent(AgentBase):
             session_id = self.session_id
 
         history = get_session_history(session_id)
-        LOG.debug(f"[history][{session_id}]: {history}")
+        LOG.debug("[history][{}]: {}", session_id, history)
 
         if not history.messages:
             initial_ai_message = random.choice(self.intro_messages)
@@ -37,3 +37,22 @@ class ScenarioAgent(AgentBase):
             return initial_ai_message
         else:
             return history.messages[-1].content
+
+    async def astart_new_session(self, session_id: str = None):
+        """
+        Async version of start_new_session
+        :param session_id:
+        """
+        if session_id is None:
+            session_id = self.session_id
+
+        history = get_session_history(session_id)
+        messages = await history.aget_messages()
+        LOG.debug("[history][{}]: {}", session_id, history)
+
+        if not messages:
+            initial_ai_message = random.choice(self.intro_messages)
+            await history.aadd_messages([AIMessage(content=initial_ai_message)])
+            return initial_ai_message
+        else:
+            return messages[-1].content
@@ -0,0 +1,207 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from utils.logger import LOG
+
+PROMPT_SUFFIX = "_prompt.txt"
+
+
+class Scenario:
+    """
+    A scenario found on disk: its prompt, intro messages and optional page description
+    """
+    def __init__(self, name, label, prompt_file, intro_file, page_file=None):
+        self.name = name
+        self.label = label
+        self.prompt_file = prompt_file
+        self.intro_file = intro_file
+        self.page_file = page_file
+
+    def __repr__(self):
+        return f"Scenario({self.name!r}, {self.label!r})"
+
+
+def load_manifest(manifest_file):
+    """
+    Display names and order of scenarios, from a JSON object of ``name: {"label": ...}``
+    :param manifest_file:
+    :return: dict, empty when the file is missing or invalid
+    """
+    try:
+        with open(manifest_file, "r", encoding="utf-8") as file:
+            manifest = json.load(file)
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError as e:
+        LOG.error(f"[ScenarioRegistry] invalid manifest {manifest_file}: {e}")
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
+
+
+def discover_scenarios(prompts_dir="../prompts", intro_dir="../content/intro", page_dir="../content/page",
+                       manifest_file="../content/scenarios.json"):
+    """
+    Find scenarios: every ``<name>_prompt.txt`` with a matching ``<name>.json`` intro.
+    Manifest entries come first, in manifest order, and may set ``"enabled": false``;
+    other scenarios follow alphabetically with a label derived from their name.
+    :return: list of Scenario
+    """
+    manifest = load_manifest(manifest_file)
+    try:
+        prompt_names = {f[:-len(PROMPT_SUFFIX)] for f in os.listdir(prompts_dir) if f.endswith(PROMPT_SUFFIX)}
+    except FileNotFoundError:
+        LOG.error(f"[ScenarioRegistry] prompts directory {prompts_dir} not found")
+        return []
+
+    names = [name for name in manifest if name in prompt_names]
+    names += sorted(prompt_names - set(manifest))
+
+    scenarios = []
+    for name in names:
+        entry = manifest.get(name) or {}
+        intro_file = os.path.join(intro_dir, f"{name}.json")
+        if not entry.get("enabled", True) or not os.path.isfile(intro_file):
+            continue
+        page_file = os.path.join(page_dir, f"{name}.md")
+        scenarios.append(Scenario(
+            name,
+            entry.get("label") or name.replace("_", " ").title(),
+            os.path.join(prompts_dir, f"{name}{PROMPT_SUFFIX}"),
+            intro_file,
+            page_file if os.path.isfile(page_file) else None,
+        ))
+    return scenarios
+
+
+class ScenarioRegistry:
+    """
+    Scenarios discovered from the prompt and content directories, with their agents
+    created on first use.
+
+    ``agent_factory`` is called with the Scenario. Resident agents are kept in LRU order; an agent unused for ``idle_seconds`` or beyond
+    ``max_resident`` agents is dropped and rebuilt when next selected. Learner histories
+    live in the session store, so unloading an agent loses no conversation. A limit of 0
+    disables that check.
+    """
+    def __init__(self, agent_factory, discover=discover_scenarios, max_resident=0, idle_seconds=0,
+                 clock=time.monotonic):
+        self.agent_factory = agent_factory
+        self.discover = discover
+        self.max_resident = max_resident
+        self.idle_seconds = idle_seconds
+        self.clock = clock
+
+        self._lock = threading.RLock()
+        self._scenarios = OrderedDict()
+        self._agents = OrderedDict()
+        self.loads = 0
+        self.unloads = 0
+        self.refresh()
+
+    def refresh(self):
+        """
+        Rediscover scenarios; agents of scenarios that disappeared are unloaded
+        :return: list of Scenario
+        """
+        scenarios = OrderedDict((scenario.name, scenario) for scenario in self.discover())
+        with self._lock:
+            self._scenarios = scenarios
+            for name in [name for name in self._agents if name not in scenarios]:
+                self._unload(name, "removed")
+            return list(scenarios.values())
+
+    def scenarios(self):
+        with self._lock:
+            return list(self._scenarios.values())
+
+    def scenario(self, name):
+        with self._lock:
+            return self._scenarios[name]
+
+    def choices(self):
+        """
+        (label, name) pairs for a selection widget
+        """
+        return [(scenario.label, scenario.name) for scenario in self.scenarios()]
+
+    def get(self, name):
+        """
+        The agent for a scenario, created if it is not resident
+        :param name:
+        :return: agent
+        :raises KeyError: unknown scenario
+        """
+        with self._lock:
+            if name not in self._scenarios:
+                raise KeyError(name)
+            now = self.clock()
+            entry = self._agents.get(name)
+            if entry is None:
+                entry = self._agents[name] = [self.agent_factory(self._scenarios[name]), now]
+                self.loads += 1
+                LOG.debug(f"[ScenarioRegistry] loaded {name}")
+            else:
+                entry[1] = now
+                self._agents.move_to_end(name)
+            self.unload_idle(keep=name)
+            return entry[0]
+
+    def unload(self, name):
+        with self._lock:
+            return self._unload(name, "manual")
+
+    def unload_idle(self, keep=None):
+        """
+        Drop agents idle for ``idle_seconds`` and the least recently used over ``max_resident``
+        :param keep: scenario never dropped, the one being used
+        :return: number of agents unloaded
+        """
+        with self._lock:
+            now = self.clock()
+            unloaded = 0
+            for name, (_, last_used) in list(self._agents.items()):
+                if name != keep and self.idle_seconds > 0 and now - last_used >= self.idle_seconds:
+                    unloaded += self._unload(name, "idle")
+            while 0 < self.max_resident < len(self._agents):
+                name = next(n for n in self._agents if n != keep)
+                unloaded += self._unload(name, "max_resident")
+            return unloaded
+
+    def resident(self):
+        with self._lock:
+            return list(self._agents)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "scenarios": len(self._scenarios),
+                "resident": len(self._agents),
+                "loads": self.loads,
+                "unloads": self.unloads,
+            }
+
+    def _unload(self, name, reason):
+        if self._agents.pop(name, None) is None:
+            return 0
+        self.unloads += 1
+        LOG.debug(f"[ScenarioRegistry] unloaded {name} ({reason})")
+        return 1
+
+
+def scenario_registry_from_env():
+    """
+    Registry of ScenarioAgents configured from SCENARIO_* environment variables
+    """
+    def create_agent(scenario):
+        from agents.scenario_agent import ScenarioAgent
+
+        return ScenarioAgent(scenario.name, prompt_file=scenario.prompt_file, intro_file=scenario.intro_file)
+
+    return ScenarioRegistry(
+        create_agent,
+        max_resident=int(os.getenv("SCENARIO_MAX_RESIDENT_AGENTS", "0")),
+        idle_seconds=float(os.getenv("SCENARIO_IDLE_UNLOAD_SECONDS", "1800")),
+    )
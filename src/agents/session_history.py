@@ -1,9 +1,114 @@
+import os
+import threading
+
 from langchain_core.chat_history import (
     BaseChatMessageHistory,
     InMemoryChatMessageHistory
 )
+from langchain_core.messages import HumanMessage
+
+from agents.session_registry import SessionRegistry
+from utils.tracing import span
+
+session_backend = os.getenv("SESSION_BACKEND", "memory")
+
+def _create_history_factory(backend=None):
+    """
+    Build the per-session history factory for a session backend
+    :param backend: memory | sqlite | redis, defaults to SESSION_BACKEND
+    :return: callable(session_id) -> BaseChatMessageHistory
+    """
+    backend = backend or os.getenv("SESSION_BACKEND", "memory")
+    if backend == "memory":
+        return lambda session_id: InMemoryChatMessageHistory()
+    if backend == "sqlite":
+        from agents.sqlite_history import SQLiteChatMessageHistory, SQLiteMessageStore
+
+        message_store = SQLiteMessageStore(
+            os.getenv("SESSION_SQLITE_PATH", "../data/sessions.db"),
+            flush_interval=float(os.getenv("SESSION_SQLITE_FLUSH_INTERVAL", "0.2")),
+            retention_seconds=float(os.getenv("SESSION_SQLITE_RETENTION_SECONDS", str(7 * 24 * 3600))),
+            flush_timeout=float(os.getenv("SESSION_SQLITE_FLUSH_TIMEOUT", "10")),
+        )
+        return lambda session_id: SQLiteChatMessageHistory(session_id, message_store)
+    if backend == "redis":
+        import redis
+        from agents.redis_history import RedisChatMessageHistory
+
+        client = redis.Redis.from_url(
+            os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0"),
+            max_connections=int(os.getenv("SESSION_REDIS_MAX_CONNECTIONS", "50")),
+            socket_timeout=float(os.getenv("SESSION_REDIS_TIMEOUT", "2")),
+        )
+        ttl_seconds = int(os.getenv("SESSION_REDIS_TTL_SECONDS", str(24 * 3600)))
+        revalidate_interval = float(os.getenv("SESSION_REDIS_REVALIDATE_SECONDS", "1"))
+        return lambda session_id: RedisChatMessageHistory(
+            session_id, client, ttl_seconds=ttl_seconds, revalidate_interval=revalidate_interval
+        )
+    raise ValueError(f"Unknown SESSION_BACKEND {backend}")
+
+store = SessionRegistry(
+    history_factory=_create_history_factory(session_backend),
+    max_sessions=int(os.getenv("SESSION_MAX_COUNT", "5000")),
+    ttl_seconds=float(os.getenv("SESSION_IDLE_TTL_SECONDS", "7200")),
+    max_messages=int(os.getenv("SESSION_MAX_MESSAGES", "0")),
+    max_bytes=int(os.getenv("SESSION_MAX_BYTES", str(256 * 1024 * 1024))),
+)
+
+# Pages each learner has open, so closing one of several tabs keeps their sessions in memory
+_learner_pages = {}
+_learner_pages_lock = threading.Lock()
+
+def learner_session_id(agent_name: str, learner_id: str) -> str:
+    """
+    Build the session id of one learner's conversation with one agent
+    :param agent_name:
+    :param learner_id: e.g. the learner cookie
+    :return: session id
+    """
+    return f"{agent_name}:{learner_id}"
+
+def drop_learner_sessions(learner_id: str) -> int:
+    """
+    Evict every agent session that belongs to a learner from memory
+    :param learner_id:
+    :return: number of evicted sessions
+    """
+    suffix = f":{learner_id}"
+    return store.evict_where(lambda session_id: session_id.endswith(suffix), reason="unload")
+
+def open_learner_page(learner_id: str, page_id: str):
+    """
+    Note that a learner opened a page
+    :param learner_id:
+    :param page_id: e.g. the Gradio session hash
+    """
+    with _learner_pages_lock:
+        _learner_pages.setdefault(learner_id, set()).add(page_id)
 
-store = {}
+def close_learner_page(learner_id: str, page_id: str) -> int:
+    """
+    Note that a learner closed a page. Once no page of theirs is open, their sessions are
+    released from memory; a persistent backend keeps them, so a later visit resumes them
+    :param learner_id:
+    :param page_id:
+    :return: number of released sessions
+    """
+    with _learner_pages_lock:
+        pages = _learner_pages.get(learner_id, set())
+        pages.discard(page_id)
+        if pages:
+            return 0
+        _learner_pages.pop(learner_id, None)
+    return drop_learner_sessions(learner_id)
+
+def forget_session(session_id: str):
+    """
+    Forget a session, in a persistent backend too
+    :param session_id:
+    """
+    get_session_history(session_id).clear()
+    store.evict(session_id, reason="reset")
 
 def get_session_history(session_id: str) -> BaseChatMessageHistory:
     """
@@ -11,6 +116,32 @@ def get_session_history(session_id: str) -> BaseChatMessageHistory:
     :param session_id:
     :return: BaseChatMessageHistory
     """
-    if session_id not in store:
-        store[session_id] = InMemoryChatMessageHistory()
-    return store[session_id]
\ No newline at end of file
+    with span("session.get_history", {"session.id": session_id, "session.backend": session_backend}):
+        return store.get(session_id)
+
+def rewind_session(session_id: str, turns: int) -> int:
+    """
+    Drop the learner's last ``turns`` messages, with the replies to them, so the history
+    ends where the learner's undo, retry or edit leaves the chat. Turns are counted from
+    the end because the chat may not show every stored turn: a vocab round opens with a
+    hidden learner message, and a resumed scenario only shows its last reply
+    :param session_id:
+    :param turns: learner turns to drop
+    :return: number of dropped messages
+    """
+    if turns <= 0:
+        return 0
+    history = get_session_history(session_id)
+    messages = history.messages
+    cut = None
+    for index in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[index], HumanMessage):
+            cut = index
+            turns -= 1
+            if turns == 0:
+                break
+    if cut is None:
+        return 0
+    dropped = len(messages) - cut
+    history.truncate(cut)
+    return dropped
@@ -0,0 +1,271 @@
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.chat_history import BaseChatMessageHistory
+
+from utils.logger import LOG
+
+
+def _message_bytes(message):
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    return len(content.encode("utf-8"))
+
+
+class TrackedChatMessageHistory(BaseChatMessageHistory):
+    """
+    Thin proxy around a backend history that reports appends, clears and truncations to the registry
+
+    ``on_change(keep, added)`` is called after each write: the first ``keep`` messages
+    (None for all) are still there and ``added`` were appended after them.
+    """
+    def __init__(self, inner, on_change):
+        self.inner = inner
+        self._on_change = on_change
+
+    @property
+    def messages(self):
+        return self.inner.messages
+
+    async def aget_messages(self):
+        return await self.inner.aget_messages()
+
+    def add_messages(self, messages):
+        messages = list(messages)
+        self.inner.add_messages(messages)
+        self._on_change(None, messages)
+
+    async def aadd_messages(self, messages):
+        messages = list(messages)
+        await self.inner.aadd_messages(messages)
+        self._on_change(None, messages)
+
+    def clear(self):
+        self.inner.clear()
+        self._on_change(0, ())
+
+    async def aclear(self):
+        await self.inner.aclear()
+        self._on_change(0, ())
+
+    def truncate(self, count):
+        """
+        Keep only the first ``count`` messages, natively where the backend supports it
+        :param count:
+        """
+        truncate = getattr(self.inner, "truncate", None)
+        if truncate is not None:
+            truncate(count)
+        else:
+            kept = self.inner.messages[:count]
+            self.inner.clear()
+            self.inner.add_messages(kept)
+        self._on_change(count, ())
+
+    def __getattr__(self, name):
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+    def __str__(self):
+        return str(self.inner)
+
+
+class _Entry:
+    __slots__ = ("history", "last_access", "message_count", "byte_size", "sizes")
+
+    def __init__(self, history, now):
+        self.history = history
+        self.last_access = now
+        self.message_count = 0
+        self.byte_size = 0
+        # Byte size of each message, None until the history has been measured once
+        self.sizes = None
+
+
+class SessionRegistry:
+    """
+    Bounded registry of chat histories keyed by session id.
+
+    Sessions are kept in LRU order and evicted when they have been idle longer than
+    ``ttl_seconds`` or when the registry exceeds ``max_sessions``, ``max_messages``
+    (total across sessions) or ``max_bytes`` (total message content). A limit of 0
+    disables that check. Histories are wrapped in TrackedChatMessageHistory so sizes are
+    updated from the writes themselves, whatever the backend: a lookup never reads the
+    messages, which would be a round trip with Redis. A lazily loaded history is measured
+    in full once, at its first write. Eviction callbacks run after the registry lock is
+    released.
+    """
+    def __init__(self, history_factory, max_sessions=0, ttl_seconds=0, max_messages=0, max_bytes=0,
+                 clock=time.monotonic):
+        self.history_factory = history_factory
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.clock = clock
+
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._callbacks = []
+        self.total_messages = 0
+        self.total_bytes = 0
+        self.evictions = 0
+
+    def add_eviction_callback(self, callback):
+        """
+        Register a callback invoked as ``callback(session_id, history, reason)`` on eviction
+        :param callback:
+        """
+        self._callbacks.append(callback)
+
+    def get(self, session_id):
+        """
+        Get or create the history for a session and mark it most recently used
+        :param session_id:
+        :return: BaseChatMessageHistory
+        """
+        with self._lock:
+            now = self.clock()
+            evicted = self._evict_expired(now)
+
+            entry = self._entries.get(session_id)
+            if entry is None:
+                entry = _Entry(None, now)
+                entry.history = TrackedChatMessageHistory(
+                    self.history_factory(session_id),
+                    lambda keep, added: self._on_change(session_id, entry, keep, added),
+                )
+                self._entries[session_id] = entry
+                if getattr(entry.history.inner, "loaded", True):
+                    self._measure(entry)
+            else:
+                entry.last_access = now
+                self._entries.move_to_end(session_id)
+
+            evicted += self._enforce_limits(keep=session_id)
+            history = entry.history
+        self._notify(evicted)
+        return history
+
+    def evict(self, session_id, reason="manual"):
+        with self._lock:
+            entry = self._pop(session_id)
+        if entry is None:
+            return None
+        self._notify([(session_id, entry, reason)])
+        return entry.history
+
+    def evict_where(self, predicate, reason="manual"):
+        with self._lock:
+            session_ids = [session_id for session_id in self._entries if predicate(session_id)]
+        for session_id in session_ids:
+            self.evict(session_id, reason)
+        return len(session_ids)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_messages = 0
+            self.total_bytes = 0
+
+    def session_ids(self):
+        with self._lock:
+            return list(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._entries),
+                "messages": self.total_messages,
+                "bytes": self.total_bytes,
+                "evictions": self.evictions,
+            }
+
+    def _on_change(self, session_id, entry, keep, added):
+        with self._lock:
+            if self._entries.get(session_id) is not entry:
+                # Evicted while a turn was in flight
+                return
+            if entry.sizes is not None:
+                sizes = entry.sizes if keep is None else entry.sizes[:keep]
+                sizes.extend(_message_bytes(m) for m in added)
+                self._resize(entry, sizes)
+            elif keep == 0 and not added:
+                self._resize(entry, [])
+            elif getattr(entry.history.inner, "loaded", True):
+                # First write to a lazily loaded history, which has just loaded it
+                self._measure(entry)
+            evicted = self._enforce_limits(keep=session_id)
+        self._notify(evicted)
+
+    def _measure(self, entry):
+        self._resize(entry, [_message_bytes(m) for m in entry.history.inner.messages])
+
+    def _resize(self, entry, sizes):
+        byte_size = sum(sizes)
+        self.total_messages += len(sizes) - entry.message_count
+        self.total_bytes += byte_size - entry.byte_size
+        entry.sizes = sizes
+        entry.message_count = len(sizes)
+        entry.byte_size = byte_size
+
+    def _pop(self, session_id):
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self.total_messages -= entry.message_count
+            self.total_bytes -= entry.byte_size
+            self.evictions += 1
+        return entry
+
+    def _notify(self, evicted):
+        for session_id, entry, reason in evicted:
+            LOG.debug(f"[SessionRegistry] evicted {session_id} ({reason})")
+            for callback in self._callbacks:
+                try:
+                    callback(session_id, entry.history, reason)
+                except Exception as e:
+                    LOG.error(f"[SessionRegistry] eviction callback failed for {session_id}: {e}")
+
+    def _evict_expired(self, now):
+        evicted = []
+        if self.ttl_seconds <= 0:
+            return evicted
+        while self._entries:
+            session_id, entry = next(iter(self._entries.items()))
+            if now - entry.last_access < self.ttl_seconds:
+                break
+            evicted.append((session_id, self._pop(session_id), "ttl"))
+        return evicted
+
+    def _over_limit(self):
+        if self.max_sessions > 0 and len(self._entries) > self.max_sessions:
+            return "max_sessions"
+        if self.max_messages > 0 and self.total_messages > self.max_messages:
+            return "max_messages"
+        if self.max_bytes > 0 and self.total_bytes > self.max_bytes:
+            return "max_bytes"
+        return None
+
+    def _enforce_limits(self, keep=None):
+        evicted = []
+        reason = self._over_limit()
+        while reason:
+            victim = next((session_id for session_id in self._entries if session_id != keep), None)
+            if victim is None:
+                break
+            evicted.append((victim, self._pop(victim), reason))
+            reason = self._over_limit()
+        return evicted
+
+    def __contains__(self, session_id):
+        return session_id in self._entries
+
+    def __getitem__(self, session_id):
+        return self._entries[session_id].history
+
+    def __iter__(self):
+        return iter(list(self._entries))
+
+    def __len__(self):
+        return len(self._entries)
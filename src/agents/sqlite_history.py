@@ -0,0 +1,241 @@
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import message_to_dict, messages_from_dict
+
+from utils.logger import LOG
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    message TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id);
+"""
+
+# Queue wait timed out
+_IDLE = object()
+
+
+class SQLiteMessageStore:
+    """
+    SQLite (WAL mode) message store with write-behind batching.
+
+    Appends and clears are queued and applied by a background writer thread in batched
+    transactions, so the request path only pays for serializing the new messages.
+    Writes not yet flushed are lost if the process is killed without running atexit.
+    A failed batch is logged and dropped, the writer keeps running; a flush waits at most
+    ``flush_timeout`` seconds, so a stuck writer cannot hang the readers. Sessions idle
+    longer than ``retention_seconds`` are pruned every ``prune_interval`` seconds, whether
+    the writer is busy or idle.
+    """
+    def __init__(self, path, flush_interval=0.2, max_batch=500, retention_seconds=0, flush_timeout=10.0,
+                 prune_interval=3600.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_timeout = flush_timeout
+        self.max_batch = max_batch
+        self.retention_seconds = retention_seconds
+        self.prune_interval = prune_interval
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._read_conn = self._connect()
+        self._read_conn.executescript(_SCHEMA)
+        self._read_lock = threading.Lock()
+
+        self._queue = queue.Queue()
+        self._closed = False
+        self._last_prune = time.time()
+        self._writer = threading.Thread(target=self._run, name="sqlite-history-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def append(self, session_id, messages):
+        now = time.time()
+        rows = [(session_id, json.dumps(message_to_dict(m), ensure_ascii=False), now) for m in messages]
+        self._queue.put(("append", rows))
+
+    def clear(self, session_id):
+        self._queue.put(("clear", session_id))
+
+    def truncate(self, session_id, count):
+        self._queue.put(("truncate", session_id, count))
+
+    def load(self, session_id):
+        # Make sure writes queued for this session are visible before reading
+        self.flush()
+        with self._read_lock:
+            rows = self._read_conn.execute(
+                "SELECT message FROM messages WHERE session_id = ? ORDER BY id",
+                (session_id,),
+            ).fetchall()
+        return messages_from_dict([json.loads(row[0]) for row in rows])
+
+    def flush(self, timeout=None):
+        """
+        Block until every operation queued so far has been committed
+        :param timeout: seconds, defaults to flush_timeout
+        :return: False if the writer did not get there in time
+        """
+        if self._closed:
+            return True
+        if not self._writer.is_alive():
+            LOG.error("[SQLiteMessageStore] writer thread is not running, queued writes are not saved")
+            return False
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        timeout = self.flush_timeout if timeout is None else timeout
+        if not done.wait(timeout):
+            LOG.error(f"[SQLiteMessageStore] flush timed out after {timeout:.1f}s, reading without it")
+            return False
+        return True
+
+    def close(self):
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join(timeout=5)
+
+    def _run(self):
+        conn = self._connect()
+        while True:
+            try:
+                op = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                op = _IDLE
+
+            if op is not _IDLE:
+                batch = [op]
+                while len(batch) < self.max_batch:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                if self._apply(conn, batch):
+                    conn.close()
+                    return
+
+            # Checked after every batch too: steady traffic never leaves the queue idle
+            try:
+                self._maybe_prune(conn)
+            except sqlite3.Error as e:
+                LOG.error(f"[SQLiteMessageStore] failed to prune expired sessions: {e}")
+
+    def _apply(self, conn, batch):
+        waiters = [op[1] for op in batch if op is not None and op[0] == "flush"]
+        stop = any(op is None for op in batch)
+        try:
+            conn.execute("BEGIN")
+            for op in batch:
+                if op is None:
+                    continue
+                if op[0] == "append":
+                    conn.executemany(
+                        "INSERT INTO messages (session_id, message, created_at) VALUES (?, ?, ?)", op[1]
+                    )
+                elif op[0] == "clear":
+                    conn.execute("DELETE FROM messages WHERE session_id = ?", (op[1],))
+                elif op[0] == "truncate":
+                    # Keep the first op[2] messages; a shorter session is left as it is
+                    conn.execute(
+                        "DELETE FROM messages WHERE session_id = ? AND id >= "
+                        "(SELECT id FROM messages WHERE session_id = ? ORDER BY id LIMIT 1 OFFSET ?)",
+                        (op[1], op[1], op[2]),
+                    )
+            conn.execute("COMMIT")
+        except Exception as e:
+            LOG.error(f"[SQLiteMessageStore] failed to write batch of {len(batch)}: {e}")
+            try:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+            except sqlite3.Error as rollback_error:
+                LOG.error(f"[SQLiteMessageStore] rollback failed: {rollback_error}")
+        finally:
+            for waiter in waiters:
+                waiter.set()
+        return stop
+
+    def _maybe_prune(self, conn):
+        if self.retention_seconds <= 0 or time.time() - self._last_prune < self.prune_interval:
+            return
+        self._last_prune = time.time()
+        cutoff = self._last_prune - self.retention_seconds
+        conn.execute(
+            "DELETE FROM messages WHERE session_id IN "
+            "(SELECT session_id FROM messages GROUP BY session_id HAVING MAX(created_at) < ?)",
+            (cutoff,),
+        )
+
+
+class SQLiteChatMessageHistory(BaseChatMessageHistory):
+    """
+    Chat history persisted in a SQLiteMessageStore, loaded lazily on first access
+    """
+    def __init__(self, session_id, message_store):
+        self.session_id = session_id
+        self.message_store = message_store
+        self._messages = None
+
+    @property
+    def loaded(self):
+        return self._messages is not None
+
+    @property
+    def messages(self):
+        if self._messages is None:
+            self._messages = self.message_store.load(self.session_id)
+        return self._messages
+
+    async def aget_messages(self):
+        if self._messages is not None:
+            return self._messages
+        return await super().aget_messages()
+
+    def add_messages(self, messages):
+        messages = list(messages)
+        self.messages.extend(messages)
+        self.message_store.append(self.session_id, messages)
+
+    async def aadd_messages(self, messages):
+        # Appending to a loaded session never blocks, so skip the executor hop
+        if self._messages is not None:
+            self.add_messages(messages)
+        else:
+            await super().aadd_messages(messages)
+
+    def clear(self):
+        self._messages = []
+        self.message_store.clear(self.session_id)
+
+    async def aclear(self):
+        self.clear()
+
+    def truncate(self, count):
+        """
+        Keep only the first ``count`` messages
+        :param count:
+        """
+        del self.messages[count:]
+        self.message_store.truncate(self.session_id, count)
+
+    def __str__(self):
+        return f"SQLiteChatMessageHistory({self.session_id}, {len(self.messages)} messages)"
@@ -0,0 +1,161 @@
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from agents.history_window import HistoryWindow, estimate_message_tokens
+from utils.admission import PRIORITY_BACKGROUND, model_admission, usage_tokens
+from utils.concurrency import model_call_limiter
+from utils.logger import LOG
+from utils.metrics import SUMMARIES, SUMMARY_TOKENS_SAVED
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of an English practice conversation between a learner and "
+    "their tutor. Update the summary with the new conversation lines. Keep the learner's name and "
+    "personal details, the topics practiced, recurring mistakes and anything the tutor promised to "
+    "come back to. Write in English, at most 150 words, and output only the updated summary."
+)
+
+# 150 words at most
+SUMMARY_COMPLETION_TOKENS = 250
+
+
+class _SummaryState:
+    # Holds the first and last summarized messages rather than their ids, which CPython
+    # hands to new messages as soon as a cleared history frees the old ones
+    __slots__ = ("first", "last", "covered", "summary", "message", "pending")
+
+    def __init__(self, first):
+        self.first = first
+        self.last = None
+        self.covered = 0
+        self.summary = ""
+        self.message = None
+        self.pending = False
+
+
+class SummaryMemory:
+    """
+    Rolling summary of older turns, maintained off the request path.
+
+    Once the unsummarized part of a session's history exceeds ``threshold_tokens``, the
+    turns older than the most recent ``recent_tokens`` are condensed into the running
+    summary by a background worker. Only the new overflow is sent to the summarizer,
+    together with the previous summary, so earlier turns are never summarized twice.
+    Until a summary lands, calls keep sending the unsummarized turns in full.
+    """
+    def __init__(self, model, threshold_tokens=3000, recent_tokens=1500, max_sessions=10000, executor=None,
+                 agent="conversation"):
+        self.model = model
+        self.agent = agent
+        self.threshold_tokens = threshold_tokens
+        self.recent_tokens = recent_tokens
+        self.max_sessions = max_sessions
+
+        self._window = HistoryWindow(budget=0, max_sessions=max_sessions)
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = executor or ThreadPoolExecutor(max_workers=2, thread_name_prefix="summary-memory")
+
+        self.turns = 0
+        self.summaries = 0
+        self.tokens_saved_total = 0
+        self.last_tokens_saved = 0
+
+    def apply(self, messages, session_key):
+        """
+        Replace the summarized part of the history with the running summary
+        :param messages: history followed by the new input
+        :param session_key:
+        :return: messages to send
+        """
+        if session_key is None or len(messages) < 2:
+            return messages
+
+        history = messages[:-1]
+        prefix = self._window.prefix_sums(session_key, history)
+
+        with self._lock:
+            state = self._state(session_key, history)
+            covered, summary_message = state.covered, state.message
+
+            if not state.pending and prefix[-1] - prefix[covered] > self.threshold_tokens:
+                cut = self._cut(history, prefix, covered)
+                if cut > covered:
+                    state.pending = True
+                    self._executor.submit(self._summarize, session_key, state, history[covered:cut], cut)
+
+        tokens_saved = 0
+        if summary_message is not None:
+            messages = [summary_message] + messages[covered:]
+            tokens_saved = prefix[covered] - estimate_message_tokens(summary_message)
+
+        with self._lock:
+            self.turns += 1
+            self.last_tokens_saved = tokens_saved
+            self.tokens_saved_total += tokens_saved
+        SUMMARY_TOKENS_SAVED.labels(self.agent).observe(tokens_saved)
+        if tokens_saved:
+            LOG.debug(f"[SummaryMemory][{session_key}] saved ~{tokens_saved} prompt tokens")
+        return messages
+
+    def stats(self):
+        with self._lock:
+            return {
+                "turns": self.turns,
+                "summaries": self.summaries,
+                "tokens_saved_total": self.tokens_saved_total,
+                "last_tokens_saved": self.last_tokens_saved,
+                "avg_tokens_saved_per_turn": self.tokens_saved_total / self.turns if self.turns else 0.0,
+            }
+
+    def _state(self, session_key, history):
+        state = self._states.get(session_key)
+        if state is None or state.first is not history[0] or state.covered > len(history) or (
+            state.covered and state.last is not history[state.covered - 1]
+        ):
+            # New, cleared or rewound session: the old summary no longer matches the history
+            state = _SummaryState(history[0])
+            self._states[session_key] = state
+        self._states.move_to_end(session_key)
+        while len(self._states) > self.max_sessions:
+            self._states.popitem(last=False)
+        return state
+
+    def _cut(self, history, prefix, covered):
+        end = len(history)
+        cut = max(bisect_left(prefix, prefix[end] - self.recent_tokens, lo=covered), covered)
+        cut = min(cut, end)
+        while cut < end and not isinstance(history[cut], HumanMessage):
+            cut += 1
+        return cut
+
+    def _summarize(self, session_key, state, overflow, cut):
+        try:
+            transcript = "\n".join(f"{message.type}: {message.content}" for message in overflow)
+            request = [
+                SystemMessage(content=SUMMARY_INSTRUCTIONS),
+                HumanMessage(content=f"Current summary:\n{state.summary or '(none)'}\n\nNew conversation lines:\n{transcript}"),
+            ]
+            tokens = sum(estimate_message_tokens(message) for message in request) + SUMMARY_COMPLETION_TOKENS
+            model_admission.admit(tokens, PRIORITY_BACKGROUND)
+            with model_call_limiter:
+                response = self.model.invoke(request)
+            model_admission.settle(tokens, usage_tokens(response))
+
+            with self._lock:
+                state.summary = response.content
+                state.message = SystemMessage(
+                    content=f"Summary of the earlier conversation with this learner:\n{response.content}"
+                )
+                state.covered = cut
+                state.last = overflow[-1]
+                self.summaries += 1
+            SUMMARIES.labels(self.agent).inc()
+            LOG.debug(f"[SummaryMemory][{session_key}] summarized {len(overflow)} messages")
+        except Exception as e:
+            LOG.error(f"[SummaryMemory][{session_key}] summarization failed: {e}")
+        finally:
+            state.pending = False
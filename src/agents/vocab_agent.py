@@ -1,8 +1,17 @@
-from langchain_core.messages import AIMessage
+import os
+
+from langchain_core.messages import AIMessage, HumanMessage
 
 from agents.session_history import get_session_history
 from agents.agent_base import AgentBase
+from agents.round_pool import RoundPool
+from utils.admission import PRIORITY_BACKGROUND, model_admission, usage_tokens
+from utils.concurrency import model_call_limiter
 from utils.logger import LOG
+from utils.metrics import start_turn
+from utils.tracing import traced
+
+NEXT_ROUND_INPUT = "Let's do it"
 
 class VocabAgent(AgentBase):
     def __init__(self, session_id=None):
@@ -11,6 +20,13 @@ class VocabAgent(AgentBase):
             prompt_file="../prompts/vocab_study_prompt.txt",
             session_id=session_id
         )
+        # Every round should bring new words, a cached opening round would repeat them
+        self.response_cache = None
+        self.round_pool = RoundPool(
+            self.generate_round,
+            depth=int(os.getenv("VOCAB_POOL_DEPTH", "3")),
+            name="vocab_study",
+        )
 
     def restart_session(self, session_id=None):
         if session_id is None:
@@ -18,6 +34,49 @@ class VocabAgent(AgentBase):
 
         history = get_session_history(session_id)
         history.clear()
-        LOG.debug(f"[history][{session_id}]: {history}")
+        LOG.debug("[history][{}]: {}", session_id, history)
+
+        return history
+
+    async def arestart_session(self, session_id=None):
+        if session_id is None:
+            session_id = self.session_id
+
+        history = get_session_history(session_id)
+        await history.aclear()
+        LOG.debug("[history][{}]: {}", session_id, history)
+
+        return history
+
+    @traced("agent.generate_round", lambda agent: {"agent.name": agent.name})
+    def generate_round(self):
+        """
+        Generate an opening round outside of any session, for the round pool
+        :return: round text
+        """
+        messages = [HumanMessage(content=NEXT_ROUND_INPUT)]
+        # Learner turns go first, a refill can wait for quota
+        tokens = self.admit(messages, priority=PRIORITY_BACKGROUND)
+        # Counted in flight like learner turns, they take model capacity all the same
+        with model_call_limiter, start_turn(self.name).model_call():
+            response = self.chatbot.invoke(messages)
+        model_admission.settle(tokens, usage_tokens(response))
+        return response.content
+
+    async def astart_next_round(self, session_id=None):
+        """
+        Clear the session and open a new round, from the pool when one is ready
+        :param session_id:
+        :return: round text
+        """
+        if session_id is None:
+            session_id = self.session_id
+
+        history = await self.arestart_session(session_id)
+        round_text = self.round_pool.pop()
+        if round_text is None:
+            LOG.debug(f"[RoundPool][{self.name}] empty, generating round for {session_id}")
+            return await self.achat_with_history(NEXT_ROUND_INPUT, session_id)
 
-        return history
\ No newline at end of file
+        await history.aadd_messages([HumanMessage(content=NEXT_ROUND_INPUT), AIMessage(content=round_text)])
+        return round_text
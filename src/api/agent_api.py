@@ -0,0 +1,247 @@
+"""
+Headless JSON API for the agents, served next to the Gradio UI under /api/v1.
+
+Sessions are identified by agent and learner id and live in the same session store as
+the UI's, with the same agent instances:
+
+    GET    /agents                                              agents and scenarios
+    POST   /agents/{agent}/sessions                             start a session (scenario intro, vocab round)
+    GET    /agents/{agent}/sessions/{learner_id}/messages       history
+    POST   /agents/{agent}/sessions/{learner_id}/messages       send a message, get the full reply
+    POST   /agents/{agent}/sessions/{learner_id}/messages/stream   same, reply streamed as server-sent events
+    DELETE /agents/{agent}/sessions/{learner_id}                reset the session
+    WS     /agents/{agent}/sessions/{learner_id}/ws             send {"text": ...}, receive streamed tokens
+
+Handlers are coroutines and an idle WebSocket only holds a suspended receive, so a pod
+keeps thousands of open connections without threads. API_KEY is required as
+``Authorization: Bearer <key>`` (or ``X-API-Key``, or ``?api_key=`` where headers cannot be set).
+Without a key the API is not served, unless API_ALLOW_ANONYMOUS opts in; anonymous
+sessions then live under their own ``api:`` learner ids, apart from the UI's.
+"""
+import asyncio
+import json
+import os
+import secrets
+import uuid
+from typing import Optional
+
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from agents.session_history import forget_session, get_session_history
+from utils.logger import LOG
+from utils.metrics import API_WEBSOCKETS_OPEN
+from utils.tracing import traced_stream
+
+CONVERSATION = "conversation"
+VOCAB = "vocab_study"
+
+MAX_INPUT_CHARS = int(os.getenv("API_MAX_INPUT_CHARS", "4000"))
+
+
+class StartSession(BaseModel):
+    learner_id: Optional[str] = Field(default=None, max_length=128)
+
+
+class SendMessage(BaseModel):
+    text: str = Field(min_length=1, max_length=MAX_INPUT_CHARS)
+
+
+def get_agent(agent_name):
+    """
+    The shared agent instance behind a name: conversation, vocab_study or a scenario
+    :param agent_name:
+    :return: agent
+    :raises HTTPException: 404 for an unknown agent
+    """
+    if agent_name == CONVERSATION:
+        from tabs.conversation_tab import get_conversation_agent
+
+        return get_conversation_agent()
+    if agent_name == VOCAB:
+        from tabs.vocab_tab import get_vocab_agent
+
+        return get_vocab_agent()
+
+    from tabs.scenario_tab import get_scenario_agent
+
+    try:
+        return get_scenario_agent(agent_name)
+    except KeyError:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, f"Unknown agent {agent_name}")
+
+
+async def start_session(agent_name, agent, session_id):
+    """
+    Open a session the way the UI does when a tab or scenario is picked
+    :return: the agent's opening message, or None
+    """
+    if agent_name == CONVERSATION:
+        return None
+    if agent_name == VOCAB:
+        return await agent.astart_next_round(session_id)
+    return await agent.astart_new_session(session_id)
+
+
+def message_dict(message):
+    return {"role": "user" if message.type == "human" else "assistant", "content": message.content}
+
+
+def create_agent_api(api_key=None, allow_anonymous=None, max_websockets=None, websocket_idle_seconds=None):
+    """
+    Build the API app, to be mounted at /api/v1
+    :param api_key: required bearer token, defaults to API_KEY
+    :param allow_anonymous: serve without a key, defaults to API_ALLOW_ANONYMOUS. Anonymous
+        clients only reach sessions started through the API, never a UI learner's
+    :param max_websockets: open WebSockets per process, defaults to API_MAX_WEBSOCKETS (0 = unlimited)
+    :param websocket_idle_seconds: close WebSockets idle this long, defaults to API_WEBSOCKET_IDLE_SECONDS
+    :return: FastAPI
+    :raises ValueError: without a key when anonymous access is not allowed
+    """
+    api_key = api_key if api_key is not None else os.getenv("API_KEY", "")
+    if allow_anonymous is None:
+        allow_anonymous = os.getenv("API_ALLOW_ANONYMOUS", "false").lower() == "true"
+    if not api_key and not allow_anonymous:
+        raise ValueError("API_KEY is not set (set API_ALLOW_ANONYMOUS=true to serve the API without one)")
+    # Without a key anyone can name any learner id, so keep those sessions apart from the UI's
+    learner_prefix = "" if api_key else "api:"
+    if max_websockets is None:
+        max_websockets = int(os.getenv("API_MAX_WEBSOCKETS", "10000"))
+    if websocket_idle_seconds is None:
+        websocket_idle_seconds = float(os.getenv("API_WEBSOCKET_IDLE_SECONDS", "900"))
+
+    def authorized(connection):
+        if not api_key:
+            return True
+        header = connection.headers.get("authorization", "")
+        token = header[7:] if header.lower().startswith("bearer ") else (
+            connection.headers.get("x-api-key") or connection.query_params.get("api_key")
+        )
+        return token is not None and secrets.compare_digest(token, api_key)
+
+    def session_id_for(agent, learner_id):
+        return agent.get_session_id(f"{learner_prefix}{learner_id}")
+
+    async def require_api_key(request: Request):
+        if not authorized(request):
+            raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Invalid API key")
+
+    api = FastAPI(title="Language Mentor API", version="1")
+    router = APIRouter(dependencies=[Depends(require_api_key)])
+    websockets_open = 0
+
+    @router.get("/agents")
+    async def list_agents():
+        from tabs.scenario_tab import scenario_registry
+
+        agents = [{"name": CONVERSATION, "kind": "conversation"}, {"name": VOCAB, "kind": "vocab"}]
+        agents += [
+            {"name": scenario.name, "label": scenario.label, "kind": "scenario"}
+            for scenario in scenario_registry.scenarios()
+        ]
+        return {"agents": agents}
+
+    @router.post("/agents/{agent_name}/sessions", status_code=status.HTTP_201_CREATED)
+    async def create_session(agent_name: str, body: Optional[StartSession] = None):
+        agent = get_agent(agent_name)
+        learner_id = (body.learner_id if body else None) or uuid.uuid4().hex
+        session_id = session_id_for(agent, learner_id)
+        message = await start_session(agent_name, agent, session_id)
+        return {"agent": agent_name, "learner_id": learner_id, "message": message}
+
+    @router.get("/agents/{agent_name}/sessions/{learner_id}/messages")
+    async def get_messages(agent_name: str, learner_id: str):
+        agent = get_agent(agent_name)
+        messages = await get_session_history(session_id_for(agent, learner_id)).aget_messages()
+        return {"messages": [message_dict(message) for message in messages]}
+
+    @router.post("/agents/{agent_name}/sessions/{learner_id}/messages")
+    async def send_message(agent_name: str, learner_id: str, body: SendMessage):
+        agent = get_agent(agent_name)
+        reply = await agent.achat_with_history(body.text, session_id_for(agent, learner_id))
+        return {"reply": reply}
+
+    @router.post("/agents/{agent_name}/sessions/{learner_id}/messages/stream")
+    async def stream_message(agent_name: str, learner_id: str, body: SendMessage):
+        agent = get_agent(agent_name)
+        session_id = session_id_for(agent, learner_id)
+
+        async def events():
+            reply = ""
+            async for chunk in traced_stream(
+                "api.stream_message",
+                agent.astream_with_history(body.text, session_id),
+                {"agent.name": agent.name, "session.id": session_id},
+            ):
+                reply += chunk
+                yield f"data: {json.dumps({'text': chunk}, ensure_ascii=False)}\n\n"
+            yield f"event: done\ndata: {json.dumps({'reply': reply}, ensure_ascii=False)}\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    @router.delete("/agents/{agent_name}/sessions/{learner_id}", status_code=status.HTTP_204_NO_CONTENT)
+    async def reset_session(agent_name: str, learner_id: str):
+        agent = get_agent(agent_name)
+        # A persistent backend forgets the session too
+        forget_session(session_id_for(agent, learner_id))
+
+    @api.websocket("/agents/{agent_name}/sessions/{learner_id}/ws")
+    async def chat_websocket(websocket: WebSocket, agent_name: str, learner_id: str):
+        nonlocal websockets_open
+        # Checked here rather than by a dependency, so a refused WebSocket gets a proper close code
+        if not authorized(websocket):
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        if 0 < max_websockets <= websockets_open:
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+            return
+        try:
+            agent = get_agent(agent_name)
+        except HTTPException as e:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail)
+            return
+
+        session_id = session_id_for(agent, learner_id)
+        await websocket.accept()
+        websockets_open += 1
+        API_WEBSOCKETS_OPEN.inc()
+        try:
+            while True:
+                try:
+                    data = await asyncio.wait_for(websocket.receive_json(), websocket_idle_seconds or None)
+                except asyncio.TimeoutError:
+                    await websocket.close(code=status.WS_1000_NORMAL_CLOSURE, reason="idle")
+                    return
+                except (json.JSONDecodeError, KeyError):
+                    await websocket.send_json({"type": "error", "detail": "Expected JSON {\"text\": ...}"})
+                    continue
+
+                text = data.get("text") if isinstance(data, dict) else None
+                if not isinstance(text, str) or not 0 < len(text) <= MAX_INPUT_CHARS:
+                    await websocket.send_json({"type": "error", "detail": f"text must be 1-{MAX_INPUT_CHARS} chars"})
+                    continue
+
+                reply = ""
+                async for chunk in traced_stream(
+                    "api.chat_websocket",
+                    agent.astream_with_history(text, session_id),
+                    {"agent.name": agent.name, "session.id": session_id},
+                ):
+                    reply += chunk
+                    await websocket.send_json({"type": "token", "text": chunk})
+                await websocket.send_json({"type": "done", "reply": reply})
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            LOG.error(f"[API][{agent_name}] websocket turn failed: {e}")
+            try:
+                await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+            except RuntimeError:
+                pass
+        finally:
+            websockets_open -= 1
+            API_WEBSOCKETS_OPEN.dec()
+
+    api.include_router(router)
+    return api
@@ -1,19 +1,171 @@
+"""
+Azure OpenAI clients, built on first access.
+
+``client``, ``chat_model``, ``hedge_model``, ``http_clients`` and ``connection_warmer``
+are module attributes created (and cached) the first time they are used, so importing
+this module does not pull in the OpenAI SDKs or open connections before the app is up.
+"""
+import json
 import os
+import threading
 from dotenv import load_dotenv
-from openai import AzureOpenAI
-from langchain_openai import AzureChatOpenAI
 
 load_dotenv()
 
-client = AzureOpenAI(
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    api_version=os.getenv("AZURE_API_VERSION"),
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-)
-
-chat_model = AzureChatOpenAI(
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    api_version=os.getenv("AZURE_API_VERSION"),
-    azure_deployment=os.getenv("AZURE_MODEL"),
-)
\ No newline at end of file
+_lock = threading.RLock()
+
+def _create_http_clients():
+    from utils.http_pool import http_clients_from_env
+
+    # One pooled HTTP client pair shared by every OpenAI client, so they reuse warm connections
+    return http_clients_from_env()
+
+def _create_client():
+    from openai import AzureOpenAI
+
+    http_clients = _get("http_clients")
+    return AzureOpenAI(
+        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+        api_version=os.getenv("AZURE_API_VERSION"),
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        http_client=http_clients.client,
+        timeout=http_clients.timeout,
+    )
+
+def create_chat_model(endpoint=None, deployment=None, api_key=None, api_version=None, **kwargs):
+    """
+    Chat model for one Azure deployment, defaulting to the AZURE_* settings
+    """
+    from langchain_openai import AzureChatOpenAI
+
+    http_clients = _get("http_clients")
+    return AzureChatOpenAI(
+        azure_endpoint=endpoint or os.getenv("AZURE_OPENAI_ENDPOINT"),
+        api_key=api_key or os.getenv("AZURE_OPENAI_API_KEY"),
+        api_version=api_version or os.getenv("AZURE_API_VERSION"),
+        azure_deployment=deployment or os.getenv("AZURE_MODEL"),
+        http_client=http_clients.client,
+        http_async_client=http_clients.async_client,
+        timeout=http_clients.timeout,
+        **kwargs,
+    )
+
+def create_router(deployments_config):
+    """
+    Route over the deployments listed in AZURE_DEPLOYMENTS, e.g.
+    [{"name": "eastus", "endpoint": "https://...", "deployment": "gpt-4o", "weight": 2, "tpm": 150000}]
+    Missing endpoint, deployment, api_key and api_version fall back to the AZURE_* settings
+    """
+    from agents.model_router import Deployment, ModelRouter
+
+    deployments = []
+    for i, config in enumerate(json.loads(deployments_config)):
+        model = create_chat_model(
+            endpoint=config.get("endpoint"),
+            deployment=config.get("deployment"),
+            api_key=config.get("api_key"),
+            api_version=config.get("api_version"),
+            # The router retries on another deployment instead of waiting on the same one
+            max_retries=0,
+        )
+        deployments.append(Deployment(
+            config.get("name") or f"{config.get('deployment') or os.getenv('AZURE_MODEL')}-{i}",
+            model,
+            weight=float(config.get("weight", 1)),
+            tpm=int(config.get("tpm", 0)),
+        ))
+    return ModelRouter(
+        deployments=deployments,
+        max_attempts=int(os.getenv("MODEL_ROUTER_MAX_ATTEMPTS", "4")),
+        max_wait=float(os.getenv("MODEL_ROUTER_MAX_WAIT_SECONDS", "30")),
+    )
+
+def create_fallback_model(backend):
+    """
+    Local model served while Azure is unavailable
+    :param backend: "ollama", or "openai" for any local OpenAI-compatible server
+    :return: chat model
+    """
+    if backend == "ollama":
+        from langchain_ollama import ChatOllama
+
+        return ChatOllama(
+            model=os.getenv("FALLBACK_MODEL", "llama3.1:8b"),
+            base_url=os.getenv("FALLBACK_BASE_URL", "http://localhost:11434"),
+        )
+    if backend == "openai":
+        from langchain_openai import ChatOpenAI
+
+        return ChatOpenAI(
+            model=os.getenv("FALLBACK_MODEL", "local-model"),
+            base_url=os.getenv("FALLBACK_BASE_URL", "http://localhost:8000/v1"),
+            api_key=os.getenv("FALLBACK_API_KEY", "not-needed"),
+        )
+    raise ValueError(f"Unknown FALLBACK_BACKEND {backend}")
+
+def create_circuit_breaker(primary, backend):
+    from agents.circuit_breaker import CircuitBreakerChatModel
+
+    return CircuitBreakerChatModel(
+        primary=primary,
+        fallback=create_fallback_model(backend),
+        primary_name="azure",
+        fallback_name=backend,
+        window_seconds=float(os.getenv("CIRCUIT_WINDOW_SECONDS", "60")),
+        min_calls=int(os.getenv("CIRCUIT_MIN_CALLS", "10")),
+        failure_rate=float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5")),
+        slow_rate=float(os.getenv("CIRCUIT_SLOW_RATE", "0.5")),
+        slow_call_seconds=float(os.getenv("CIRCUIT_SLOW_CALL_SECONDS", "10")),
+        open_seconds=float(os.getenv("CIRCUIT_OPEN_SECONDS", "30")),
+        call_timeout=float(os.getenv("CIRCUIT_CALL_TIMEOUT_SECONDS", "20")),
+    )
+
+def _create_chat_model():
+    # A single deployment unless AZURE_DEPLOYMENTS lists several to route between
+    model = (
+        create_router(os.getenv("AZURE_DEPLOYMENTS"))
+        if os.getenv("AZURE_DEPLOYMENTS")
+        else create_chat_model()
+    )
+    # With a fallback configured, Azure outages are served by the local model
+    if os.getenv("FALLBACK_BACKEND"):
+        model = create_circuit_breaker(model, os.getenv("FALLBACK_BACKEND"))
+    return model
+
+def _create_hedge_model():
+    # Optional separate deployment for hedged second calls, see agents/hedging.py
+    if os.getenv("AZURE_HEDGE_ENDPOINT") or os.getenv("AZURE_HEDGE_DEPLOYMENT"):
+        return create_chat_model(endpoint=os.getenv("AZURE_HEDGE_ENDPOINT"), deployment=os.getenv("AZURE_HEDGE_DEPLOYMENT"))
+    return None
+
+def _create_connection_warmer():
+    from utils.http_pool import ConnectionWarmer
+
+    return ConnectionWarmer(
+        _get("http_clients"),
+        url=f"{(os.getenv('AZURE_OPENAI_ENDPOINT') or '').rstrip('/')}/openai/models?api-version={os.getenv('AZURE_API_VERSION')}",
+        headers={"api-key": os.getenv("AZURE_OPENAI_API_KEY") or ""},
+        interval=float(os.getenv("AZURE_HTTP_WARMUP_INTERVAL_SECONDS", "30")),
+        connections=int(os.getenv("AZURE_HTTP_WARMUP_CONNECTIONS", "2")),
+    )
+
+_FACTORIES = {
+    "http_clients": _create_http_clients,
+    "client": _create_client,
+    "chat_model": _create_chat_model,
+    "hedge_model": _create_hedge_model,
+    "connection_warmer": _create_connection_warmer,
+}
+
+def _get(name):
+    module_globals = globals()
+    if name not in module_globals:
+        with _lock:
+            if name not in module_globals:
+                module_globals[name] = _FACTORIES[name]()
+    return module_globals[name]
+
+def __getattr__(name):
+    if name not in _FACTORIES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return _get(name)
@@ -1,16 +1,88 @@
+import os
+import threading
+
 import gradio as gr
-from tabs.scenario_tab import create_scenario_tab
+from starlette.middleware import Middleware
+from starlette.routing import Mount, Route
+from api.agent_api import create_agent_api
+from tabs.scenario_tab import create_scenario_tab, refresh_scenarios
 from tabs.conversation_tab import create_conversation_tab
-from tabs.vocab_tab import create_vocab_tab
+from tabs.vocab_tab import create_vocab_tab, get_vocab_agent
+from utils.asset_cache import asset_cache
+from utils.learner import LearnerCookieMiddleware, learner_id
 from utils.logger import LOG
+from utils.metrics import metrics_endpoint, register_app_collectors
+from utils.tracing import configure_tracing
+
+def track_learner_page(request: gr.Request):
+    from agents.session_history import open_learner_page
+
+    open_learner_page(learner_id(request), request.session_hash)
+
+def release_learner_sessions(request: gr.Request):
+    from agents.session_history import close_learner_page
+
+    learner = learner_id(request)
+    dropped = close_learner_page(learner, request.session_hash)
+    LOG.debug(f"[Sessions] released {dropped} sessions for {learner}")
+
+async def warm_model_connections():
+    import azure_openai
+
+    # Runs on the server's event loop, which owns the async connection pool
+    azure_openai.connection_warmer.ensure_async_started()
+
+def prepare_backends():
+    """
+    Register the session metrics, build the model clients, open warm connections and
+    prefill the vocab rounds, off the startup path so the server starts listening right away
+    """
+    import azure_openai
+    from agents.session_history import store
+    from utils.admission import model_admission
+
+    try:
+        register_app_collectors(store, model_admission, azure_openai.connection_warmer)
+        azure_openai.connection_warmer.start()
+        get_vocab_agent()
+    except Exception as e:
+        LOG.error(f"[Startup] preparing model backends failed: {e}")
 
 def main():
     with gr.Blocks(title="Language Mentor 英语私教") as language_mentor_app:
-        create_scenario_tab()
+        scenario_radio = create_scenario_tab()
         create_conversation_tab()
         create_vocab_tab()
+        language_mentor_app.load(track_learner_page)
+        language_mentor_app.unload(release_learner_sessions)
+        language_mentor_app.load(warm_model_connections)
+        # Scenarios added since startup show up on the next page load
+        language_mentor_app.load(refresh_scenarios, outputs=scenario_radio, queue=False, show_progress="hidden")
+
+    # Handlers are async and model calls are bounded by MODEL_MAX_CONCURRENCY,
+    # so Gradio itself does not need to serialize events per listener
+    concurrency_limit = int(os.getenv("GRADIO_CONCURRENCY_LIMIT", "0")) or None
+    language_mentor_app.queue(default_concurrency_limit=concurrency_limit)
 
-    language_mentor_app.launch(share=True, server_name="0.0.0.0")
+    configure_tracing()
+    asset_cache.start()
+    threading.Thread(target=prepare_backends, name="prepare-backends", daemon=True).start()
+    share = os.getenv("GRADIO_SHARE", "true").lower() == "true"
+    # Prometheus metrics and the headless API are served next to the UI, on the same port.
+    # The learner cookie keys the sessions, so a reload or a restart resumes them
+    routes = [Route("/metrics", metrics_endpoint)]
+    try:
+        routes.append(Mount("/api/v1", app=create_agent_api()))
+    except ValueError as e:
+        LOG.warning(f"[Startup] headless API not served: {e}")
+    language_mentor_app.launch(
+        share=share,
+        server_name="0.0.0.0",
+        app_kwargs={
+            "routes": routes,
+            "middleware": [Middleware(LearnerCookieMiddleware)],
+        },
+    )
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,172 @@
+"""
+Chat wiring that keeps the transcript on the server only.
+
+gr.ChatInterface uploads and downloads the whole chat history several times per turn,
+although the agents read their history from the session store. Here the browser adds
+the learner's message to the chatbot itself and sends only that message, with Gradio's
+session hash as the session token. The handler streams back the reply text, which
+Gradio sends as appended deltas, and the browser writes it into the last message.
+The chatbot value is only sent by the server when a session (re)starts.
+
+Undo, retry and edit change the chatbot in the browser too, then drop as many learner
+turns from the end of the session store as they dropped from the chat, so the model
+never sees discarded turns. Counting from the end keeps both sides in step when the
+store holds turns the chat does not show. Retry and edit then ask again like a new message.
+"""
+import gradio as gr
+
+_HELPERS = """
+    const turn = (role, text) => ({role: role, metadata: null, content: [{type: "text", text: text}], options: null});
+    const text = (message) => typeof message.content === "string" ? message.content
+        : message.content.filter((part) => part.type === "text").map((part) => part.text).join("");
+    const turnsFrom = (history, index) => history.slice(index).filter((message) => message.role === "user").length;
+    const lastUser = (history) => {
+        let index = history.length - 1;
+        while (index >= 0 && history[index].role !== "user") index--;
+        return index;
+    };
+"""
+
+# Clear the textbox, hand the message to the handler and show it with an empty reply.
+# Outputs: textbox, pending message, reply, ask counter, chatbot
+SEND_JS = """
+(message, asked, history) => {""" + _HELPERS + """
+    history = history || [];
+    if (!message || !message.trim()) {
+        return ["", "", "", asked, history];
+    }
+    return ["", message, "", asked + 1, [...history, turn("user", message), turn("assistant", "")]];
+}
+"""
+
+# Drop the last learner message and the reply to it, and put it back in the textbox.
+# Outputs: textbox, learner turns to drop, chatbot
+UNDO_JS = """
+(history) => {""" + _HELPERS + """
+    history = history || [];
+    const index = lastUser(history);
+    if (index < 0) {
+        return ["", 0, history];
+    }
+    return [text(history[index]), turnsFrom(history, index), history.slice(0, index)];
+}
+"""
+
+# Replace the replies to the last learner message with an empty one, and ask it again.
+# Outputs: pending message, learner turns to drop, reply, chatbot
+RETRY_JS = """
+(history) => {""" + _HELPERS + """
+    history = history || [];
+    const index = lastUser(history);
+    if (index < 0) {
+        return ["", 0, "", history];
+    }
+    return [text(history[index]), turnsFrom(history, index), "", [...history.slice(0, index + 1), turn("assistant", "")]];
+}
+"""
+
+# Drop what followed the edited learner message and ask it again.
+# Outputs: learner turns to drop, reply, chatbot
+EDIT_JS = """
+(index, message, history) => {""" + _HELPERS + """
+    history = history || [];
+    return [turnsFrom(history, index), "", [...history.slice(0, index), turn("user", message), turn("assistant", "")]];
+}
+"""
+
+# Write the reply streamed so far into the last message
+SHOW_REPLY_JS = """
+(reply, history) => {
+    if (!history || !history.length || history[history.length - 1].role !== "assistant") {
+        return [history];
+    }
+    const last = history[history.length - 1];
+    const content = [{type: "text", text: reply}];
+    return [[...history.slice(0, -1), {...last, content: content}]];
+}
+"""
+
+
+def edited_message(edit_data: gr.EditData):
+    """
+    Index and new text of the message the learner edited
+    :param edit_data:
+    :return: (index, text)
+    """
+    index = edit_data.index[0] if isinstance(edit_data.index, (list, tuple)) else edit_data.index
+    return index, edit_data.value
+
+
+def create_chat_panel(fn, chatbot, additional_inputs=None, rewind=None):
+    """
+    Textbox and events sending each message to ``fn`` without the chat history
+    :param fn: async generator fn(user_input, *additional_inputs, request) yielding the reply so far
+    :param chatbot: gr.Chatbot showing the conversation, editable="user" to allow edits
+    :param additional_inputs: components whose values are also passed to fn and rewind
+    :param rewind: fn(turns, *additional_inputs, request) dropping the last ``turns`` learner turns
+        from the session; enables the chatbot's undo, retry and edit
+    :return: the event streaming the reply
+    """
+    additional_inputs = list(additional_inputs or [])
+    textbox = gr.Textbox(
+        show_label=False,
+        placeholder="Type a message...",
+        scale=7,
+        submit_btn=True,
+    )
+    # Mounted but not shown, so the browser can set them and react to their changes
+    pending = gr.Textbox(visible="hidden")
+    reply = gr.Textbox(visible="hidden")
+    asked = gr.Number(value=0, precision=0, visible="hidden")
+
+    reply.change(fn=None, js=SHOW_REPLY_JS, inputs=[reply, chatbot], outputs=chatbot, queue=False)
+    # Every way of asking (send, retry, edit) bumps the counter, so one event streams all replies
+    # and undo, retry and edit can cancel it
+    answer = asked.change(
+        fn,
+        inputs=[pending, *additional_inputs],
+        outputs=reply,
+        api_name=fn.__name__,
+        show_progress="hidden",
+    )
+    textbox.submit(
+        fn=None,
+        js=SEND_JS,
+        inputs=[textbox, asked, chatbot],
+        outputs=[textbox, pending, reply, asked, chatbot],
+        queue=False,
+    )
+    if rewind is None:
+        return answer
+
+    drop_turns = gr.Number(precision=0, visible="hidden")
+    edited_index = gr.Number(precision=0, visible="hidden")
+    rewind_kwargs = {
+        "fn": rewind,
+        "inputs": [drop_turns, *additional_inputs],
+        "outputs": None,
+        "queue": False,
+        "api_visibility": "undocumented",
+    }
+    ask_again = {
+        "fn": None,
+        "js": "(asked) => asked + 1",
+        "inputs": asked,
+        "outputs": asked,
+        "queue": False,
+    }
+
+    chatbot.undo(
+        fn=None, js=UNDO_JS, inputs=chatbot, outputs=[textbox, drop_turns, chatbot], queue=False, cancels=answer,
+    ).then(**rewind_kwargs)
+    chatbot.retry(
+        fn=None, js=RETRY_JS, inputs=chatbot, outputs=[pending, drop_turns, reply, chatbot], queue=False,
+        cancels=answer,
+    ).then(**rewind_kwargs).then(**ask_again)
+    chatbot.edit(
+        edited_message, inputs=None, outputs=[edited_index, pending], queue=False, cancels=answer,
+        api_visibility="undocumented",
+    ).then(
+        fn=None, js=EDIT_JS, inputs=[edited_index, pending, chatbot], outputs=[drop_turns, reply, chatbot], queue=False,
+    ).then(**rewind_kwargs).then(**ask_again)
+    return answer
@@ -1,28 +1,54 @@
+import threading
+
 import gradio as gr
-from agents.conversation_agent import ConversationAgent
-from utils.logger import LOG
+from agents.session_history import rewind_session
+from tabs.chat_panel import create_chat_panel
+from utils.learner import learner_id
+from utils.tracing import traced_stream
+
+# Built on first use by get_conversation_agent
+conversation_agent = None
+_conversation_agent_lock = threading.Lock()
+
+def get_conversation_agent():
+    """
+    The conversation agent, created on first call
+    :return: ConversationAgent
+    """
+    global conversation_agent
+    if conversation_agent is None:
+        with _conversation_agent_lock:
+            if conversation_agent is None:
+                from agents.conversation_agent import ConversationAgent
 
-conversation_agent = ConversationAgent()
+                conversation_agent = ConversationAgent()
+    return conversation_agent
 
-def handle_conversation(user_input, chat_history):
-    bot_message = conversation_agent.chat_with_history(user_input)
-    LOG.info(f"[Conversation ChatBot]: {bot_message}")
-    return bot_message
+async def handle_conversation(user_input, request: gr.Request = None):
+    if not user_input or not user_input.strip():
+        return
+    conversation_agent = get_conversation_agent()
+    session_id = conversation_agent.get_session_id(learner_id(request))
+    bot_message = ""
+    async for chunk in traced_stream(
+        "handle_conversation",
+        conversation_agent.astream_with_history(user_input, session_id),
+        {"agent.name": conversation_agent.name, "session.id": session_id},
+    ):
+        bot_message += chunk
+        yield bot_message
+
+def rewind_conversation(turns, request: gr.Request = None):
+    conversation_agent = get_conversation_agent()
+    rewind_session(conversation_agent.get_session_id(learner_id(request)), int(turns))
 
 def create_conversation_tab():
     with gr.Tab("对话练习"):
         gr.Markdown("## 练习英语对话 ")
         conversation_chatbot = gr.Chatbot(
+            editable="user",
             placeholder="<strong>您的英语私教 Paul</strong><br><br>想和我聊什么话题都可以，记得用英语哦！",
             height=600,
         )
 
-        def handle_conversation(user_input, chat_history):
-            bot_message = conversation_agent.chat_with_history(user_input)
-            LOG.info(f"[ChatBot]: {bot_message}")
-            return bot_message
-
-        gr.ChatInterface(
-            fn=handle_conversation,
-            chatbot=conversation_chatbot,
-        )
\ No newline at end of file
+        create_chat_panel(handle_conversation, conversation_chatbot, rewind=rewind_conversation)
\ No newline at end of file
@@ -1,60 +1,96 @@
 import gradio as gr
-from agents.scenario_agent import ScenarioAgent
+from agents.scenario_registry import scenario_registry_from_env
+from agents.session_history import rewind_session
+from tabs.chat_panel import create_chat_panel
+from utils.asset_cache import asset_cache
+from utils.learner import learner_id
 from utils.logger import LOG
+from utils.tracing import span, traced_stream
 
-agents = {
-    "job_interview": ScenarioAgent("job_interview"),
-    "hotel_checkin": ScenarioAgent("hotel_checkin"),
-    "renting_house": ScenarioAgent("renting_house"),
-    "airport_checkin": ScenarioAgent("airport_checkin"),
-}
+# Scenarios found under prompts/ and content/, each agent built the first time it is picked
+scenario_registry = scenario_registry_from_env()
+
+def get_scenario_agent(scenario):
+    """
+    The agent for a scenario, created on first call
+    :param scenario:
+    :return: ScenarioAgent
+    """
+    return scenario_registry.get(scenario)
 
 def get_page_desc(scenario):
     try:
-        with open(f"../content/page/{scenario}.md", "r", encoding="utf-8") as file:
-            scenario_intro = file.read().strip()
-        return scenario_intro
-    except FileNotFoundError:
+        page_file = scenario_registry.scenario(scenario).page_file
+        if page_file is None:
+            raise FileNotFoundError(scenario)
+        return asset_cache.read_text(page_file).strip()
+    except (KeyError, FileNotFoundError):
         LOG.error(f"Page {scenario} not found.")
         return "Scenario introduction page not found."
 
-def start_new_scenario_chatbot(scenario):
-    initial_ai_message = agents[scenario].start_new_session()
+def refresh_scenarios():
+    """
+    Rediscover scenarios, so ones added to prompts/ and content/ since startup can be picked
+    :return: update of the scenario choices
+    """
+    scenario_registry.refresh()
+    return gr.update(choices=scenario_registry.choices())
+
+async def start_new_scenario_chatbot(scenario, request: gr.Request = None):
+    agent = get_scenario_agent(scenario)
+    session_id = agent.get_session_id(learner_id(request))
+    with span("start_new_scenario_chatbot", {"agent.name": agent.name, "session.id": session_id}):
+        initial_ai_message = await agent.astart_new_session(session_id)
     return [{"role": "assistant", "content": initial_ai_message}]
 
-def handle_scenario(user_input, chat_history, scenario):
-    bot_message = agents[scenario].chat_with_history(user_input)
-    LOG.info(f"[ChatBot]: {bot_message}")
-    return bot_message
+async def change_scenario(scenario, request: gr.Request = None):
+    return get_page_desc(scenario), await start_new_scenario_chatbot(scenario, request)
+
+async def handle_scenario(user_input, scenario, request: gr.Request = None):
+    if not user_input or not user_input.strip():
+        return
+    agent = get_scenario_agent(scenario)
+    session_id = agent.get_session_id(learner_id(request))
+    bot_message = ""
+    async for chunk in traced_stream(
+        "handle_scenario",
+        agent.astream_with_history(user_input, session_id),
+        {"agent.name": agent.name, "session.id": session_id},
+    ):
+        bot_message += chunk
+        yield bot_message
+
+def rewind_scenario(turns, scenario, request: gr.Request = None):
+    agent = get_scenario_agent(scenario)
+    rewind_session(agent.get_session_id(learner_id(request)), int(turns))
 
 def create_scenario_tab():
-    with gr.Tab("场景训练"):
+    """
+    Scenario training tab
+    :return: the scenario selector, whose choices refresh_scenarios updates
+    """
+    with gr.Tab("场景训练") as scenario_tab:
         gr.Markdown("## 选择一个场景完成目标和挑战")
 
         scenario_radio = gr.Radio(
-            choices=[
-                ("酒店入住", "hotel_checkin"),
-                ("求职面试", "job_interview"),
-                ("租赁房屋", "renting_house"),
-                ("机场值机", "airport_checkin"),
-                # ("薪资谈判", "salary_negotiation"),
-            ],
+            choices=scenario_registry.choices(),
             label="场景"
         )
         scenario_intro = gr.Markdown()
         scenario_chatbot = gr.Chatbot(
+            editable="user",
             placeholder="<strong>您的英语私教 Paul</strong><br><br>选择场景后开始对话吧！",
             height=600,
         )
 
         scenario_radio.change(
-            fn=lambda s: (get_page_desc(s), start_new_scenario_chatbot(s)),
+            fn=change_scenario,
             inputs=scenario_radio,
             outputs=[scenario_intro, scenario_chatbot],
         )
+        scenario_tab.select(refresh_scenarios, inputs=None, outputs=scenario_radio, queue=False, show_progress="hidden")
 
-        gr.ChatInterface(
-            fn=handle_scenario,
-            chatbot=scenario_chatbot,
-            additional_inputs=scenario_radio,
-        )
\ No newline at end of file
+        create_chat_panel(
+            handle_scenario, scenario_chatbot, additional_inputs=[scenario_radio], rewind=rewind_scenario
+        )
+    return scenario_radio
@@ -1,31 +1,67 @@
+import threading
+
 import gradio as gr
-from agents.vocab_agent import VocabAgent
+from agents.session_history import rewind_session
+from tabs.chat_panel import create_chat_panel
+from utils.asset_cache import asset_cache
+from utils.learner import learner_id
 from utils.logger import LOG
+from utils.tracing import span, traced_stream
 
 
-vocab_agent = VocabAgent()
+# Built on first use by get_vocab_agent, so the app starts without touching the model
+vocab_agent = None
+_vocab_agent_lock = threading.Lock()
 
 feature = "vocab_study"
 
+def get_vocab_agent():
+    """
+    The vocab agent, created and its round pool started on first call
+    :return: VocabAgent
+    """
+    global vocab_agent
+    if vocab_agent is None:
+        with _vocab_agent_lock:
+            if vocab_agent is None:
+                from agents.vocab_agent import VocabAgent
+
+                agent = VocabAgent()
+                agent.round_pool.start()
+                vocab_agent = agent
+    return vocab_agent
+
 def get_page_desc(feature):
     try:
-        with open(f"../content/page/{feature}.md", "r", encoding="utf-8") as file:
-            scenario_intro = file.read().strip()
-        return scenario_intro
+        return asset_cache.read_text(f"../content/page/{feature}.md").strip()
     except FileNotFoundError:
         LOG.error(f"File not found: {feature}.md")
         return "vocab study page not found"
 
-def restart_vocab_study_chatbot():
-    vocab_agent.restart_session()
-    _next_round = "Let's do it"
-    bot_message = vocab_agent.chat_with_history(_next_round)
+async def restart_vocab_study_chatbot(request: gr.Request = None):
+    vocab_agent = get_vocab_agent()
+    session_id = vocab_agent.get_session_id(learner_id(request))
+    with span("restart_vocab_study_chatbot", {"agent.name": vocab_agent.name, "session.id": session_id}):
+        bot_message = await vocab_agent.astart_next_round(session_id)
     return [{"role": "assistant", "content": bot_message}]
 
-def handle_vocab(user_input, chat_history):
-    bot_message = vocab_agent.chat_with_history(user_input)
-    LOG.info(f"[Vocab ChatBot]: {bot_message}")
-    return bot_message
+async def handle_vocab(user_input, request: gr.Request = None):
+    if not user_input or not user_input.strip():
+        return
+    vocab_agent = get_vocab_agent()
+    session_id = vocab_agent.get_session_id(learner_id(request))
+    bot_message = ""
+    async for chunk in traced_stream(
+        "handle_vocab",
+        vocab_agent.astream_with_history(user_input, session_id),
+        {"agent.name": vocab_agent.name, "session.id": session_id},
+    ):
+        bot_message += chunk
+        yield bot_message
+
+def rewind_vocab(turns, request: gr.Request = None):
+    vocab_agent = get_vocab_agent()
+    rewind_session(vocab_agent.get_session_id(learner_id(request)), int(turns))
 
 def create_vocab_tab():
     with gr.Tab("单词"):
@@ -34,6 +70,7 @@ def create_vocab_tab():
         gr.Markdown(get_page_desc(feature))
 
         vocab_study_chatbot = gr.Chatbot(
+            editable="user",
             placeholder="<strong>您的英语私教 Paul</strong><br><br>开始学习新单词吧！",
             height=600,
         )
@@ -45,7 +82,4 @@ def create_vocab_tab():
             outputs=vocab_study_chatbot,
         )
 
-        gr.ChatInterface(
-            fn=handle_vocab,
-            chatbot=vocab_study_chatbot,
-        )
\ No newline at end of file
+        create_chat_panel(handle_vocab, vocab_study_chatbot, rewind=rewind_vocab)
\ No newline at end of file
@@ -60,3 +60,16 @@ def clear_session_store():
     yield
     store.clear()
 
+
+
+@pytest.fixture
+def span_exporter():
+    """Record every span in memory for the duration of a test"""
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+    from utils.tracing import configure_tracing, shutdown_tracing
+
+    exporter = InMemorySpanExporter()
+    configure_tracing(enabled=True, sample_rate=1.0, span_processor=SimpleSpanProcessor(exporter))
+    yield exporter
+    shutdown_tracing()
@@ -0,0 +1,153 @@
+"""
+Unit tests for TPM/RPM admission control
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+from utils.admission import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    AdmissionController,
+    AdmissionRejected,
+)
+
+
+class TestAdmissionController:
+    """Test AdmissionController functionality"""
+
+    def test_disabled_without_quotas(self):
+        """Test that no quota means no waiting and no bookkeeping"""
+        controller = AdmissionController()
+
+        assert controller.enabled is False
+        assert controller.admit(10 ** 9) == 0.0
+        assert controller.stats()["admitted"] == 0
+
+    def test_admits_within_quota(self):
+        """Test that calls within the bucket are admitted immediately"""
+        controller = AdmissionController(tpm=1000, rpm=10)
+
+        assert controller.admit(400) == 0.0
+        assert controller.admit(400) == 0.0
+
+        stats = controller.stats()
+        assert stats["admitted"] == 2
+        assert stats["tokens_available"] == pytest.approx(200, abs=5)
+        assert stats["requests_available"] == pytest.approx(8, abs=0.1)
+
+    def test_waits_are_exported(self):
+        """Test that each admission wait is observed by the wait histogram, per priority"""
+        from utils.metrics import registry
+
+        def count():
+            return registry.get_sample_value(
+                "language_mentor_admission_wait_seconds_count", {"priority": "background"}
+            ) or 0.0
+
+        before = count()
+        controller = AdmissionController(tpm=1000)
+        controller.admit(100, PRIORITY_BACKGROUND)
+        controller.admit(100, PRIORITY_BACKGROUND)
+
+        assert count() == before + 2
+
+    def test_try_admit_never_waits(self):
+        """Test that try_admit takes quota that is there and refuses instead of queueing"""
+        controller = AdmissionController(tpm=1000, clock=lambda: 0.0)
+
+        assert controller.try_admit(600) is True
+        assert controller.try_admit(600) is False
+        assert controller.stats()["tokens_available"] == 400
+        assert controller.stats()["queue_depth"] == 0
+
+    def test_rejects_when_wait_exceeds_limit(self):
+        """Test that a call that would wait past its limit is rejected up front"""
+        controller = AdmissionController(tpm=60, max_wait={PRIORITY_INTERACTIVE: 10})
+        controller.admit(60)
+
+        with pytest.raises(AdmissionRejected) as exc_info:
+            controller.admit(30)
+
+        assert exc_info.value.expected_wait > 10
+        assert "busy" in exc_info.value.user_message
+        assert controller.stats()["rejected"] == 1
+
+    def test_rpm_limit_queues_calls(self):
+        """Test that a call waits for the request bucket to refill"""
+        controller = AdmissionController(rpm=600)
+        for _ in range(600):
+            controller.admit(1)
+
+        waited = controller.admit(1)
+
+        assert 0.05 <= waited <= 1.0
+
+    def test_interactive_calls_go_first(self):
+        """Test that a learner turn overtakes a queued background call"""
+        controller = AdmissionController(tpm=6000)
+        controller.admit(6000)
+        order = []
+
+        def call(priority, name):
+            controller.admit(20, priority)
+            order.append(name)
+
+        background = threading.Thread(target=call, args=(PRIORITY_BACKGROUND, "background"))
+        background.start()
+        while controller.stats()["queue_depth"] < 1:
+            time.sleep(0.001)
+        interactive = threading.Thread(target=call, args=(PRIORITY_INTERACTIVE, "interactive"))
+        interactive.start()
+        background.join(5)
+        interactive.join(5)
+
+        assert order == ["interactive", "background"]
+        assert controller.stats()["queue_depth"] == 0
+        assert controller.stats()["max_wait_ms"] > 0
+
+    def test_async_admission(self):
+        """Test that asyncio tasks queue and are admitted in order"""
+        controller = AdmissionController(tpm=6000)
+        controller.admit(6000)
+
+        async def run():
+            order = []
+
+            async def call(priority, name):
+                await controller.aadmit(20, priority)
+                order.append(name)
+
+            first = asyncio.create_task(call(PRIORITY_BACKGROUND, "background"))
+            await asyncio.sleep(0.01)
+            second = asyncio.create_task(call(PRIORITY_INTERACTIVE, "interactive"))
+            await asyncio.gather(first, second)
+            return order
+
+        assert asyncio.run(run()) == ["interactive", "background"]
+
+    def test_cancelled_waiter_leaves_queue(self):
+        """Test that a cancelled call gives up its place in the queue"""
+        controller = AdmissionController(tpm=600)
+        controller.admit(600)
+
+        async def run():
+            task = asyncio.create_task(controller.aadmit(50))
+            await asyncio.sleep(0.01)
+            assert controller.stats()["queue_depth"] == 1
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+        assert controller.stats()["queue_depth"] == 0
+
+    def test_settle_returns_overestimated_tokens(self):
+        """Test that real usage below the estimate is credited back"""
+        controller = AdmissionController(tpm=1000)
+        controller.admit(800)
+
+        controller.settle(800, 300)
+
+        assert controller.stats()["tokens_available"] == pytest.approx(700, abs=5)
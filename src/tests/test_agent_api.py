@@ -0,0 +1,159 @@
+"""
+Unit tests for the headless agent API
+"""
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage, HumanMessage
+
+from api.agent_api import create_agent_api
+
+
+@pytest.fixture
+def mock_agent():
+    """Agent answering with fixed replies and streams"""
+    agent = MagicMock()
+    agent.name = "conversation"
+    agent.get_session_id.side_effect = lambda learner_id: f"conversation:{learner_id}"
+    agent.achat_with_history = AsyncMock(return_value="Nice to meet you!")
+
+    async def astream(user_input, session_id):
+        for chunk in ["Nice", " to", " meet", " you!"]:
+            yield chunk
+
+    agent.astream_with_history = astream
+    with patch('api.agent_api.get_agent', return_value=agent):
+        yield agent
+
+
+@pytest.fixture
+def client():
+    return TestClient(
+        create_agent_api(api_key="secret", websocket_idle_seconds=0), headers={"Authorization": "Bearer secret"}
+    )
+
+
+class TestAgentApi:
+    """Test the JSON, SSE and WebSocket endpoints"""
+
+    def test_send_message(self, client, mock_agent):
+        """Test that a message is answered in the learner's session"""
+        response = client.post("/agents/conversation/sessions/abc/messages", json={"text": "Hi, I'm Li"})
+
+        assert response.status_code == 200
+        assert response.json() == {"reply": "Nice to meet you!"}
+        mock_agent.achat_with_history.assert_awaited_once_with("Hi, I'm Li", "conversation:abc")
+
+    def test_empty_message_rejected(self, client, mock_agent):
+        """Test input validation"""
+        response = client.post("/agents/conversation/sessions/abc/messages", json={"text": ""})
+
+        assert response.status_code == 422
+        mock_agent.achat_with_history.assert_not_called()
+
+    def test_start_scenario_session(self, client):
+        """Test that starting a scenario session returns its intro and a new learner id"""
+        agent = MagicMock()
+        agent.get_session_id.side_effect = lambda learner_id: f"hotel_checkin:{learner_id}"
+        agent.astart_new_session = AsyncMock(return_value="Welcome to the Grand Hotel!")
+
+        with patch('api.agent_api.get_agent', return_value=agent):
+            response = client.post("/agents/hotel_checkin/sessions")
+
+        body = response.json()
+        assert response.status_code == 201
+        assert body["message"] == "Welcome to the Grand Hotel!"
+        agent.astart_new_session.assert_awaited_once_with(f"hotel_checkin:{body['learner_id']}")
+
+    def test_unknown_agent(self, client):
+        """Test that unknown agents are 404"""
+        with patch('tabs.scenario_tab.get_scenario_agent', side_effect=KeyError("nope")):
+            response = client.post("/agents/nope/sessions/abc/messages", json={"text": "Hi"})
+
+        assert response.status_code == 404
+
+    def test_stream_message(self, client, mock_agent):
+        """Test that the reply is streamed as server-sent events, then the full reply"""
+        with client.stream("POST", "/agents/conversation/sessions/abc/messages/stream", json={"text": "Hi"}) as response:
+            lines = [line for line in response.iter_lines() if line]
+
+        assert lines[0] == 'data: {"text": "Nice"}'
+        assert lines[-2:] == ["event: done", 'data: {"reply": "Nice to meet you!"}']
+
+    def test_history_and_reset(self, client, mock_agent, clear_session_store):
+        """Test reading and resetting a session in the shared session store"""
+        from agents.session_history import get_session_history
+
+        get_session_history("conversation:abc").add_messages([HumanMessage(content="Hi"), AIMessage(content="Hello!")])
+
+        messages = client.get("/agents/conversation/sessions/abc/messages").json()["messages"]
+        assert messages == [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello!"}]
+
+        assert client.delete("/agents/conversation/sessions/abc").status_code == 204
+        assert client.get("/agents/conversation/sessions/abc/messages").json()["messages"] == []
+
+    def test_websocket(self, client, mock_agent):
+        """Test several turns over one WebSocket"""
+        with client.websocket_connect("/agents/conversation/sessions/abc/ws") as websocket:
+            for _ in range(2):
+                websocket.send_json({"text": "Hi"})
+                events = [websocket.receive_json() for _ in range(5)]
+
+                assert [event["type"] for event in events] == ["token"] * 4 + ["done"]
+                assert events[-1]["reply"] == "Nice to meet you!"
+
+            websocket.send_json({"message": "wrong field"})
+            assert websocket.receive_json()["type"] == "error"
+
+
+class TestAgentApiAuth:
+    """Test the API key"""
+
+    def test_refuses_to_start_without_key(self, monkeypatch):
+        """Test that the API is not built without a key unless anonymous access is allowed"""
+        monkeypatch.delenv("API_KEY", raising=False)
+        monkeypatch.delenv("API_ALLOW_ANONYMOUS", raising=False)
+
+        with pytest.raises(ValueError):
+            create_agent_api()
+
+        monkeypatch.setenv("API_ALLOW_ANONYMOUS", "true")
+        assert create_agent_api() is not None
+
+    def test_anonymous_sessions_are_apart_from_the_ui(self, mock_agent, clear_session_store):
+        """Test that without a key a learner id never reaches the UI session of the same id"""
+        from agents.session_history import get_session_history
+
+        get_session_history("conversation:abc").add_messages([HumanMessage(content="Hi"), AIMessage(content="Hello!")])
+        client = TestClient(create_agent_api(api_key="", allow_anonymous=True))
+
+        assert client.get("/agents/conversation/sessions/abc/messages").json()["messages"] == []
+        assert client.delete("/agents/conversation/sessions/abc").status_code == 204
+        assert len(get_session_history("conversation:abc").messages) == 2
+
+        client.post("/agents/conversation/sessions/abc/messages", json={"text": "Hi"})
+        mock_agent.achat_with_history.assert_awaited_once_with("Hi", "conversation:api:abc")
+
+    def test_api_key_required(self, mock_agent):
+        """Test that requests need the bearer token when API_KEY is set"""
+        client = TestClient(create_agent_api(api_key="secret"))
+
+        assert client.get("/agents/conversation/sessions/abc/messages").status_code == 401
+        response = client.get(
+            "/agents/conversation/sessions/abc/messages", headers={"Authorization": "Bearer secret"}
+        )
+        assert response.status_code == 200
+
+    def test_websocket_api_key(self, mock_agent):
+        """Test that a WebSocket without the key is refused"""
+        from starlette.websockets import WebSocketDisconnect
+
+        client = TestClient(create_agent_api(api_key="secret"))
+
+        with pytest.raises(WebSocketDisconnect):
+            with client.websocket_connect("/agents/conversation/sessions/abc/ws") as websocket:
+                websocket.receive_json()
+        with client.websocket_connect("/agents/conversation/sessions/abc/ws?api_key=secret") as websocket:
+            websocket.send_json({"text": "Hi"})
+            assert websocket.receive_json()["type"] == "token"
@@ -1,10 +1,13 @@
 """
 Unit tests for AgentBase class
 """
+import asyncio
 import pytest
 import json
-from unittest.mock import MagicMock, patch, Mock
+from unittest.mock import AsyncMock, MagicMock, patch, Mock
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, SystemMessage
 from agents.agent_base import AgentBase
+from agents.history_window import estimate_tokens
 
 
 class ConcreteAgent(AgentBase):
@@ -147,3 +150,365 @@ class TestAgentBase:
         config_arg = call_args[0][1] if len(call_args[0]) > 1 else call_args[1]
         assert config_arg["configurable"]["session_id"] == "custom_session"
 
+
+    @patch('agents.agent_base.RunnableWithMessageHistory')
+    def test_stream_with_history(self, mock_runnable_class, sample_prompt_file, clear_session_store):
+        """Test streaming yields chunks and records the full turn in history"""
+        from agents.session_history import get_session_history
+
+        agent = ConcreteAgent(
+            name="test_agent",
+            prompt_file=sample_prompt_file
+        )
+        agent.chatbot = MagicMock()
+        agent.chatbot.stream.return_value = iter([
+            AIMessageChunk(content="Hello"),
+            AIMessageChunk(content=""),
+            AIMessageChunk(content=" there!"),
+        ])
+
+        chunks = list(agent.stream_with_history("Hi"))
+
+        assert chunks == ["Hello", " there!"]
+        messages = get_session_history("test_agent").messages
+        assert [type(m) for m in messages] == [HumanMessage, AIMessage]
+        assert messages[0].content == "Hi"
+        assert messages[1].content == "Hello there!"
+
+    @patch('agents.agent_base.RunnableWithMessageHistory')
+    def test_stream_with_history_sends_previous_turns(self, mock_runnable_class, sample_prompt_file, clear_session_store):
+        """Test streaming passes existing history plus the new input to the model"""
+        from agents.session_history import get_session_history
+
+        agent = ConcreteAgent(
+            name="test_agent",
+            prompt_file=sample_prompt_file
+        )
+        get_session_history("custom_session").add_message(AIMessage(content="Welcome!"))
+        agent.chatbot = MagicMock()
+        agent.chatbot.stream.return_value = iter([AIMessageChunk(content="Sure.")])
+
+        list(agent.stream_with_history("Let's start", session_id="custom_session"))
+
+        sent = agent.chatbot.stream.call_args[0][0]
+        assert [m.content for m in sent] == ["Welcome!", "Let's start"]
+        assert len(get_session_history("custom_session").messages) == 3
+
+    @patch('agents.agent_base.RunnableWithMessageHistory')
+    def test_achat_with_history(self, mock_runnable_class, sample_prompt_file, clear_session_store):
+        """Test async chat uses ainvoke with the session config"""
+        mock_response = MagicMock()
+        mock_response.content = "Async response"
+
+        mock_runnable_instance = MagicMock()
+        mock_runnable_instance.ainvoke = AsyncMock(return_value=mock_response)
+        mock_runnable_class.return_value = mock_runnable_instance
+
+        agent = ConcreteAgent(
+            name="test_agent",
+            prompt_file=sample_prompt_file
+        )
+
+        response = asyncio.run(agent.achat_with_history("Hello", session_id="async_session"))
+
+        assert response == "Async response"
+        config_arg = mock_runnable_instance.ainvoke.call_args[0][1]
+        assert config_arg["configurable"]["session_id"] == "async_session"
+
+    @patch('agents.agent_base.RunnableWithMessageHistory')
+    def test_astream_with_history(self, mock_runnable_class, sample_prompt_file, clear_session_store):
+        """Test async streaming yields chunks and records the full turn in history"""
+        from agents.session_history import get_session_history
+
+        async def fake_astream(messages, config=None):
+            for text in ["Good", " morning"]:
+                yield AIMessageChunk(content=text)
+
+        agent = ConcreteAgent(
+            name="test_agent",
+            prompt_file=sample_prompt_file
+        )
+        agent.chatbot = MagicMock()
+        agent.chatbot.astream = fake_astream
+
+        async def collect():
+            return [chunk async for chunk in agent.astream_with_history("Hi")]
+
+        chunks = asyncio.run(collect())
+
+        assert chunks == ["Good", " morning"]
+        messages = get_session_history("test_agent").messages
+        assert messages[-1].content == "Good morning"
+        assert isinstance(messages[-1], AIMessage)
+
+    @patch('agents.agent_base.RunnableWithMessageHistory')
+    def test_chat_with_history_serves_cached_response(self, mock_runnable_class, sample_prompt_file, clear_session_store):
+        """Test that a cached opener skips the model but is still recorded in history"""
+        from agents.response_cache import ResponseCache
+        from agents.session_history import get_session_history
+
+        mock_runnable_instance = MagicMock()
+        mock_runnable_instance.invoke.return_value = AIMessage(content="Hi! Ready to practice?")
+        mock_runnable_class.return_value = mock_runnable_instance
+
+        agent = ConcreteAgent(name="test_agent", prompt_file=sample_prompt_file)
+        agent.response_cache = ResponseCache()
+
+        assert agent.chat_with_history("Hello!", session_id="learner_a") == "Hi! Ready to practice?"
+        assert agent.chat_with_history("hello", session_id="learner_b") == "Hi! Ready to practice?"
+
+        mock_runnable_instance.invoke.assert_called_once()
+        messages = get_session_history("learner_b").messages
+        assert [m.content for m in messages] == ["hello", "Hi! Ready to practice?"]
+        assert agent.response_cache.stats()["hits"] == 1
+
+    @patch('agents.agent_base.RunnableWithMessageHistory')
+    def test_astream_with_history_serves_cached_response(self, mock_runnable_class, sample_prompt_file, clear_session_store):
+        """Test that a streamed cache hit yields the reply and records the turn"""
+        from agents.response_cache import ResponseCache
+        from agents.session_history import get_session_history
+
+        agent = ConcreteAgent(name="test_agent", prompt_file=sample_prompt_file)
+        agent.response_cache = ResponseCache()
+        agent.response_cache.put(agent.response_cache.key(agent.cache_scope, [], "how are you"), "Great, thanks!")
+        agent.chatbot = MagicMock()
+
+        async def collect():
+            return [chunk async for chunk in agent.astream_with_history("How are you?", session_id="learner_c")]
+
+        assert asyncio.run(collect()) == ["Great, thanks!"]
+        agent.chatbot.astream.assert_not_called()
+        assert [m.content for m in get_session_history("learner_c").messages] == ["How are you?", "Great, thanks!"]
+
+    @patch('agents.agent_base.RunnableWithMessageHistory')
+    def test_chat_with_history_rejected_by_admission(self, mock_runnable_class, sample_prompt_file, clear_session_store):
+        """Test that a call over the quota wait limit gets a friendly reply and leaves history alone"""
+        from agents.session_history import get_session_history
+        from utils.admission import AdmissionController
+
+        mock_runnable_instance = MagicMock()
+        mock_runnable_class.return_value = mock_runnable_instance
+        agent = ConcreteAgent(name="test_agent", prompt_file=sample_prompt_file)
+
+        controller = AdmissionController(tpm=100)
+        controller.admit(100)
+        with patch('agents.agent_base.model_admission', controller):
+            response = agent.chat_with_history("Hello", session_id="busy_session")
+
+        assert "busy" in response
+        mock_runnable_instance.invoke.assert_not_called()
+        assert get_session_history("busy_session").messages == []
+
+    @patch('agents.agent_base.RunnableWithMessageHistory')
+    def test_astream_settles_reported_usage(self, mock_runnable_class, sample_prompt_file, clear_session_store):
+        """Test that a streamed turn corrects the token bucket with the usage on its last chunk"""
+        from utils.admission import AdmissionController
+
+        async def fake_astream(messages, config=None):
+            yield AIMessageChunk(content="Good")
+            yield AIMessageChunk(content="", usage_metadata={"input_tokens": 40, "output_tokens": 10, "total_tokens": 50})
+
+        agent = ConcreteAgent(name="test_agent", prompt_file=sample_prompt_file)
+        agent.expected_completion_tokens = 500
+        agent.chatbot = MagicMock()
+        agent.chatbot.astream = fake_astream
+
+        async def collect():
+            return [chunk async for chunk in agent.astream_with_history("Hi")]
+
+        controller = AdmissionController(tpm=10000, clock=lambda: 0.0)
+        with patch('agents.agent_base.model_admission', controller):
+            asyncio.run(collect())
+
+        assert controller.stats()["tokens_available"] == 10000 - 50
+
+    @patch('agents.agent_base.RunnableWithMessageHistory')
+    def test_abandoned_stream_settles_estimate(self, mock_runnable_class, sample_prompt_file, clear_session_store):
+        """Test that a stream closed early gives back the completion tokens it never received"""
+        from utils.admission import AdmissionController
+
+        agent = ConcreteAgent(name="test_agent", prompt_file=sample_prompt_file)
+        agent.expected_completion_tokens = 500
+        agent.chatbot = MagicMock()
+        agent.chatbot.stream.return_value = iter([AIMessageChunk(content="Good"), AIMessageChunk(content=" morning")])
+
+        controller = AdmissionController(tpm=10000, clock=lambda: 0.0)
+        with patch('agents.agent_base.model_admission', controller):
+            stream = agent.stream_with_history("Hi")
+            assert next(stream) == "Good"
+            stream.close()
+
+        prompt_tokens = agent.estimate_call_tokens([HumanMessage(content="Hi")]) - 500
+        assert controller.stats()["tokens_available"] == 10000 - prompt_tokens - estimate_tokens("Good")
+
+    def test_estimate_call_tokens(self, sample_prompt_file, mock_chat_model, clear_session_store):
+        """Test that the estimate covers the prompt, history and expected completion"""
+        agent = ConcreteAgent(name="test_agent", prompt_file=sample_prompt_file)
+        agent.expected_completion_tokens = 100
+        messages = [HumanMessage(content="word " * 40)]
+
+        assert agent.estimate_call_tokens(messages) == agent.history_window.count(messages) + 100
+
+        agent.history_token_budget = 20
+        assert agent.estimate_call_tokens(messages) == 120
+
+    def test_get_session_id(self, sample_prompt_file, mock_chat_model, clear_session_store):
+        """Test per-learner session ids are namespaced by agent"""
+        agent = ConcreteAgent(
+            name="test_agent",
+            prompt_file=sample_prompt_file
+        )
+
+        assert agent.get_session_id() == "test_agent"
+        assert agent.get_session_id("hash123") == "test_agent:hash123"
+
+    def test_history_token_budget_from_env(self, sample_prompt_file, mock_chat_model, clear_session_store, monkeypatch):
+        """Test the per-agent budget override takes precedence over the global one"""
+        monkeypatch.setenv("HISTORY_TOKEN_BUDGET", "3000")
+        monkeypatch.setenv("HISTORY_TOKEN_BUDGET_TEST_AGENT", "1234")
+
+        agent = ConcreteAgent(name="test_agent", prompt_file=sample_prompt_file)
+        other = ConcreteAgent(name="other_agent", prompt_file=sample_prompt_file)
+
+        assert agent.history_token_budget == 1234
+        assert other.history_token_budget == 3000
+
+    def test_trim_history_drops_old_turns(self, sample_prompt_file, mock_chat_model, clear_session_store):
+        """Test the chain's trim step keeps the prompt within the agent budget"""
+        agent = ConcreteAgent(name="test_agent", prompt_file=sample_prompt_file, history_token_budget=200)
+        messages = []
+        for i in range(20):
+            messages += [HumanMessage(content=f"question {i} " * 10), AIMessage(content=f"answer {i} " * 10)]
+        messages.append(HumanMessage(content="latest"))
+
+        kept = agent.trim_history(messages, {"configurable": {"session_id": "s1"}})
+
+        assert len(kept) < len(messages)
+        assert kept[-1].content == "latest"
+
+    def test_summarized_trim_keeps_its_own_estimate_cache(self, sample_prompt_file, mock_chat_model, clear_session_store):
+        """Test that trimming a summarized history does not reset the cache used to estimate the stored one"""
+        agent = ConcreteAgent(name="test_agent", prompt_file=sample_prompt_file, history_token_budget=10000)
+        agent.summary_memory = MagicMock()
+        agent.summary_memory.apply.side_effect = lambda messages, key: [SystemMessage(content="summary")] + messages[2:]
+        messages = [HumanMessage(content="q1"), AIMessage(content="a1"), HumanMessage(content="q2"),
+                    AIMessage(content="a2"), HumanMessage(content="latest")]
+
+        agent.estimate_call_tokens(messages, "s1")
+        agent.trim_history(messages, {"configurable": {"session_id": "s1"}})
+
+        sessions = agent.history_window._sessions
+        assert sessions["s1"].first is messages[0]
+        assert sessions["s1"].last is messages[-2]
+        assert sessions["s1:summary"].first is not messages[0]
+
+    def test_prompt_file_change_rebuilds_chain(self, sample_prompt_file, mock_chat_model, clear_session_store):
+        """Test that editing the prompt file swaps in a new prompt template without a restart"""
+        import os
+        from utils.asset_cache import asset_cache
+
+        agent = ConcreteAgent(name="test_agent", prompt_file=sample_prompt_file)
+        old_chain, old_scope = agent.chatbot_with_history, agent.cache_scope
+
+        with open(sample_prompt_file, "w", encoding="utf-8") as file:
+            file.write("You are a strict grammar coach.")
+        os.utime(sample_prompt_file, ns=(4_000_000_000, 4_000_000_000))
+        asset_cache.revalidate()
+
+        assert agent.prompt == "You are a strict grammar coach."
+        assert agent.chatbot_with_history is not old_chain
+        assert agent.cache_scope != old_scope
+        assert agent.reload_prompt() is False
+
+    @patch('agents.agent_base.RunnableWithMessageHistory')
+    def test_chat_records_turn_metrics(self, mock_runnable_class, sample_prompt_file, clear_session_store):
+        """Test that a turn is recorded with the token usage reported by the model"""
+        from utils.metrics import registry
+
+        mock_runnable_class.return_value.invoke.return_value = AIMessage(
+            content="Hi!", usage_metadata={"input_tokens": 40, "output_tokens": 2, "total_tokens": 42}
+        )
+        agent = ConcreteAgent(name="metrics_agent", prompt_file=sample_prompt_file)
+
+        agent.chat_with_history("Hello")
+
+        labels = {"agent": "metrics_agent"}
+        assert registry.get_sample_value("language_mentor_turns_total", {**labels, "outcome": "ok"}) == 1
+        assert registry.get_sample_value("language_mentor_prompt_tokens_total", labels) == 40
+        assert registry.get_sample_value("language_mentor_completion_tokens_total", labels) == 2
+        assert registry.get_sample_value("language_mentor_model_calls_in_flight", labels) == 0
+
+    @patch('agents.agent_base.RunnableWithMessageHistory')
+    def test_astream_with_history_traced(self, mock_runnable_class, sample_prompt_file, clear_session_store, span_exporter):
+        """Test that a streamed turn is traced with its history lookup, model call and token counts"""
+        agent = ConcreteAgent(name="test_agent", prompt_file=sample_prompt_file)
+
+        async def fake_astream(messages, config=None):
+            for text in ["Hello", " there"]:
+                yield AIMessageChunk(content=text)
+
+        agent.chatbot = MagicMock()
+        agent.chatbot.astream = fake_astream
+
+        async def collect():
+            return [chunk async for chunk in agent.astream_with_history("Hi", session_id="test_agent:abc")]
+
+        asyncio.run(collect())
+
+        spans = {s.name: s for s in span_exporter.get_finished_spans()}
+        turn = spans["agent.astream_with_history"]
+        assert turn.attributes["session.id"] == "test_agent:abc"
+        assert turn.attributes["agent.name"] == "test_agent"
+        assert turn.attributes["turn.outcome"] == "ok"
+        assert turn.attributes["gen_ai.usage.output_tokens"] > 0
+        for child in ("session.get_history", "session.load_messages", "model.stream"):
+            assert spans[child].parent.span_id == turn.context.span_id
+
+    @patch('agents.agent_base.RunnableWithMessageHistory')
+    def test_chat_logs_one_record_per_turn(self, mock_runnable_class, sample_prompt_file, clear_session_store):
+        """Test that a turn is logged once, with its id, timings and tokens but without the full response"""
+        from utils.logger import LOG
+
+        reply = "A long reply. " * 100
+        mock_runnable_class.return_value.invoke.return_value = AIMessage(
+            content=reply, usage_metadata={"input_tokens": 40, "output_tokens": 300, "total_tokens": 340}
+        )
+        agent = ConcreteAgent(name="test_agent", prompt_file=sample_prompt_file)
+
+        records = []
+        sink = LOG.add(lambda message: records.append(message.record), level="DEBUG")
+        try:
+            with patch('utils.logger.RESPONSE_SAMPLE_RATE', 0.0):
+                agent.chat_with_history("Hello", "test_agent:abc")
+        finally:
+            LOG.remove(sink)
+
+        turns = [record for record in records if "turn_id" in record["extra"]]
+        assert len(turns) == 1
+        fields = turns[0]["extra"]
+        assert fields["session_id"] == "test_agent:abc"
+        assert fields["outcome"] == "ok"
+        assert fields["completion_tokens"] == 300
+        assert fields["latency_ms"] >= 0
+        assert all(reply not in record["message"] for record in records)
+
+    @patch('agents.agent_base.RunnableWithMessageHistory')
+    def test_turn_log_names_the_backend(self, mock_runnable_class, sample_prompt_file, clear_session_store):
+        """Test that the per-turn record says which backend served the turn"""
+        from utils.logger import LOG
+
+        mock_runnable_class.return_value.invoke.return_value = AIMessage(
+            content="Hi!", response_metadata={"backend": "ollama"}
+        )
+        agent = ConcreteAgent(name="test_agent", prompt_file=sample_prompt_file)
+
+        records = []
+        sink = LOG.add(lambda message: records.append(message.record), level="DEBUG")
+        try:
+            agent.chat_with_history("Hello", "test_agent:abc")
+        finally:
+            LOG.remove(sink)
+
+        turn = next(record for record in records if "turn_id" in record["extra"])
+        assert turn["extra"]["backend"] == "ollama"
+        assert "from ollama" in turn["message"]
@@ -0,0 +1,116 @@
+"""
+Unit tests for the prompt/content asset cache
+"""
+import json
+import os
+
+import pytest
+from unittest.mock import MagicMock, patch
+
+from utils.asset_cache import AssetCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def rewrite(path, text, mtime_ns):
+    path.write_text(text, encoding="utf-8")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+class TestAssetCache:
+    """Test serving from memory and revalidation"""
+
+    def test_serves_from_memory(self, tmp_path):
+        """Test that a file is read from disk once while it is fresh"""
+        path = tmp_path / "page.md"
+        path.write_text("# Page", encoding="utf-8")
+        cache = AssetCache(revalidate_seconds=5, clock=FakeClock())
+
+        with patch("builtins.open", wraps=open) as spy:
+            assert cache.read_text(str(path)) == "# Page"
+            assert cache.read_text(str(path)) == "# Page"
+
+        assert spy.call_count == 1
+        assert cache.stats()["hits"] == 1
+
+    def test_revalidates_after_interval(self, tmp_path):
+        """Test that a change is only noticed once the revalidation interval has passed"""
+        path = tmp_path / "prompt.txt"
+        rewrite(path, "old", 1_000_000_000)
+        clock = FakeClock()
+        cache = AssetCache(revalidate_seconds=5, clock=clock)
+        cache.read_text(str(path))
+
+        rewrite(path, "new", 2_000_000_000)
+        assert cache.read_text(str(path)) == "old"
+
+        clock.now = 6
+        assert cache.read_text(str(path)) == "new"
+
+    def test_revalidate_notifies_watchers(self, tmp_path):
+        """Test that a background revalidation reloads changed files and calls their watchers"""
+        path = tmp_path / "prompt.txt"
+        rewrite(path, "old", 1_000_000_000)
+        cache = AssetCache(revalidate_seconds=5, clock=FakeClock())
+        cache.read_text(str(path))
+        callback = MagicMock()
+        cache.watch(str(path), callback)
+
+        assert cache.revalidate() == []
+        rewrite(path, "new", 2_000_000_000)
+
+        assert cache.revalidate() == [str(path)]
+        callback.assert_called_once_with(str(path))
+        assert cache.read_text(str(path)) == "new"
+
+    def test_watchers_are_weak(self, tmp_path):
+        """Test that watching with a bound method does not keep its object alive"""
+        path = tmp_path / "prompt.txt"
+        rewrite(path, "old", 1_000_000_000)
+        cache = AssetCache(clock=FakeClock())
+        cache.read_text(str(path))
+
+        class Agent:
+            calls = 0
+
+            def on_change(self, changed):
+                Agent.calls += 1
+
+        agent = Agent()
+        cache.watch(str(path), agent.on_change)
+        del agent
+        rewrite(path, "new", 2_000_000_000)
+        cache.revalidate()
+
+        assert Agent.calls == 0
+
+    def test_missing_file_appears(self, tmp_path):
+        """Test that a missing file raises until it is created"""
+        path = tmp_path / "new_scenario.md"
+        clock = FakeClock()
+        cache = AssetCache(revalidate_seconds=5, clock=clock)
+
+        with pytest.raises(FileNotFoundError):
+            cache.read_text(str(path))
+        path.write_text("# New", encoding="utf-8")
+        clock.now = 6
+
+        assert cache.read_text(str(path)) == "# New"
+
+    def test_invalid_json_keeps_previous(self, tmp_path):
+        """Test that a JSON file caught mid-edit keeps serving its last good version"""
+        path = tmp_path / "intro.json"
+        rewrite(path, json.dumps(["Hello!"]), 1_000_000_000)
+        cache = AssetCache(clock=FakeClock())
+        assert cache.read_json(str(path)) == ["Hello!"]
+
+        rewrite(path, "[\"Hel", 2_000_000_000)
+
+        assert cache.revalidate() == []
+        assert cache.read_json(str(path)) == ["Hello!"]
@@ -0,0 +1,29 @@
+"""
+Unit tests for the lazily built Azure OpenAI clients
+"""
+import pytest
+from unittest.mock import MagicMock
+
+import azure_openai
+
+
+class TestLazyClients:
+    """Test that clients are built on first access and cached"""
+
+    def test_built_once_on_first_access(self, monkeypatch):
+        """Test that a client is created on first access and reused afterwards"""
+        factory = MagicMock(return_value=object())
+        monkeypatch.setitem(azure_openai._FACTORIES, "client", factory)
+        monkeypatch.delitem(vars(azure_openai), "client", raising=False)
+
+        first = azure_openai.client
+        second = azure_openai.client
+
+        assert first is second is factory.return_value
+        factory.assert_called_once_with()
+        monkeypatch.delitem(vars(azure_openai), "client")
+
+    def test_unknown_attribute(self):
+        """Test that names without a factory still raise AttributeError"""
+        with pytest.raises(AttributeError):
+            azure_openai.no_such_client
@@ -0,0 +1,61 @@
+"""
+Unit tests for chat_panel module
+"""
+import gradio as gr
+
+from tabs.chat_panel import create_chat_panel, edited_message
+
+
+async def handle_test(user_input, level, request: gr.Request = None):
+    yield user_input
+
+
+def rewind_test(turns, level, request: gr.Request = None):
+    pass
+
+
+class TestChatPanel:
+    """Test that chat turns send only the new message"""
+
+    def _dependencies(self, rewind=None):
+        with gr.Blocks() as demo:
+            chatbot = gr.Chatbot(editable="user")
+            level = gr.Radio(choices=["easy", "hard"])
+            create_chat_panel(handle_test, chatbot, additional_inputs=[level], rewind=rewind)
+        return demo.get_config_file()["dependencies"], chatbot._id, level._id
+
+    def test_handler_gets_message_only(self):
+        """Test that the server-side event gets the message and additional inputs, not the chatbot"""
+        dependencies, chatbot_id, level_id = self._dependencies()
+
+        backend = [d for d in dependencies if d["backend_fn"]]
+        assert len(backend) == 1
+        assert backend[0]["api_name"] == "handle_test"
+        assert chatbot_id not in backend[0]["inputs"] + backend[0]["outputs"]
+        assert backend[0]["inputs"][1:] == [level_id]
+
+    def test_chatbot_updated_in_browser(self):
+        """Test that only browser-side events change the chatbot"""
+        dependencies, chatbot_id, _ = self._dependencies()
+
+        updating = [d for d in dependencies if chatbot_id in d["outputs"]]
+        assert len(updating) == 2
+        assert all(not d["backend_fn"] and d["js"] for d in updating)
+
+    def test_rewind_events(self):
+        """Test that undo, retry and edit rewind the session and never send the chatbot"""
+        dependencies, chatbot_id, level_id = self._dependencies(rewind=rewind_test)
+
+        rewinds = [d for d in dependencies if (d["api_name"] or "").startswith("rewind_test")]
+        assert len(rewinds) == 3
+        assert all(d["inputs"][1:] == [level_id] for d in rewinds)
+        backend = [d for d in dependencies if d["backend_fn"]]
+        assert all(chatbot_id not in d["inputs"] + d["outputs"] for d in backend)
+        triggers = {target[1] for d in dependencies for target in d["targets"] if target[0] == chatbot_id}
+        assert {"undo", "retry", "edit"} <= triggers
+
+    def test_edited_message(self):
+        """Test reading the edited message from the event data"""
+        edit_data = gr.EditData(None, {"index": 3, "value": "I went there", "previous_value": "I go there"})
+
+        assert edited_message(edit_data) == (3, "I went there")
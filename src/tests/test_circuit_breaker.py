@@ -0,0 +1,208 @@
+"""
+Unit tests for the circuit breaker with local fallback
+"""
+import asyncio
+from typing import Any
+
+import httpx
+import openai
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from agents.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreakerChatModel
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def connection_error():
+    return openai.APIConnectionError(request=httpx.Request("POST", "https://fake.test/"))
+
+
+class FakeBackend(BaseChatModel):
+    """Fake model that fails while ``failing`` is set and takes ``latency`` seconds of fake time"""
+    name: str
+    clock: Any = None
+    latency: float = 0.0
+    failing: bool = False
+    error: Any = None
+    calls: int = 0
+    async_delay: float = 0.0
+
+    @property
+    def _llm_type(self):
+        return "fake-backend"
+
+    def _respond(self):
+        self.calls += 1
+        if self.clock is not None:
+            self.clock.now += self.latency
+        if self.failing:
+            raise self.error or connection_error()
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self._respond()
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.name))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.async_delay)
+        self._respond()
+        for word in (self.name, " reply"):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+
+
+def make_breaker(clock, primary, fallback, **kwargs):
+    options = {"min_calls": 4, "failure_rate": 0.5, "open_seconds": 30, "clock": clock, "fallback_name": "ollama"}
+    return CircuitBreakerChatModel(primary=primary, fallback=fallback, **{**options, **kwargs})
+
+
+def ask(model):
+    return model.invoke([HumanMessage(content="hi")])
+
+
+class TestCircuitBreaker:
+    """Test CircuitBreakerChatModel functionality"""
+
+    def test_healthy_primary_serves_calls(self):
+        """Test that the primary serves calls and the reply is tagged with it"""
+        clock = FakeClock()
+        breaker = make_breaker(clock, FakeBackend(name="azure"), FakeBackend(name="local"))
+
+        response = ask(breaker)
+
+        assert response.content == "azure"
+        assert response.response_metadata["backend"] == "azure"
+        assert breaker.state == CLOSED
+
+    def test_failed_call_falls_back(self):
+        """Test that a failed primary call is answered by the fallback"""
+        clock = FakeClock()
+        breaker = make_breaker(clock, FakeBackend(name="azure", failing=True), FakeBackend(name="local"))
+
+        response = ask(breaker)
+
+        assert response.content == "local"
+        assert response.response_metadata["backend"] == "ollama"
+
+    def test_trips_on_error_rate_and_skips_primary(self):
+        """Test that an open circuit stops calling the primary"""
+        clock = FakeClock()
+        primary = FakeBackend(name="azure", failing=True)
+        breaker = make_breaker(clock, primary, FakeBackend(name="local"))
+
+        for _ in range(4):
+            ask(breaker)
+        assert breaker.state == OPEN
+
+        for _ in range(5):
+            ask(breaker)
+        assert primary.calls == 4
+        assert breaker.stats()["trips"] == 1
+
+    def test_trips_on_slow_calls(self):
+        """Test that mostly slow primary calls open the circuit too"""
+        clock = FakeClock()
+        primary = FakeBackend(name="azure", clock=clock, latency=15)
+        breaker = make_breaker(clock, primary, FakeBackend(name="local"), slow_call_seconds=10, window_seconds=600)
+
+        for _ in range(4):
+            assert ask(breaker).content == "azure"
+
+        assert breaker.state == OPEN
+
+    def test_half_open_probe_recovers(self):
+        """Test that a successful probe after the open period closes the circuit"""
+        clock = FakeClock()
+        primary = FakeBackend(name="azure", failing=True)
+        breaker = make_breaker(clock, primary, FakeBackend(name="local"))
+        for _ in range(4):
+            ask(breaker)
+
+        clock.now += 31
+        assert breaker.state == HALF_OPEN
+        primary.failing = False
+
+        assert ask(breaker).content == "azure"
+        assert breaker.state == CLOSED
+
+    def test_half_open_probe_failure_reopens(self):
+        """Test that a failed probe opens the circuit for another period"""
+        clock = FakeClock()
+        primary = FakeBackend(name="azure", failing=True)
+        breaker = make_breaker(clock, primary, FakeBackend(name="local"))
+        for _ in range(4):
+            ask(breaker)
+
+        clock.now += 31
+        assert ask(breaker).content == "local"
+
+        assert breaker.state == OPEN
+        assert breaker.stats()["trips"] == 2
+
+    def test_cancelled_probe_is_released(self):
+        """Test that a cancelled half-open probe lets the next call probe the primary"""
+        clock = FakeClock()
+        primary = FakeBackend(name="azure", failing=True)
+        breaker = make_breaker(clock, primary, FakeBackend(name="local"))
+        for _ in range(4):
+            ask(breaker)
+        clock.now += 31
+        primary.failing = False
+        primary.async_delay = 5
+
+        async def collect():
+            return [chunk async for chunk in breaker.astream([HumanMessage(content="hi")])]
+
+        async def cancel_probe():
+            probe = asyncio.ensure_future(collect())
+            await asyncio.sleep(0.01)
+            probe.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await probe
+
+        asyncio.run(cancel_probe())
+        assert breaker.state == HALF_OPEN
+        primary.async_delay = 0
+
+        assert ask(breaker).content == "azure"
+        assert breaker.state == CLOSED
+
+    def test_request_errors_are_not_failures(self):
+        """Test that a bad request is raised as is and does not count against the primary"""
+        clock = FakeClock()
+        response = httpx.Response(400, request=httpx.Request("POST", "https://fake.test/"))
+        primary = FakeBackend(name="azure", failing=True,
+                              error=openai.BadRequestError("content filter", response=response, body=None))
+        breaker = make_breaker(clock, primary, FakeBackend(name="local"))
+
+        with pytest.raises(openai.BadRequestError):
+            ask(breaker)
+        assert breaker.stats()["window_calls"] == 0
+
+    def test_no_fallback_raises_primary_error(self):
+        """Test that without a fallback the original error surfaces"""
+        breaker = make_breaker(FakeClock(), FakeBackend(name="azure", failing=True), None)
+
+        with pytest.raises(openai.APIConnectionError):
+            ask(breaker)
+
+    def test_async_stream_times_out_to_fallback(self):
+        """Test that a primary stream with no first chunk in time is replaced by the fallback"""
+        clock = FakeClock()
+        breaker = make_breaker(clock, FakeBackend(name="azure", async_delay=5), FakeBackend(name="local"),
+                               call_timeout=0.05)
+
+        async def collect():
+            return [chunk async for chunk in breaker.astream([HumanMessage(content="hi")])]
+
+        chunks = asyncio.run(collect())
+
+        assert [chunk.content for chunk in chunks] == ["local", " reply"]
+        assert chunks[0].response_metadata["backend"] == "ollama"
+        assert breaker.stats()["window_failures"] == 1
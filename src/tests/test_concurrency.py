@@ -0,0 +1,132 @@
+"""
+Unit tests for the model call limiter
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+from utils.concurrency import ModelCallLimiter
+
+
+class TestModelCallLimiter:
+    """Test ModelCallLimiter functionality"""
+
+    def test_sync_acquire_and_release(self):
+        """Test that sync slots are counted and released"""
+        limiter = ModelCallLimiter(2)
+
+        with limiter:
+            assert limiter.stats()["in_flight"] == 1
+
+        assert limiter.stats()["in_flight"] == 0
+
+    def test_try_acquire_never_waits(self):
+        """Test that try_acquire takes a free slot and gives up at the limit"""
+        limiter = ModelCallLimiter(1)
+
+        assert limiter.try_acquire() is True
+        assert limiter.try_acquire() is False
+        limiter.release()
+        assert limiter.stats()["in_flight"] == 0
+
+    def test_unlimited_when_zero(self):
+        """Test that a non-positive limit never blocks"""
+        limiter = ModelCallLimiter(0)
+
+        for _ in range(10):
+            limiter.acquire()
+
+        assert limiter.stats()["in_flight"] == 10
+
+    def test_sync_blocks_at_limit(self):
+        """Test that a thread waits until a slot is released"""
+        limiter = ModelCallLimiter(1)
+        limiter.acquire()
+        acquired = threading.Event()
+
+        def worker():
+            with limiter:
+                acquired.set()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        time.sleep(0.05)
+        assert not acquired.is_set()
+
+        limiter.release()
+        thread.join(timeout=1)
+        assert acquired.is_set()
+        assert limiter.stats()["in_flight"] == 0
+
+    def test_async_tasks_respect_limit(self):
+        """Test that concurrent tasks never exceed the limit"""
+        limiter = ModelCallLimiter(3)
+        peak = 0
+
+        async def call():
+            nonlocal peak
+            async with limiter:
+                peak = max(peak, limiter.stats()["in_flight"])
+                await asyncio.sleep(0.01)
+
+        async def main():
+            await asyncio.gather(*(call() for _ in range(20)))
+
+        asyncio.run(main())
+
+        assert peak == 3
+        assert limiter.stats()["in_flight"] == 0
+
+    def test_async_cancelled_waiter_does_not_leak_slot(self):
+        """Test that cancelling a waiting task keeps the slot count consistent"""
+        limiter = ModelCallLimiter(1)
+
+        async def main():
+            await limiter.aacquire()
+            waiter = asyncio.create_task(limiter.aacquire())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+            limiter.release()
+            await asyncio.sleep(0)
+
+        asyncio.run(main())
+
+        assert limiter.stats()["in_flight"] == 0
+        assert limiter.stats()["waiting_async"] == 0
+
+    def test_waiters_are_served_in_arrival_order(self):
+        """Test that a waiting thread is not starved by tasks queued after it"""
+        limiter = ModelCallLimiter(1)
+        order = []
+
+        async def main():
+            await limiter.aacquire()
+
+            def worker():
+                with limiter:
+                    order.append("thread")
+
+            thread = threading.Thread(target=worker)
+            thread.start()
+            while limiter.stats()["waiting_sync"] == 0:
+                await asyncio.sleep(0.001)
+
+            async def task():
+                async with limiter:
+                    order.append("task")
+
+            waiter = asyncio.create_task(task())
+            await asyncio.sleep(0)
+            assert limiter.try_acquire() is False
+
+            limiter.release()
+            await asyncio.to_thread(thread.join, 1)
+            await waiter
+
+        asyncio.run(main())
+
+        assert order == ["thread", "task"]
+        assert limiter.stats()["in_flight"] == 0
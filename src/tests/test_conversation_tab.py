@@ -21,9 +21,9 @@ class TestConversationTab:
             import importlib
             conversation_tab = importlib.import_module('tabs.conversation_tab')
             conversation_tab.conversation_agent = mock_agent
-            conversation_tab.handle_conversation = lambda user_input, chat_history: mock_agent.chat_with_history(user_input)
+            conversation_tab.handle_conversation = lambda user_input: mock_agent.chat_with_history(user_input)
 
-            result = conversation_tab.handle_conversation("I like reading books", [])
+            result = conversation_tab.handle_conversation("I like reading books")
 
             assert result == "That's interesting! Tell me more."
             mock_agent.chat_with_history.assert_called_once_with("I like reading books")
@@ -38,14 +38,10 @@ class TestConversationTab:
             import importlib
             conversation_tab = importlib.import_module('tabs.conversation_tab')
             conversation_tab.conversation_agent = mock_agent
-            conversation_tab.handle_conversation = lambda user_input, chat_history: mock_agent.chat_with_history(user_input)
+            conversation_tab.handle_conversation = lambda user_input: mock_agent.chat_with_history(user_input)
 
-            chat_history = [
-                {"role": "user", "content": "Hello"},
-                {"role": "assistant", "content": "Hi there!"}
-            ]
-
-            result = conversation_tab.handle_conversation("How are you?", chat_history)
+            # The history is in the session store, the tab only passes the new message
+            result = conversation_tab.handle_conversation("How are you?")
 
             assert result == "I see what you mean."
             mock_agent.chat_with_history.assert_called_once_with("How are you?")
@@ -0,0 +1,197 @@
+"""
+Unit tests for hedged model calls
+"""
+import asyncio
+from typing import Any
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from agents.hedging import HedgedChatModel, hedged_model_from_env
+from utils.admission import AdmissionController
+from utils.concurrency import ModelCallLimiter
+
+
+class SlowModel(BaseChatModel):
+    """Fake model answering with its name after ``delays[i]`` seconds on its i-th call"""
+    name: str
+    delays: Any
+    calls: int = 0
+    cancelled: int = 0
+    error: Any = None
+
+    @property
+    def _llm_type(self):
+        return "slow-fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.name))])
+
+    async def _wait(self):
+        delay = self.delays[min(self.calls, len(self.delays) - 1)]
+        self.calls += 1
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await self._wait()
+        return self._generate(messages)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await self._wait()
+        for word in (self.name, " done"):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+
+
+def hedged(primary, alternate=None, **kwargs):
+    options = {
+        "initial_delay": 0.05, "budget_ratio": 1.0,
+        "call_limiter": ModelCallLimiter(0), "admission": AdmissionController(), **kwargs,
+    }
+    return HedgedChatModel(model=primary, alternate=alternate, name="test", **options)
+
+
+class TestHedgedChatModel:
+    """Test HedgedChatModel functionality"""
+
+    def test_fast_call_is_not_hedged(self):
+        """Test that a call answering before the delay runs alone"""
+        primary, alternate = SlowModel(name="primary", delays=[0.0]), SlowModel(name="alternate", delays=[0.0])
+        model = hedged(primary, alternate)
+
+        response = asyncio.run(model.ainvoke([HumanMessage(content="hi")]))
+
+        assert response.content == "primary"
+        assert alternate.calls == 0
+        assert model.stats()["hedges"] == 0
+
+    def test_slow_call_is_hedged_and_cancelled(self):
+        """Test that the hedge wins over a slow first call, which is then cancelled"""
+        primary, alternate = SlowModel(name="primary", delays=[2.0]), SlowModel(name="alternate", delays=[0.0])
+        model = hedged(primary, alternate)
+
+        response = asyncio.run(model.ainvoke([HumanMessage(content="hi")]))
+
+        assert response.content == "alternate"
+        assert primary.cancelled == 1
+        assert model.stats()["hedge_wins"] == 1
+
+    def test_first_call_can_still_win(self):
+        """Test that the first call is kept when it answers before the hedge"""
+        primary, alternate = SlowModel(name="primary", delays=[0.1]), SlowModel(name="alternate", delays=[1.0])
+        model = hedged(primary, alternate)
+
+        response = asyncio.run(model.ainvoke([HumanMessage(content="hi")]))
+
+        assert response.content == "primary"
+        assert alternate.cancelled == 1
+        assert model.stats()["hedges"] == 1
+        assert model.stats()["hedge_wins"] == 0
+
+    def test_stream_hedges_on_first_chunk(self):
+        """Test that only the winning stream's chunks reach the caller"""
+        primary, alternate = SlowModel(name="primary", delays=[2.0]), SlowModel(name="alternate", delays=[0.0])
+        model = hedged(primary, alternate)
+
+        async def collect():
+            return [chunk.content async for chunk in model.astream([HumanMessage(content="hi")])]
+
+        assert asyncio.run(collect()) == ["alternate", " done"]
+        assert primary.cancelled == 1
+
+    def test_budget_limits_hedges(self):
+        """Test that hedges never exceed the budget share of calls"""
+        primary = SlowModel(name="primary", delays=[0.1])
+        model = hedged(primary, SlowModel(name="alternate", delays=[0.0]), budget_ratio=0.25)
+
+        async def run():
+            for _ in range(8):
+                await model.ainvoke([HumanMessage(content="hi")])
+
+        asyncio.run(run())
+
+        assert model.stats()["hedges"] == 2
+
+    def test_hedge_needs_a_free_call_slot(self):
+        """Test that no hedge is sent while the concurrency limit is reached, and its slot is given back"""
+        limiter = ModelCallLimiter(2)
+        limiter.acquire()
+        primary = SlowModel(name="primary", delays=[0.1])
+        model = hedged(primary, SlowModel(name="alternate", delays=[0.0]), call_limiter=limiter)
+
+        async def run():
+            await model.ainvoke([HumanMessage(content="hi")])
+            limiter.acquire()
+            await model.ainvoke([HumanMessage(content="hi")])
+
+        asyncio.run(run())
+
+        assert model.stats()["hedges"] == 1
+        assert limiter.in_flight == 2
+
+    def test_hedge_needs_token_quota(self):
+        """Test that a hedge is only sent when the TPM quota has room for it right away"""
+        admission = AdmissionController(tpm=1000, clock=lambda: 0.0)
+        admission.admit(900)
+        model = hedged(SlowModel(name="primary", delays=[0.1]), SlowModel(name="alternate", delays=[0.0]),
+                       admission=admission, expected_completion_tokens=300)
+
+        response = asyncio.run(model.ainvoke([HumanMessage(content="hi")]))
+
+        assert response.content == "primary"
+        assert model.stats()["hedges"] == 0
+
+    def test_losing_stream_is_cancelled_right_away(self):
+        """Test that a first stream beaten by its hedge is cancelled and its slot given back at once"""
+        primary = SlowModel(name="primary", delays=[5.0])
+        limiter = ModelCallLimiter(0)
+        model = hedged(primary, SlowModel(name="alternate", delays=[0.0]), call_limiter=limiter)
+
+        async def run():
+            return [chunk.content async for chunk in model.astream([HumanMessage(content="hi")])]
+
+        assert asyncio.run(run()) == ["alternate", " done"]
+        assert primary.cancelled == 1
+        assert limiter.in_flight == 0
+        # Lower bound of the first call's latency: the time until the hedge answered
+        assert list(model._first_chunk_latencies) == [pytest.approx(0.05, abs=0.05)]
+
+    def test_error_without_hedge_is_raised(self):
+        """Test that a failing call is surfaced when there is nothing to fall back to"""
+        primary = SlowModel(name="primary", delays=[0.0], error=RuntimeError("boom"))
+        model = hedged(primary, budget_ratio=0.0)
+
+        with pytest.raises(RuntimeError):
+            asyncio.run(model.ainvoke([HumanMessage(content="hi")]))
+
+    def test_delay_follows_latency_percentile(self):
+        """Test that the hedge delay is the configured percentile of recent latencies"""
+        model = hedged(SlowModel(name="primary", delays=[0.0]), percentile=0.9, min_delay=0.01, min_samples=10)
+        samples = [i / 100 for i in range(1, 101)]
+
+        assert model.hedge_delay(samples[:5]) == model.initial_delay
+        assert model.hedge_delay(samples) == pytest.approx(0.9, abs=0.011)
+
+    def test_sync_calls_pass_through(self):
+        """Test that sync calls go straight to the wrapped model"""
+        model = hedged(SlowModel(name="primary", delays=[5.0]))
+
+        assert model.invoke([HumanMessage(content="hi")]).content == "primary"
+        assert model.stats()["requests"] == 0
+
+    def test_disabled_by_default(self, monkeypatch):
+        """Test that the agent model is only wrapped when MODEL_HEDGING is on"""
+        base = SlowModel(name="primary", delays=[0.0])
+        monkeypatch.delenv("MODEL_HEDGING", raising=False)
+        assert hedged_model_from_env("conversation", base) is base
+
+        monkeypatch.setenv("MODEL_HEDGING", "true")
+        monkeypatch.setenv("MODEL_HEDGE_BUDGET_PERCENT_CONVERSATION", "5")
+        wrapped = hedged_model_from_env("conversation", base)
+        assert wrapped.budget_ratio == pytest.approx(0.05)
@@ -0,0 +1,133 @@
+"""
+Unit tests for token-budgeted history windowing
+"""
+import pytest
+from langchain_core.messages import HumanMessage, AIMessage
+from agents.history_window import HistoryWindow, estimate_tokens, estimate_message_tokens
+
+
+def make_turns(count, words=50):
+    messages = []
+    for i in range(count):
+        messages.append(HumanMessage(content=f"question {i} " + "word " * words))
+        messages.append(AIMessage(content=f"answer {i} " + "word " * words))
+    return messages
+
+
+class TestEstimateTokens:
+    """Test the local token estimator"""
+
+    def test_ascii_text(self):
+        """Test roughly four characters per token for English"""
+        assert estimate_tokens("a" * 400) == 100
+
+    def test_cjk_text(self):
+        """Test one token per CJK character"""
+        assert estimate_tokens("你好世界") == 4
+
+    def test_empty(self):
+        """Test empty text costs nothing"""
+        assert estimate_tokens("") == 0
+
+
+class TestHistoryWindow:
+    """Test HistoryWindow functionality"""
+
+    def test_no_trim_within_budget(self):
+        """Test that short histories pass through untouched"""
+        window = HistoryWindow(budget=10000)
+        messages = make_turns(2) + [HumanMessage(content="new")]
+
+        kept, dropped = window.trim(messages, "s1")
+
+        assert kept == messages
+        assert dropped == 0
+
+    def test_zero_budget_disables_trimming(self):
+        """Test that a budget of 0 keeps everything"""
+        window = HistoryWindow(budget=0)
+        messages = make_turns(50) + [HumanMessage(content="new")]
+
+        kept, dropped = window.trim(messages, "s1")
+
+        assert kept == messages
+
+    def test_trims_oldest_turns_to_fit(self):
+        """Test that the oldest turns are dropped and the result fits the budget"""
+        window = HistoryWindow(budget=600, fixed_tokens=100)
+        messages = make_turns(10) + [HumanMessage(content="latest")]
+
+        kept, dropped = window.trim(messages, "s1")
+
+        assert kept[-1].content == "latest"
+        assert isinstance(kept[0], HumanMessage)
+        assert dropped > 0
+        assert window.fixed_tokens + sum(estimate_message_tokens(m) for m in kept) <= 600
+        assert kept == messages[len(messages) - len(kept):]
+
+    def test_keeps_scenario_opening_message(self):
+        """Test that a leading AI opening line is always kept"""
+        window = HistoryWindow(budget=400)
+        opening = AIMessage(content="Welcome to the interview!")
+        messages = [opening] + make_turns(10) + [HumanMessage(content="latest")]
+
+        kept, dropped = window.trim(messages, "s1")
+
+        assert kept[0] is opening
+        assert isinstance(kept[1], HumanMessage)
+        assert kept[-1].content == "latest"
+        assert dropped > 0
+
+    def test_budget_smaller_than_input_keeps_latest_message(self):
+        """Test that the new input is always sent even if it alone exceeds the budget"""
+        window = HistoryWindow(budget=10)
+        messages = make_turns(3) + [HumanMessage(content="latest")]
+
+        kept, dropped = window.trim(messages, "s1")
+
+        assert kept == [messages[-1]]
+
+    def test_counts_are_cached_per_session(self, monkeypatch):
+        """Test that only newly appended messages are estimated on later turns"""
+        import agents.history_window as history_window
+
+        calls = []
+        original = history_window.estimate_message_tokens
+        monkeypatch.setattr(history_window, "estimate_message_tokens", lambda m: calls.append(m) or original(m))
+
+        window = HistoryWindow(budget=100000)
+        history = make_turns(20)
+        window.trim(history + [HumanMessage(content="turn 21")], "s1")
+        calls.clear()
+
+        history += [HumanMessage(content="turn 21"), AIMessage(content="reply 21")]
+        window.trim(history + [HumanMessage(content="turn 22")], "s1")
+
+        assert len(calls) == 3
+
+    def test_cache_resets_when_history_is_cleared(self):
+        """Test that a cleared or rewound history is recounted from scratch"""
+        window = HistoryWindow(budget=100000)
+        window.trim(make_turns(5) + [HumanMessage(content="a")], "s1")
+
+        fresh = [HumanMessage(content="b"), AIMessage(content="c"), HumanMessage(content="d")]
+
+        assert window.count(fresh, "s1") == sum(estimate_message_tokens(m) for m in fresh)
+
+    def test_cache_resets_when_cleared_history_reuses_ids(self, monkeypatch):
+        """Test that a cleared session is recounted even when its new messages get the freed ids"""
+        import agents.history_window
+        from langchain_core.chat_history import InMemoryChatMessageHistory
+
+        # CPython usually hands the freed first message's id to the next one; make it certain
+        monkeypatch.setattr(agents.history_window, "id", lambda obj: 0, raising=False)
+        window = HistoryWindow(budget=100000)
+        history = InMemoryChatMessageHistory()
+        history.add_messages([HumanMessage(content="short"), AIMessage(content="short")])
+        window.count(history.messages + [HumanMessage(content="x")], "s1")
+
+        history.clear()
+        history.add_messages([HumanMessage(content="a much longer question " * 20), AIMessage(content="reply")])
+        messages = history.messages + [HumanMessage(content="x")]
+
+        assert window.count(messages, "s1") == sum(estimate_message_tokens(m) for m in messages)
@@ -0,0 +1,108 @@
+"""
+Unit tests for the pooled HTTP clients and connection warm-up
+"""
+import asyncio
+
+import httpx
+from utils.http_pool import ConnectionWarmer, PooledHttpClients
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_clients(handler, clock=None):
+    return PooledHttpClients(
+        transport=httpx.MockTransport(handler),
+        async_transport=httpx.MockTransport(handler),
+        clock=clock or FakeClock(),
+    )
+
+
+class TestPooledHttpClients:
+    """Test PooledHttpClients functionality"""
+
+    def test_tracks_requests(self):
+        """Test that requests through either client are counted and timestamped"""
+        clock = FakeClock()
+        clients = make_clients(lambda request: httpx.Response(200), clock)
+
+        clock.now = 5
+        clients.client.get("https://example.test/")
+        clock.now = 7
+        asyncio.run(clients.async_client.get("https://example.test/"))
+
+        stats = clients.stats()
+        assert stats["requests"] == 1
+        assert stats["async_requests"] == 1
+        assert clients.last_request_at == 5
+        assert clients.last_async_request_at == 7
+
+    def test_pool_settings(self):
+        """Test that limits and timeouts are applied"""
+        clients = PooledHttpClients(max_connections=10, max_keepalive_connections=4, keepalive_expiry=30,
+                                    connect_timeout=2, read_timeout=20)
+
+        assert clients.limits.max_keepalive_connections == 4
+        assert clients.timeout.connect == 2
+        assert clients.timeout.read == 20
+        assert clients.stats()["utilization"] == 0.0
+
+    def test_http2_without_h2_falls_back(self, monkeypatch):
+        """Test that HTTP/2 is disabled when the h2 package is missing"""
+        monkeypatch.setattr("utils.http_pool.importlib.util.find_spec", lambda name: None)
+
+        clients = PooledHttpClients(http2=True)
+
+        assert clients.http2 is False
+
+
+class TestConnectionWarmer:
+    """Test ConnectionWarmer functionality"""
+
+    def test_warm_sends_concurrent_requests(self):
+        """Test that warming sends one authenticated request per connection"""
+        seen = []
+
+        def handler(request):
+            seen.append(request.headers["api-key"])
+            return httpx.Response(200, json={"data": []})
+
+        warmer = ConnectionWarmer(make_clients(handler), "https://example.test/openai/models",
+                                  headers={"api-key": "secret"}, connections=3)
+        warmer.warm()
+
+        assert seen == ["secret"] * 3
+        assert warmer.stats()["warmups"] == 1
+
+    def test_warm_failures_are_counted(self):
+        """Test that an unreachable endpoint never raises from the warmer"""
+        def handler(request):
+            raise httpx.ConnectError("down")
+
+        warmer = ConnectionWarmer(make_clients(handler), "https://example.test/", connections=2)
+        warmer.warm()
+        asyncio.run(warmer.awarm())
+
+        assert warmer.failures == 4
+        stats = warmer.stats()
+        assert (stats["sync_warmups"], stats["sync_failures"]) == (1, 2)
+        assert (stats["async_warmups"], stats["async_failures"]) == (1, 2)
+
+    def test_tick_only_warms_idle_pool(self):
+        """Test that a recently used pool is not warmed again"""
+        clock = FakeClock()
+        clients = make_clients(lambda request: httpx.Response(200), clock)
+        warmer = ConnectionWarmer(clients, "https://example.test/", interval=30, connections=1)
+
+        clock.now = 10
+        assert warmer.tick() is False
+
+        clock.now = 31
+        assert warmer.tick() is True
+        assert warmer.tick() is False
+        assert asyncio.run(warmer.atick()) is True
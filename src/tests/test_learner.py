@@ -0,0 +1,57 @@
+"""
+Unit tests for the learner cookie
+"""
+from unittest.mock import MagicMock
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.responses import HTMLResponse, JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from utils.learner import LEARNER_COOKIE, LearnerCookieMiddleware, learner_id
+
+LEARNER = "0123456789abcdef0123456789abcdef"
+
+
+def make_client():
+    app = Starlette(
+        routes=[
+            Route("/", lambda request: HTMLResponse("<html></html>")),
+            Route("/config", lambda request: JSONResponse({})),
+        ],
+        middleware=[Middleware(LearnerCookieMiddleware)],
+    )
+    return TestClient(app)
+
+
+class TestLearner:
+    """Test the learner id cookie and its fallback"""
+
+    def test_learner_id_from_cookie(self):
+        """Test that the cookie identifies the learner across page loads"""
+        request = MagicMock(cookies={LEARNER_COOKIE: LEARNER}, session_hash="page")
+
+        assert learner_id(request) == LEARNER
+
+    def test_learner_id_falls_back_to_session_hash(self):
+        """Test that a missing or malformed cookie falls back to the page's session hash"""
+        assert learner_id(MagicMock(cookies={}, session_hash="page")) == "page"
+        assert learner_id(MagicMock(cookies={LEARNER_COOKIE: "x:y"}, session_hash="page")) == "page"
+        assert learner_id(None) is None
+
+    def test_cookie_set_on_page_only(self):
+        """Test that the page response sets the cookie and other responses do not"""
+        client = make_client()
+
+        assert LEARNER_COOKIE not in client.get("/config").cookies
+        cookie = client.get("/").cookies.get(LEARNER_COOKIE)
+
+        assert cookie and len(cookie) == 32
+
+    def test_existing_cookie_kept(self):
+        """Test that a browser with a cookie keeps it"""
+        client = make_client()
+        client.cookies.set(LEARNER_COOKIE, LEARNER)
+
+        assert "set-cookie" not in client.get("/").headers
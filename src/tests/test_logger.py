@@ -46,3 +46,83 @@ class TestLogger:
         except Exception as e:
             pytest.fail(f"Logger error failed: {e}")
 
+
+
+class TestResponsePreview:
+    """Test sampling and truncation of logged responses"""
+
+    def test_not_sampled(self):
+        """Test that nothing is logged with a zero sample rate"""
+        from utils.logger import response_preview
+
+        assert response_preview("Hello there", sample_rate=0) is None
+
+    def test_truncated(self):
+        """Test that long responses are cut to max_chars"""
+        from utils.logger import response_preview
+
+        preview = response_preview("x" * 500, sample_rate=1, max_chars=20)
+
+        assert preview == "x" * 20 + "... (500 chars)"
+
+    def test_sampled_share(self):
+        """Test that about sample_rate of responses are kept"""
+        from utils.logger import response_preview
+
+        kept = sum(response_preview("Hello", sample_rate=0.25) is not None for _ in range(4000))
+
+        assert 800 < kept < 1200
+
+
+class TestStructuredLogging:
+    """Test JSON records"""
+
+    def test_json_record_has_bound_fields(self):
+        """Test that fields bound to a record end up in its JSON line"""
+        import json
+        from utils.logger import json_format
+
+        lines = []
+        sink = LOG.add(lines.append, format=json_format, level="INFO")
+        try:
+            LOG.bind(turn_id="abc123", latency_ms=812.5).info("[ChatBot][conversation] turn done")
+        finally:
+            LOG.remove(sink)
+
+        record = json.loads(lines[0])
+        assert record["message"] == "[ChatBot][conversation] turn done"
+        assert record["level"] == "INFO"
+        assert record["turn_id"] == "abc123"
+        assert record["latency_ms"] == 812.5
+
+
+class TestBackgroundWriter:
+    """Test sinks written from a background thread"""
+
+    def test_writes_in_order(self):
+        """Test that queued lines are written in order once drained"""
+        import io
+        from utils.logger import BackgroundWriter
+
+        stream = io.StringIO()
+        writer = BackgroundWriter(stream)
+        for index in range(100):
+            writer.write(f"line {index}\n")
+
+        assert writer.drain(timeout=5)
+        assert stream.getvalue().splitlines() == [f"line {index}" for index in range(100)]
+        writer.close()
+
+    def test_rotating_file(self, tmp_path):
+        """Test that the log file is rotated at max_bytes, keeping the given number of backups"""
+        from utils.logger import RotatingFile
+
+        path = str(tmp_path / "app.log")
+        log = RotatingFile(path, max_bytes=100, backups=2)
+        for index in range(40):
+            log.write(f"line {index:02d}\n")
+        log.close()
+
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["app.log", "app.log.1", "app.log.2"]
+        assert all((tmp_path / name).stat().st_size <= 100 for name in ("app.log", "app.log.1", "app.log.2"))
+        assert (tmp_path / "app.log").read_text().splitlines()[-1] == "line 39"
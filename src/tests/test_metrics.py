@@ -0,0 +1,105 @@
+"""
+Unit tests for the Prometheus metrics
+"""
+import asyncio
+
+import pytest
+from unittest.mock import MagicMock
+
+from utils.metrics import AdmissionCollector, HttpPoolCollector, SessionStoreCollector, registry, start_turn
+
+
+def sample(name, **labels):
+    return registry.get_sample_value(name, labels) or 0.0
+
+
+class TestTurn:
+    """Test per-turn measurements"""
+
+    def test_finished_turn(self):
+        """Test that a turn records latency, outcome and tokens for its agent"""
+        before = sample("language_mentor_turn_latency_seconds_count", agent="metrics_a")
+
+        turn = start_turn("metrics_a")
+        with turn.model_call():
+            turn.first_token()
+            turn.first_token()
+        turn.finish("ok", prompt_tokens=120, completion_tokens=30)
+
+        assert sample("language_mentor_turn_latency_seconds_count", agent="metrics_a") == before + 1
+        assert sample("language_mentor_time_to_first_token_seconds_count", agent="metrics_a") == 1
+        assert sample("language_mentor_model_latency_seconds_count", agent="metrics_a") == 1
+        assert sample("language_mentor_turns_total", agent="metrics_a", outcome="ok") == 1
+        assert sample("language_mentor_prompt_tokens_total", agent="metrics_a") == 120
+        assert sample("language_mentor_completion_tokens_total", agent="metrics_a") == 30
+
+    def test_in_flight_and_errors(self):
+        """Test that calls count in flight while running and failures by error type"""
+        turn = start_turn("metrics_b")
+
+        with pytest.raises(TimeoutError):
+            with turn.model_call():
+                assert sample("language_mentor_model_calls_in_flight", agent="metrics_b") == 1
+                raise TimeoutError()
+
+        assert sample("language_mentor_model_calls_in_flight", agent="metrics_b") == 0
+        assert sample("language_mentor_model_errors_total", agent="metrics_b", error="TimeoutError") == 1
+        assert sample("language_mentor_turns_total", agent="metrics_b", outcome="error") == 1
+
+    def test_async_model_call(self):
+        """Test the async form of model_call"""
+        turn = start_turn("metrics_c")
+
+        async def run():
+            async with turn.amodel_call():
+                return sample("language_mentor_model_calls_in_flight", agent="metrics_c")
+
+        assert asyncio.run(run()) == 1
+        assert sample("language_mentor_model_calls_in_flight", agent="metrics_c") == 0
+
+
+class TestCollectors:
+    """Test gauges read at scrape time"""
+
+    def test_session_store_collector(self):
+        """Test store size gauges and active sessions grouped by agent"""
+        store = MagicMock()
+        store.stats.return_value = {"sessions": 3, "messages": 12, "bytes": 2048, "evictions": 0}
+        store.session_ids.return_value = ["conversation:abc", "hotel_checkin:abc", "hotel_checkin:def"]
+
+        metrics = {metric.name: metric for metric in SessionStoreCollector(store).collect()}
+
+        assert metrics["language_mentor_session_store_messages"].samples[0].value == 12
+        active = {s.labels["agent"]: s.value for s in metrics["language_mentor_active_sessions"].samples}
+        assert active == {"conversation": 1, "hotel_checkin": 2}
+
+    def test_admission_collector(self):
+        """Test the admission queue depth gauge and admission counters"""
+        admission = MagicMock()
+        admission.stats.return_value = {"queue_depth": 4, "admitted": 10, "rejected": 2, "queued": 3}
+
+        metrics = {metric.name: metric for metric in AdmissionCollector(admission).collect()}
+
+        assert metrics["language_mentor_admission_queue_depth"].samples[0].value == 4
+        assert metrics["language_mentor_admission_admitted"].samples[0].value == 10
+        assert metrics["language_mentor_admission_rejected"].samples[0].value == 2
+        assert metrics["language_mentor_admission_queued"].samples[0].value == 3
+
+    def test_http_pool_collector(self):
+        """Test pool gauges and warm-up counters per pool"""
+        warmer = MagicMock()
+        warmer.stats.return_value = {
+            "sync_connections": 3, "sync_idle": 2, "sync_utilization": 0.01, "sync_warmups": 5, "sync_failures": 1,
+            "async_connections": 4, "async_idle": 0, "async_utilization": 0.04, "async_warmups": 2, "async_failures": 0,
+        }
+
+        metrics = {metric.name: metric for metric in HttpPoolCollector(warmer).collect()}
+
+        def by_pool(name):
+            return {s.labels["pool"]: s.value for s in metrics[name].samples if not s.name.endswith("_created")}
+
+        assert by_pool("language_mentor_http_pool_connections") == {"sync": 3, "async": 4}
+        assert by_pool("language_mentor_http_pool_idle_connections") == {"sync": 2, "async": 0}
+        assert by_pool("language_mentor_http_pool_utilization") == {"sync": 0.01, "async": 0.04}
+        assert by_pool("language_mentor_http_pool_warmups") == {"sync": 5, "async": 2}
+        assert by_pool("language_mentor_http_pool_warmup_failures") == {"sync": 1, "async": 0}
@@ -0,0 +1,216 @@
+"""
+Unit tests for the latency-aware model router, against local fake endpoints
+"""
+import asyncio
+import random
+from typing import Any, List
+
+import httpx
+import openai
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from agents.model_router import Deployment, ModelRouter, retry_after_seconds
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    async def asleep(self, seconds):
+        self.sleep(seconds)
+
+
+def rate_limit_error(retry_after=None):
+    headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+    response = httpx.Response(429, headers=headers, request=httpx.Request("POST", "https://fake.test/"))
+    return openai.RateLimitError("Too Many Requests", response=response, body=None)
+
+
+class FakeEndpoint(BaseChatModel):
+    """Fake deployment: answers with its name after ``latency`` seconds of fake time"""
+    name: str
+    latency: float
+    clock: Any
+    errors: List[Any] = []
+    calls: int = 0
+
+    @property
+    def _llm_type(self):
+        return "fake-endpoint"
+
+    def _respond(self):
+        self.calls += 1
+        self.clock.now += self.latency
+        if self.errors:
+            raise self.errors.pop(0)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self._respond()
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.name))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self._respond()
+        for word in (self.name, " done"):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+
+
+def make_router(clock, *endpoints, **kwargs):
+    deployments = [
+        Deployment(endpoint.name, endpoint, weight=weight, tpm=tpm) for endpoint, weight, tpm in endpoints
+    ]
+    return ModelRouter(
+        deployments=deployments, clock=clock, sleep=clock.sleep, asleep=clock.asleep, rng=random.Random(7), **kwargs
+    )
+
+
+def fake(clock, name, latency, errors=None):
+    return FakeEndpoint(name=name, latency=latency, clock=clock, errors=errors or [])
+
+
+class TestRetryAfter:
+    """Test Retry-After parsing"""
+
+    def test_headers(self):
+        """Test seconds and milliseconds headers, and their absence"""
+        assert retry_after_seconds(rate_limit_error(7)) == 7.0
+        assert retry_after_seconds(rate_limit_error()) is None
+
+        response = httpx.Response(429, headers={"retry-after-ms": "250"}, request=httpx.Request("POST", "https://x/"))
+        assert retry_after_seconds(openai.RateLimitError("", response=response, body=None)) == 0.25
+
+
+class TestModelRouter:
+    """Test ModelRouter routing, shedding and failover"""
+
+    def test_spreads_load_across_equal_endpoints(self):
+        """Test that equally fast endpoints share the traffic"""
+        clock = FakeClock()
+        a, b = fake(clock, "a", 0.5), fake(clock, "b", 0.5)
+        router = make_router(clock, (a, 1, 0), (b, 1, 0))
+
+        for _ in range(200):
+            router.invoke([HumanMessage(content="hello")])
+
+        assert 60 <= a.calls <= 140
+        assert a.calls + b.calls == 200
+
+    def test_weights_bias_traffic(self):
+        """Test that a heavier deployment gets proportionally more calls"""
+        clock = FakeClock()
+        a, b = fake(clock, "a", 0.5), fake(clock, "b", 0.5)
+        router = make_router(clock, (a, 3, 0), (b, 1, 0))
+
+        for _ in range(200):
+            router.invoke([HumanMessage(content="hello")])
+
+        assert a.calls > 2 * b.calls
+
+    def test_sheds_away_from_slow_endpoint(self):
+        """Test that a slow endpoint gets a small share once its latency is observed"""
+        clock = FakeClock()
+        fast, slow = fake(clock, "fast", 0.2), fake(clock, "slow", 3.0)
+        router = make_router(clock, (fast, 1, 0), (slow, 1, 0))
+
+        for _ in range(200):
+            router.invoke([HumanMessage(content="hello")])
+
+        assert slow.calls < 0.15 * 200
+        assert router.stats()["slow"]["ewma_latency_ms"] > router.stats()["fast"]["ewma_latency_ms"]
+
+    def test_rate_limited_endpoint_fails_over_and_cools_down(self):
+        """Test that a 429 moves the call elsewhere and the endpoint rests for Retry-After"""
+        clock = FakeClock()
+        a = fake(clock, "a", 0.1, errors=[rate_limit_error(retry_after=20)])
+        b = fake(clock, "b", 0.1)
+        router = make_router(clock, (a, 1000, 0), (b, 1, 0))
+
+        assert router.invoke([HumanMessage(content="hello")]).content == "b"
+        for _ in range(10):
+            router.invoke([HumanMessage(content="hello")])
+
+        assert a.calls == 1
+        assert router.stats()["a"]["rate_limited"] == 1
+
+        clock.now += 25
+        router.invoke([HumanMessage(content="hello")])
+        assert a.calls == 2
+
+    def test_waits_when_every_endpoint_is_rate_limited(self):
+        """Test that the router sleeps for the shortest Retry-After, with jitter on top"""
+        clock = FakeClock()
+        a = fake(clock, "a", 0.1, errors=[rate_limit_error(retry_after=2)])
+        router = make_router(clock, (a, 1, 0))
+
+        assert router.invoke([HumanMessage(content="hello")]).content == "a"
+        assert len(clock.sleeps) == 1
+        assert 1.9 <= clock.sleeps[0] <= 2.5
+
+    def test_gives_up_after_max_wait(self):
+        """Test that a Retry-After past the wait limit raises the rate limit error"""
+        clock = FakeClock()
+        a = fake(clock, "a", 0.1, errors=[rate_limit_error(retry_after=120)])
+        router = make_router(clock, (a, 1, 0), max_wait=30)
+
+        with pytest.raises(openai.RateLimitError):
+            router.invoke([HumanMessage(content="hello")])
+
+    def test_non_retryable_errors_are_raised(self):
+        """Test that errors other than throttling and outages are not retried"""
+        clock = FakeClock()
+        a = fake(clock, "a", 0.1, errors=[ValueError("bad request")])
+        b = fake(clock, "b", 0.1)
+        router = make_router(clock, (a, 1000, 0), (b, 1, 0))
+
+        with pytest.raises(ValueError):
+            router.invoke([HumanMessage(content="hello")])
+        assert b.calls == 0
+
+    def test_tpm_quota_moves_traffic(self):
+        """Test that a deployment whose TPM quota is used up is skipped"""
+        clock = FakeClock()
+        small, large = fake(clock, "small", 0.1), fake(clock, "large", 0.1)
+        router = make_router(clock, (small, 1000, 50), (large, 1, 0))
+        prompt = [HumanMessage(content="x" * 120)]
+
+        router.invoke(prompt)
+        for _ in range(5):
+            router.invoke(prompt)
+
+        assert small.calls == 1
+        assert router.stats()["small"]["tpm_used"] > 0
+
+    def test_stream_fails_over_before_first_chunk(self):
+        """Test that a stream moves to another deployment when it fails before any output"""
+        clock = FakeClock()
+        a = fake(clock, "a", 0.1, errors=[rate_limit_error(retry_after=5)])
+        b = fake(clock, "b", 0.1)
+        router = make_router(clock, (a, 1000, 0), (b, 1, 0))
+
+        chunks = [chunk.content for chunk in router.stream([HumanMessage(content="hello")])]
+
+        assert chunks == ["b", " done"]
+        assert router.stats()["b"]["in_flight"] == 0
+
+    def test_async_calls(self):
+        """Test ainvoke and astream through the router"""
+        clock = FakeClock()
+        a = fake(clock, "a", 0.1, errors=[rate_limit_error(retry_after=1)])
+        router = make_router(clock, (a, 1, 0))
+
+        async def run():
+            response = await router.ainvoke([HumanMessage(content="hello")])
+            chunks = [chunk.content async for chunk in router.astream([HumanMessage(content="hello")])]
+            return response.content, chunks
+
+        assert asyncio.run(run()) == ("a", ["a", " done"])
+        assert router.stats()["a"]["requests"] == 3
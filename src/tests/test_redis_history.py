@@ -0,0 +1,173 @@
+"""
+Unit tests for the Redis-backed session history, run against an in-process fake server
+"""
+import pytest
+from langchain_core.messages import HumanMessage, AIMessage
+from agents.redis_history import RedisChatMessageHistory
+
+
+class FakeRedis:
+    """Minimal in-process stand-in for the Redis commands the history uses"""
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+        self.round_trips = 0
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def _get(self, key):
+        return self.data.get(key)
+
+    def _lrange(self, key, start, end):
+        items = self.data.get(key, [])
+        end = len(items) if end == -1 else end + 1
+        return list(items[start:end])
+
+    def _rpush(self, key, *values):
+        self.data.setdefault(key, []).extend(v.encode("utf-8") for v in values)
+        return len(self.data[key])
+
+    def _ltrim(self, key, start, end):
+        items = self.data.get(key, [])
+        self.data[key] = items[start:end + 1]
+        return True
+
+    def _expire(self, key, seconds):
+        self.ttls[key] = seconds
+        return True
+
+    def _delete(self, key):
+        return 1 if self.data.pop(key, None) is not None else 0
+
+    def _incr(self, key):
+        self.data[key] = str(int(self.data.get(key) or 0) + 1).encode()
+        return int(self.data[key])
+
+    def get(self, key):
+        self.round_trips += 1
+        return self._get(key)
+
+    def lrange(self, key, start, end):
+        self.round_trips += 1
+        return self._lrange(key, start, end)
+
+
+class FakePipeline:
+    def __init__(self, server):
+        self.server = server
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args):
+            self.commands.append((name, args))
+            return self
+        return queue
+
+    def execute(self):
+        self.server.round_trips += 1
+        return [getattr(self.server, f"_{name}")(*args) for name, args in self.commands]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def server():
+    return FakeRedis()
+
+
+class TestRedisChatMessageHistory:
+    """Test RedisChatMessageHistory functionality"""
+
+    def test_append_and_read(self, server):
+        """Test that appended messages round-trip through the server"""
+        history = RedisChatMessageHistory("s1", server)
+        history.add_messages([HumanMessage(content="Hello"), AIMessage(content="Hi!")])
+
+        fresh = RedisChatMessageHistory("s1", server)
+
+        assert [type(m) for m in fresh.messages] == [HumanMessage, AIMessage]
+        assert [m.content for m in fresh.messages] == ["Hello", "Hi!"]
+
+    def test_append_sets_key_ttl(self, server):
+        """Test that per-session keys get the configured TTL"""
+        history = RedisChatMessageHistory("s1", server, ttl_seconds=3600)
+        history.add_messages([HumanMessage(content="Hello")])
+
+        assert server.ttls["lm:session:s1"] == 3600
+        assert server.ttls["lm:session:s1:gen"] == 3600
+
+    def test_hot_session_served_from_local_cache(self, server):
+        """Test that reads within the revalidate interval cost no round trips"""
+        clock = FakeClock()
+        history = RedisChatMessageHistory("s1", server, revalidate_interval=1.0, clock=clock)
+        history.add_messages([HumanMessage(content="Hello")])
+        before = server.round_trips
+
+        for _ in range(5):
+            history.messages
+
+        assert server.round_trips == before
+
+    def test_revalidation_fetches_only_new_tail(self, server):
+        """Test that another replica's appends are picked up with one pipelined round trip"""
+        clock = FakeClock()
+        replica_a = RedisChatMessageHistory("s1", server, clock=clock)
+        replica_b = RedisChatMessageHistory("s1", server, clock=clock)
+        replica_a.add_messages([HumanMessage(content="turn 1"), AIMessage(content="reply 1")])
+        replica_b.add_messages([HumanMessage(content="turn 2"), AIMessage(content="reply 2")])
+
+        clock.now = 5
+        before = server.round_trips
+        messages = replica_a.messages
+
+        assert [m.content for m in messages] == ["turn 1", "reply 1", "turn 2", "reply 2"]
+        assert server.round_trips == before + 1
+
+    def test_clear_on_other_replica_invalidates_cache(self, server):
+        """Test that a clear elsewhere forces a full reload"""
+        clock = FakeClock()
+        replica_a = RedisChatMessageHistory("s1", server, clock=clock)
+        replica_b = RedisChatMessageHistory("s1", server, clock=clock)
+        replica_a.add_messages([HumanMessage(content="old round")])
+        replica_b.clear()
+        replica_b.add_messages([HumanMessage(content="new round")])
+
+        clock.now = 5
+
+        assert [m.content for m in replica_a.messages] == ["new round"]
+
+    def test_concurrent_append_marks_cache_stale(self, server):
+        """Test that an unexpected list length after append triggers a refetch"""
+        clock = FakeClock()
+        replica_a = RedisChatMessageHistory("s1", server, clock=clock)
+        replica_b = RedisChatMessageHistory("s1", server, clock=clock)
+        replica_a.messages
+        replica_b.add_messages([HumanMessage(content="from b")])
+
+        replica_a.add_messages([HumanMessage(content="from a")])
+
+        assert [m.content for m in replica_a.messages] == ["from b", "from a"]
+
+    def test_truncate_on_other_replica_invalidates_cache(self, server):
+        """Test that a rewind elsewhere forces a full reload instead of appending to a stale copy"""
+        clock = FakeClock()
+        replica_a = RedisChatMessageHistory("s1", server, clock=clock)
+        replica_b = RedisChatMessageHistory("s1", server, clock=clock)
+        replica_a.add_messages([HumanMessage(content="turn 1"), AIMessage(content="reply 1")])
+        replica_a.add_messages([HumanMessage(content="turn 2"), AIMessage(content="reply 2")])
+        replica_b.messages
+
+        replica_b.truncate(2)
+        replica_b.add_messages([HumanMessage(content="turn 2, edited")])
+        clock.now = 5
+
+        assert [m.content for m in replica_a.messages] == ["turn 1", "reply 1", "turn 2, edited"]
+        assert [m.content for m in replica_b.messages] == ["turn 1", "reply 1", "turn 2, edited"]
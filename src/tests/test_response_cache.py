@@ -0,0 +1,99 @@
+"""
+Unit tests for the semantic response cache
+"""
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from agents.response_cache import ResponseCache, normalize_input
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestNormalizeInput:
+    """Test input normalization"""
+
+    def test_ignores_case_punctuation_and_spacing(self):
+        """Test that trivially different inputs normalize the same"""
+        assert normalize_input("  Hello,   how are YOU? ") == "hello how are you"
+
+
+class TestResponseCache:
+    """Test ResponseCache functionality"""
+
+    def test_exact_hit(self):
+        """Test that a normalized repeat of an input is served from the cache"""
+        cache = ResponseCache()
+        cache.put(cache.key("conversation:abc", [], "Hello!"), "Hi there!")
+
+        assert cache.get(cache.key("conversation:abc", [], "hello")) == "Hi there!"
+        assert cache.stats()["exact_hits"] == 1
+
+    def test_approximate_hit(self):
+        """Test that a near-identical input matches through the similarity index"""
+        cache = ResponseCache(similarity_threshold=0.6)
+        cache.put(cache.key("conversation:abc", [], "can we practice english"), "Of course!")
+
+        assert cache.get(cache.key("conversation:abc", [], "can we practise english")) == "Of course!"
+        assert cache.stats()["approximate_hits"] == 1
+
+    def test_unrelated_input_misses(self):
+        """Test that a different input is not matched"""
+        cache = ResponseCache()
+        cache.put(cache.key("conversation:abc", [], "how are you"), "Fine, thanks!")
+
+        assert cache.get(cache.key("conversation:abc", [], "what is the weather like")) is None
+        assert cache.stats()["hit_rate"] == 0.0
+
+    def test_scope_and_history_separate_entries(self):
+        """Test that other agents, prompts or prior messages never share a reply"""
+        cache = ResponseCache()
+        cache.put(cache.key("conversation:abc", [], "hello"), "Hi!")
+
+        assert cache.get(cache.key("hotel_checkin:def", [], "hello")) is None
+        assert cache.get(cache.key("conversation:abc", [AIMessage(content="Welcome!")], "hello")) is None
+
+    def test_long_history_is_not_cached(self):
+        """Test that later turns bypass the cache"""
+        cache = ResponseCache(max_history_messages=1)
+        history = [HumanMessage(content="hi"), AIMessage(content="hello")]
+
+        assert cache.key("conversation:abc", history, "how are you") is None
+        assert cache.get(None) is None
+        assert cache.stats()["lookups"] == 0
+
+    def test_ttl_expiry(self):
+        """Test that entries expire after the TTL"""
+        clock = FakeClock()
+        cache = ResponseCache(ttl_seconds=60, clock=clock)
+        key = cache.key("conversation:abc", [], "hello")
+        cache.put(key, "Hi!")
+
+        clock.now = 61
+
+        assert cache.get(key) is None
+        assert cache.stats()["entries"] == 0
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted at capacity"""
+        cache = ResponseCache(max_entries=2)
+        first = cache.key("conversation:abc", [], "good morning")
+        second = cache.key("conversation:abc", [], "what should we talk about")
+        third = cache.key("conversation:abc", [], "tell me a joke")
+        cache.put(first, "Morning!")
+        cache.put(second, "Anything you like.")
+        cache.get(first)
+        cache.put(third, "Why did the chicken...")
+
+        assert cache.get(first) == "Morning!"
+        assert cache.get(second) is None
+        assert cache.stats()["entries"] == 2
+
+    def test_invalid_banding(self):
+        """Test that signatures must split evenly into bands"""
+        with pytest.raises(ValueError):
+            ResponseCache(num_perm=10, bands=3)
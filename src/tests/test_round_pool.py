@@ -0,0 +1,119 @@
+"""
+Unit tests for the pre-generated round pool
+"""
+import itertools
+import threading
+import time
+
+import pytest
+from agents.round_pool import RoundPool, round_fingerprint
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def numbered_round(*words):
+    return "\n".join(f"{i}: {word}\n- **meaning**, Noun" for i, word in enumerate(words, 1))
+
+
+class TestRoundFingerprint:
+    """Test round fingerprinting"""
+
+    def test_word_set_ignores_formatting(self):
+        """Test that the same words in a different presentation match"""
+        a = numbered_round("Innovate", "Resilient")
+        b = "Welcome!\n1. **resilient**\n- other text\n2. **innovate**\n"
+
+        assert round_fingerprint(a) == round_fingerprint(b)
+
+    def test_fallback_to_normalized_text(self):
+        """Test rounds without a word list fall back to their text"""
+        assert round_fingerprint("Hello   World") == round_fingerprint("hello world")
+
+
+class TestRoundPool:
+    """Test RoundPool functionality"""
+
+    def test_fills_to_depth(self):
+        """Test that the worker fills the pool up to its depth and stops"""
+        counter = itertools.count()
+        pool = RoundPool(lambda: numbered_round("word" + "x" * next(counter)), depth=3)
+        pool.start()
+
+        assert wait_until(lambda: pool.stats()["ready"] == 3)
+        time.sleep(0.05)
+        assert pool.stats()["ready"] == 3
+        pool.stop()
+
+    def test_pop_returns_immediately_and_refills(self):
+        """Test that popping serves a ready round and triggers a refill"""
+        counter = itertools.count()
+        pool = RoundPool(lambda: numbered_round("word" + "x" * next(counter)), depth=2)
+        pool.start()
+        assert wait_until(lambda: pool.stats()["ready"] == 2)
+
+        first = pool.pop()
+
+        assert "1: word\n" in first
+        assert wait_until(lambda: pool.stats()["ready"] == 2)
+        pool.stop()
+
+    def test_empty_pool_returns_none(self):
+        """Test that an empty pool never blocks the caller"""
+        gate = threading.Event()
+
+        def slow_generate():
+            gate.wait()
+            return numbered_round("late")
+
+        pool = RoundPool(slow_generate, depth=1)
+
+        assert pool.pop() is None
+        assert pool.stats()["misses"] == 1
+        pool.stop()
+        gate.set()
+
+    def test_duplicates_are_discarded(self):
+        """Test that the same word set is never served twice in a row"""
+        rounds = iter([
+            numbered_round("Alpha", "Beta"),
+            numbered_round("beta", "alpha"),
+            numbered_round("Gamma", "Delta"),
+        ] + [numbered_round("w" + "x" * i) for i in range(100)])
+        pool = RoundPool(lambda: next(rounds), depth=2, retry_delay=0.01)
+        pool.start()
+        assert wait_until(lambda: pool.stats()["ready"] == 2)
+
+        first, second = pool.pop(), pool.pop()
+
+        assert round_fingerprint(first) != round_fingerprint(second)
+        assert pool.stats()["duplicates"] >= 1
+        pool.stop()
+
+    def test_generation_errors_back_off(self):
+        """Test that failures are retried after a delay instead of crashing the worker"""
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) < 2:
+                raise RuntimeError("model down")
+            return numbered_round("Recovered")
+
+        pool = RoundPool(flaky, depth=1, retry_delay=0.01)
+        pool.start()
+
+        assert wait_until(lambda: pool.stats()["ready"] == 1)
+        pool.stop()
+
+    def test_zero_depth_disables_pool(self):
+        """Test that depth 0 never starts a worker"""
+        pool = RoundPool(lambda: pytest.fail("should not generate"), depth=0)
+
+        assert pool.pop() is None
@@ -25,6 +25,17 @@ class TestScenarioAgent:
         assert call_kwargs['prompt_file'] == "../prompts/job_interview_prompt.txt"
         assert call_kwargs['intro_file'] == "../content/intro/job_interview.json"
 
+    @patch('agents.scenario_agent.AgentBase.__init__')
+    def test_init_with_discovered_files(self, mock_super_init, clear_session_store):
+        """Test that files found by scenario discovery override the default layout"""
+        mock_super_init.return_value = None
+
+        ScenarioAgent(scenario_name="job_interview", prompt_file="/srv/job.txt", intro_file="/srv/job_intro.json")
+
+        call_kwargs = mock_super_init.call_args[1]
+        assert call_kwargs['prompt_file'] == "/srv/job.txt"
+        assert call_kwargs['intro_file'] == "/srv/job_intro.json"
+
     @patch('agents.scenario_agent.AgentBase.__init__')
     def test_init_with_custom_session_id(self, mock_super_init, clear_session_store):
         """Test initialization with custom session ID"""
@@ -118,3 +129,22 @@ class TestScenarioAgent:
                 assert scenario in call_kwargs['prompt_file']
                 assert scenario in call_kwargs['intro_file']
 
+
+    def test_astart_new_session(self, clear_session_store):
+        """Test async session start adds an intro message once"""
+        import asyncio
+        from agents.session_history import get_session_history
+
+        with patch('agents.scenario_agent.ScenarioAgent.__init__') as mock_init:
+            mock_init.return_value = None
+            agent = ScenarioAgent.__new__(ScenarioAgent)
+            agent.name = "test_scenario"
+            agent.session_id = "async_scenario_session"
+            agent.intro_messages = ["Welcome aboard!"]
+
+        first = asyncio.run(agent.astart_new_session())
+        second = asyncio.run(agent.astart_new_session())
+
+        assert first == "Welcome aboard!"
+        assert second == "Welcome aboard!"
+        assert len(get_session_history("async_scenario_session").messages) == 1
@@ -0,0 +1,130 @@
+"""
+Unit tests for scenario discovery and the scenario agent registry
+"""
+import json
+
+import pytest
+from unittest.mock import MagicMock
+
+from agents.scenario_registry import ScenarioRegistry, discover_scenarios
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def scenario_dirs(tmp_path):
+    """Prompt, intro and page directories with two complete scenarios and some noise"""
+    prompts, intro, page = tmp_path / "prompts", tmp_path / "intro", tmp_path / "page"
+    for directory in (prompts, intro, page):
+        directory.mkdir()
+    for name in ("hotel_checkin", "salary_negotiation"):
+        (prompts / f"{name}_prompt.txt").write_text("prompt", encoding="utf-8")
+        (intro / f"{name}.json").write_text(json.dumps(["Hello!"]), encoding="utf-8")
+    (page / "hotel_checkin.md").write_text("# Hotel", encoding="utf-8")
+    # A prompt without intro messages, like the conversation agent's, is not a scenario
+    (prompts / "conversation_prompt.txt").write_text("prompt", encoding="utf-8")
+    manifest = tmp_path / "scenarios.json"
+    manifest.write_text(json.dumps({"hotel_checkin": {"label": "酒店入住"}, "airport_checkin": {}}),
+                        encoding="utf-8")
+    return dict(prompts_dir=str(prompts), intro_dir=str(intro), page_dir=str(page), manifest_file=str(manifest))
+
+
+def make_registry(names=("a", "b", "c"), **kwargs):
+    discover = MagicMock(return_value=[MagicMock(name=name) for name in names])
+    for scenario, name in zip(discover.return_value, names):
+        scenario.name = name
+    factory = MagicMock(side_effect=lambda scenario: MagicMock(scenario=scenario.name))
+    return ScenarioRegistry(factory, discover=discover, **kwargs), factory, discover
+
+
+class TestDiscoverScenarios:
+    """Test finding scenarios on disk"""
+
+    def test_discovers_complete_scenarios(self, scenario_dirs):
+        """Test that scenarios need a prompt and intro, and take labels from the manifest"""
+        scenarios = discover_scenarios(**scenario_dirs)
+
+        assert [s.name for s in scenarios] == ["hotel_checkin", "salary_negotiation"]
+        assert scenarios[0].label == "酒店入住"
+        assert scenarios[0].page_file.endswith("hotel_checkin.md")
+        assert scenarios[1].label == "Salary Negotiation"
+        assert scenarios[1].page_file is None
+
+    def test_manifest_can_disable(self, scenario_dirs):
+        """Test that a manifest entry with enabled false hides a scenario"""
+        with open(scenario_dirs["manifest_file"], "w", encoding="utf-8") as file:
+            json.dump({"salary_negotiation": {"enabled": False}}, file)
+
+        assert [s.name for s in discover_scenarios(**scenario_dirs)] == ["hotel_checkin"]
+
+    def test_missing_manifest(self, scenario_dirs, tmp_path):
+        """Test that scenarios are still found without a manifest"""
+        scenario_dirs["manifest_file"] = str(tmp_path / "missing.json")
+
+        assert len(discover_scenarios(**scenario_dirs)) == 2
+
+
+class TestScenarioRegistry:
+    """Test on-demand agents and unloading"""
+
+    def test_agents_built_on_first_use(self):
+        """Test that no agent exists until its scenario is used, then it is reused"""
+        registry, factory, _ = make_registry()
+
+        assert registry.resident() == []
+        first = registry.get("a")
+
+        assert registry.get("a") is first
+        factory.assert_called_once_with(registry.scenario("a"))
+        assert registry.stats() == {"scenarios": 3, "resident": 1, "loads": 1, "unloads": 0}
+
+    def test_unknown_scenario(self):
+        """Test that an unknown scenario raises KeyError"""
+        registry, _, _ = make_registry()
+
+        with pytest.raises(KeyError):
+            registry.get("missing")
+
+    def test_idle_agents_unloaded(self):
+        """Test that agents unused for idle_seconds are dropped and rebuilt on next use"""
+        clock = FakeClock()
+        registry, factory, _ = make_registry(idle_seconds=60, clock=clock)
+
+        registry.get("a")
+        clock.now = 100
+        registry.get("b")
+
+        assert registry.resident() == ["b"]
+        registry.get("a")
+        assert factory.call_count == 3
+
+    def test_max_resident_evicts_least_recently_used(self):
+        """Test that the least recently used agent goes when over max_resident"""
+        registry, _, _ = make_registry(max_resident=2)
+
+        registry.get("a")
+        registry.get("b")
+        registry.get("a")
+        registry.get("c")
+
+        assert registry.resident() == ["a", "c"]
+        assert registry.unloads == 1
+
+    def test_refresh_drops_removed_scenarios(self):
+        """Test that rediscovery adds new scenarios and unloads removed ones"""
+        registry, _, discover = make_registry(names=("a", "b"))
+        registry.get("a")
+
+        new = MagicMock()
+        new.name = "d"
+        discover.return_value = [discover.return_value[1], new]
+        registry.refresh()
+
+        assert [s.name for s in registry.scenarios()] == ["b", "d"]
+        assert registry.resident() == []
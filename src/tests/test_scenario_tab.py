@@ -9,16 +9,19 @@ from unittest.mock import MagicMock, patch, mock_open
 class TestScenarioTab:
     """Test scenario tab functionality"""
 
-    def test_get_page_desc_success(self):
-        """Test getting page description successfully"""
-        # Create a minimal mock for the module
-        with patch('builtins.open', mock_open(read_data='# Scenario Description\nTest scenario content')):
-            with patch('agents.scenario_agent.ScenarioAgent'):
-                from tabs.scenario_tab import get_page_desc
+    def test_get_page_desc_success(self, tmp_path, monkeypatch):
+        """Test that the page description is read from the scenario's own page file"""
+        import tabs.scenario_tab as scenario_tab
+        from agents.scenario_registry import Scenario, ScenarioRegistry
+
+        page_file = tmp_path / "interview_page.md"
+        page_file.write_text("# Scenario Description\nTest scenario content\n", encoding="utf-8")
+        scenario = Scenario("job_interview", "求职面试", "prompt.txt", "intro.json", str(page_file))
+        monkeypatch.setattr(scenario_tab, "scenario_registry", ScenarioRegistry(MagicMock(), discover=lambda: [scenario]))
 
-                result = get_page_desc("job_interview")
+        result = scenario_tab.get_page_desc("job_interview")
 
-                assert result == "# Scenario Description\nTest scenario content"
+        assert result == "# Scenario Description\nTest scenario content"
 
     def test_get_page_desc_file_not_found(self):
         """Test handling of missing page description file"""
@@ -62,10 +65,9 @@ class TestScenarioTab:
         with patch('agents.scenario_agent.ScenarioAgent'):
             scenario_tab = MagicMock()
             scenario_tab.agents = mock_agents
-            scenario_tab.handle_scenario = lambda user_input, chat_history, scenario: mock_agents[scenario].chat_with_history(user_input)
+            scenario_tab.handle_scenario = lambda user_input, scenario: mock_agents[scenario].chat_with_history(user_input)
 
-            chat_history = [{"role": "user", "content": "Hello"}]
-            result = scenario_tab.handle_scenario("I want to check in", chat_history, "hotel_checkin")
+            result = scenario_tab.handle_scenario("I want to check in", "hotel_checkin")
 
             assert result == "Great answer! Let me ask you..."
             mock_agent.chat_with_history.assert_called_once_with("I want to check in")
@@ -82,9 +84,9 @@ class TestScenarioTab:
 
             scenario_tab = MagicMock()
             scenario_tab.agents = mock_agents
-            scenario_tab.handle_scenario = lambda user_input, chat_history, s: mock_agents[s].chat_with_history(user_input)
+            scenario_tab.handle_scenario = lambda user_input, s: mock_agents[s].chat_with_history(user_input)
 
-            result = scenario_tab.handle_scenario("Test input", [], scenario)
+            result = scenario_tab.handle_scenario("Test input", scenario)
 
             assert result == f"Response for {scenario}"
 
@@ -98,3 +100,28 @@ class TestScenarioTab:
         for scenario in expected_scenarios:
             assert scenario in mock_agents
 
+    def test_refresh_scenarios(self, monkeypatch):
+        """Test that scenarios added after startup are offered when the choices refresh"""
+        import tabs.scenario_tab as scenario_tab
+        from agents.scenario_registry import Scenario, ScenarioRegistry
+
+        found = [Scenario("hotel_checkin", "酒店入住", "p", "i")]
+        monkeypatch.setattr(scenario_tab, "scenario_registry", ScenarioRegistry(MagicMock(), discover=lambda: list(found)))
+        found.append(Scenario("salary_negotiation", "薪资谈判", "p", "i"))
+
+        update = scenario_tab.refresh_scenarios()
+
+        assert update["choices"] == [("酒店入住", "hotel_checkin"), ("薪资谈判", "salary_negotiation")]
+
+    def test_get_scenario_agent_uses_registry(self, monkeypatch):
+        """Test that scenario agents come from the scenario registry"""
+        import tabs.scenario_tab as scenario_tab
+
+        registry = MagicMock()
+        monkeypatch.setattr(scenario_tab, "scenario_registry", registry)
+
+        agent = scenario_tab.get_scenario_agent("hotel_checkin")
+
+        assert agent is registry.get.return_value
+        registry.get.assert_called_once_with("hotel_checkin")
+
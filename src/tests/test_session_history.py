@@ -2,7 +2,11 @@
 Unit tests for session_history module
 """
 import pytest
-from agents.session_history import get_session_history, store
+from agents.session_history import (
+    get_session_history, store, drop_learner_sessions, learner_session_id, rewind_session,
+    open_learner_page, close_learner_page, forget_session
+)
+from agents.sqlite_history import SQLiteChatMessageHistory, SQLiteMessageStore
 from langchain_core.messages import HumanMessage, AIMessage
 
 
@@ -73,3 +77,98 @@ class TestSessionHistory:
         history.clear()
         assert len(history.messages) == 0
 
+
+    def test_learner_sessions_are_isolated(self, clear_session_store):
+        """Test that two learners of the same agent get separate histories"""
+        history_a = get_session_history(learner_session_id("conversation", "learner_a"))
+        history_b = get_session_history(learner_session_id("conversation", "learner_b"))
+
+        history_a.add_message(HumanMessage(content="I am A"))
+
+        assert history_a is not history_b
+        assert history_b.messages == []
+
+    def test_drop_learner_sessions(self, clear_session_store):
+        """Test that a learner's sessions across agents are dropped together"""
+        get_session_history(learner_session_id("conversation", "learner_a"))
+        get_session_history(learner_session_id("vocab_study", "learner_a"))
+        get_session_history(learner_session_id("vocab_study", "learner_b"))
+
+        dropped = drop_learner_sessions("learner_a")
+
+        assert dropped == 2
+        assert len(store) == 1
+        assert learner_session_id("vocab_study", "learner_b") in store
+
+    def test_sessions_kept_while_a_page_is_open(self, clear_session_store):
+        """Test that closing one of a learner's tabs keeps their sessions for the other"""
+        open_learner_page("learner_a", "page_1")
+        open_learner_page("learner_a", "page_2")
+        get_session_history(learner_session_id("conversation", "learner_a"))
+
+        assert close_learner_page("learner_a", "page_1") == 0
+        assert learner_session_id("conversation", "learner_a") in store
+        assert close_learner_page("learner_a", "page_2") == 1
+        assert learner_session_id("conversation", "learner_a") not in store
+
+    def test_closed_page_resumes_from_persistent_backend(self, clear_session_store, tmp_path, monkeypatch):
+        """Test that closing the page only releases memory, so a later visit resumes the session"""
+        message_store = SQLiteMessageStore(str(tmp_path / "sessions.db"), flush_interval=0.01)
+        monkeypatch.setattr(store, "history_factory", lambda session_id: SQLiteChatMessageHistory(session_id, message_store))
+        session_id = learner_session_id("hotel_checkin", "learner_a")
+        open_learner_page("learner_a", "page_1")
+        get_session_history(session_id).add_messages([AIMessage(content="Welcome!"), HumanMessage(content="Hi")])
+
+        close_learner_page("learner_a", "page_1")
+
+        assert session_id not in store
+        assert [m.content for m in get_session_history(session_id).messages] == ["Welcome!", "Hi"]
+
+        forget_session(session_id)
+        assert get_session_history(session_id).messages == []
+        message_store.close()
+
+    def test_rewind_session(self, clear_session_store):
+        """Test that rewinding drops the last learner turns and keeps the opening line"""
+        history = get_session_history("hotel_checkin:learner_a")
+        history.add_messages([
+            AIMessage(content="Welcome!"),
+            HumanMessage(content="turn 1"), AIMessage(content="reply 1"),
+            HumanMessage(content="turn 2"), AIMessage(content="reply 2"),
+        ])
+
+        assert rewind_session("hotel_checkin:learner_a", 1) == 2
+        assert [m.content for m in history.messages] == ["Welcome!", "turn 1", "reply 1"]
+        assert store.stats()["messages"] == 3
+
+        assert rewind_session("hotel_checkin:learner_a", 1) == 2
+        assert [m.content for m in history.messages] == ["Welcome!"]
+
+    def test_rewind_keeps_turns_the_chat_does_not_show(self, clear_session_store):
+        """Test that turns before the ones shown, e.g. of a resumed scenario, survive an undo"""
+        history = get_session_history("hotel_checkin:learner_a")
+        history.add_messages([
+            AIMessage(content="Welcome!"),
+            HumanMessage(content="earlier turn"), AIMessage(content="earlier reply"),
+            HumanMessage(content="turn 1"), AIMessage(content="reply 1"),
+            HumanMessage(content="turn 2"), AIMessage(content="reply 2"),
+        ])
+
+        assert rewind_session("hotel_checkin:learner_a", 2) == 4
+        assert [m.content for m in history.messages] == ["Welcome!", "earlier turn", "earlier reply"]
+
+    def test_rewind_nothing(self, clear_session_store):
+        """Test that dropping no turns changes nothing"""
+        history = get_session_history("conversation:learner_a")
+        history.add_messages([HumanMessage(content="turn 1"), AIMessage(content="reply 1")])
+
+        assert rewind_session("conversation:learner_a", 0) == 0
+        assert len(history.messages) == 2
+
+    def test_rewind_past_the_start(self, clear_session_store):
+        """Test that dropping more turns than the session has keeps the opening line"""
+        history = get_session_history("hotel_checkin:learner_a")
+        history.add_messages([AIMessage(content="Welcome!"), HumanMessage(content="turn 1"), AIMessage(content="reply 1")])
+
+        assert rewind_session("hotel_checkin:learner_a", 3) == 2
+        assert [m.content for m in history.messages] == ["Welcome!"]
@@ -0,0 +1,174 @@
+"""
+Unit tests for SessionRegistry
+"""
+import pytest
+from langchain_core.chat_history import InMemoryChatMessageHistory
+from langchain_core.messages import HumanMessage, AIMessage
+from agents.session_registry import SessionRegistry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_registry(**kwargs):
+    return SessionRegistry(lambda session_id: InMemoryChatMessageHistory(), **kwargs)
+
+
+class TestSessionRegistry:
+    """Test SessionRegistry functionality"""
+
+    def test_get_creates_and_reuses(self):
+        """Test that the same history is returned for a session id"""
+        registry = make_registry()
+
+        history = registry.get("s1")
+
+        assert registry.get("s1") is history
+        assert "s1" in registry
+        assert len(registry) == 1
+
+    def test_max_sessions_evicts_least_recently_used(self):
+        """Test LRU eviction when the session count limit is exceeded"""
+        registry = make_registry(max_sessions=2)
+        registry.get("s1")
+        registry.get("s2")
+        registry.get("s1")
+
+        registry.get("s3")
+
+        assert list(registry) == ["s1", "s3"]
+
+    def test_idle_ttl_eviction(self):
+        """Test that idle sessions expire on the next access"""
+        clock = FakeClock()
+        registry = make_registry(ttl_seconds=60, clock=clock)
+        registry.get("idle")
+        clock.now = 30
+        registry.get("active")
+
+        clock.now = 70
+        registry.get("active")
+
+        assert "idle" not in registry
+        assert "active" in registry
+
+    def test_message_cap_evicts_other_sessions(self):
+        """Test total message cap evicts older sessions but keeps the current one"""
+        registry = make_registry(max_messages=3)
+        registry.get("old").add_messages([HumanMessage(content="a"), AIMessage(content="b")])
+        registry.get("new").add_messages([HumanMessage(content="c"), AIMessage(content="d")])
+
+        registry.get("new")
+
+        assert "old" not in registry
+        assert "new" in registry
+        assert registry.stats()["messages"] == 2
+
+    def test_byte_cap_tracks_growth_and_clear(self):
+        """Test byte accounting follows appends and clears"""
+        registry = make_registry(max_bytes=1000)
+        history = registry.get("s1")
+        history.add_message(HumanMessage(content="x" * 100))
+        registry.get("s1")
+        assert registry.stats()["bytes"] == 100
+
+        history.clear()
+        registry.get("s1")
+        assert registry.stats()["bytes"] == 0
+
+    def test_eviction_callback(self):
+        """Test eviction callbacks receive the session id, history and reason"""
+        registry = make_registry(max_sessions=1)
+        evicted = []
+        registry.add_eviction_callback(lambda session_id, history, reason: evicted.append((session_id, reason)))
+
+        registry.get("s1")
+        registry.get("s2")
+
+        assert evicted == [("s1", "max_sessions")]
+        assert registry.stats()["evictions"] == 1
+
+    def test_failing_callback_does_not_break_eviction(self):
+        """Test that a raising callback is logged and ignored"""
+        registry = make_registry(max_sessions=1)
+
+        def broken(session_id, history, reason):
+            raise RuntimeError("boom")
+
+        registry.add_eviction_callback(broken)
+        registry.get("s1")
+        registry.get("s2")
+
+        assert list(registry) == ["s2"]
+
+    def test_lookup_does_not_read_messages(self):
+        """Test that get() never reads the backend's messages, which may be a network round trip"""
+        class CountingHistory(InMemoryChatMessageHistory):
+            reads: int = 0
+
+            def __getattribute__(self, name):
+                if name == "messages":
+                    object.__setattr__(self, "reads", object.__getattribute__(self, "reads") + 1)
+                return super().__getattribute__(name)
+
+        inner = CountingHistory()
+        registry = SessionRegistry(lambda session_id: inner)
+        registry.get("s1").add_messages([HumanMessage(content="hello")])
+        reads = inner.reads
+
+        for _ in range(5):
+            registry.get("s1")
+
+        assert inner.reads == reads
+        assert registry.stats()["bytes"] == 5
+
+    def test_replaced_content_is_remeasured(self):
+        """Test that rewinding and rewriting a message of a different size updates the byte total"""
+        registry = make_registry()
+        history = registry.get("s1")
+        history.add_messages([HumanMessage(content="a"), AIMessage(content="b" * 10)])
+
+        history.truncate(1)
+        history.add_messages([AIMessage(content="c" * 100)])
+
+        assert registry.stats() == {"sessions": 1, "messages": 2, "bytes": 101, "evictions": 0}
+
+    def test_lazy_history_is_measured_at_first_write(self):
+        """Test that a history loaded on demand is counted in full once something writes to it"""
+        class LazyHistory(InMemoryChatMessageHistory):
+            loaded: bool = False
+
+        inner = LazyHistory(messages=[HumanMessage(content="x" * 50)])
+        registry = SessionRegistry(lambda session_id: inner)
+
+        history = registry.get("s1")
+        assert registry.stats()["bytes"] == 0
+
+        inner.loaded = True
+        history.add_messages([AIMessage(content="y" * 5)])
+        assert registry.stats()["messages"] == 2
+        assert registry.stats()["bytes"] == 55
+
+    def test_eviction_callback_runs_outside_the_lock(self):
+        """Test that callbacks can use the registry from another thread without deadlocking"""
+        import threading
+
+        registry = make_registry(max_sessions=1)
+        seen = []
+
+        def callback(session_id, history, reason):
+            worker = threading.Thread(target=lambda: seen.append(registry.stats()["sessions"]))
+            worker.start()
+            worker.join(timeout=1)
+            assert not worker.is_alive()
+
+        registry.add_eviction_callback(callback)
+        registry.get("s1")
+        registry.get("s2")
+
+        assert seen == [1]
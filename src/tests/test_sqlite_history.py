@@ -0,0 +1,151 @@
+"""
+Unit tests for the SQLite-backed session history
+"""
+import asyncio
+import sqlite3
+import time
+import pytest
+from langchain_core.messages import HumanMessage, AIMessage
+from agents.sqlite_history import SQLiteMessageStore, SQLiteChatMessageHistory
+
+
+@pytest.fixture
+def message_store(tmp_path):
+    message_store = SQLiteMessageStore(str(tmp_path / "sessions.db"), flush_interval=0.01)
+    yield message_store
+    message_store.close()
+
+
+class TestSQLiteChatMessageHistory:
+    """Test SQLiteChatMessageHistory functionality"""
+
+    def test_wal_mode_enabled(self, message_store):
+        """Test that the database runs in WAL journal mode"""
+        mode = message_store._read_conn.execute("PRAGMA journal_mode").fetchone()[0]
+
+        assert mode.lower() == "wal"
+
+    def test_messages_are_loaded_lazily(self, message_store):
+        """Test that nothing is read until messages are accessed"""
+        history = SQLiteChatMessageHistory("lazy", message_store)
+
+        assert history.loaded is False
+        assert history.messages == []
+        assert history.loaded is True
+
+    def test_messages_persist_across_store_instances(self, tmp_path):
+        """Test that a restarted process sees previously written turns"""
+        path = str(tmp_path / "restart.db")
+        first = SQLiteMessageStore(path)
+        history = SQLiteChatMessageHistory("s1", first)
+        history.add_messages([HumanMessage(content="Hello"), AIMessage(content="Hi!")])
+        first.close()
+
+        second = SQLiteMessageStore(path)
+        restored = SQLiteChatMessageHistory("s1", second)
+
+        assert [type(m) for m in restored.messages] == [HumanMessage, AIMessage]
+        assert [m.content for m in restored.messages] == ["Hello", "Hi!"]
+        second.close()
+
+    def test_clear_is_persisted(self, message_store):
+        """Test that clearing a session removes its stored messages"""
+        history = SQLiteChatMessageHistory("s1", message_store)
+        history.add_messages([HumanMessage(content="old")])
+        history.clear()
+        history.add_messages([HumanMessage(content="new")])
+
+        reloaded = SQLiteChatMessageHistory("s1", message_store)
+
+        assert [m.content for m in reloaded.messages] == ["new"]
+
+    def test_truncate_is_persisted(self, message_store):
+        """Test that a rewind removes the later messages of that session only"""
+        history = SQLiteChatMessageHistory("s1", message_store)
+        history.add_messages([HumanMessage(content="turn 1"), AIMessage(content="reply 1")])
+        history.add_messages([HumanMessage(content="turn 2"), AIMessage(content="reply 2")])
+        SQLiteChatMessageHistory("s2", message_store).add_messages([HumanMessage(content="other")])
+        history.truncate(2)
+        history.add_messages([HumanMessage(content="turn 2, edited")])
+
+        assert [m.content for m in history.messages] == ["turn 1", "reply 1", "turn 2, edited"]
+        reloaded = SQLiteChatMessageHistory("s1", message_store)
+        assert [m.content for m in reloaded.messages] == ["turn 1", "reply 1", "turn 2, edited"]
+        assert [m.content for m in SQLiteChatMessageHistory("s2", message_store).messages] == ["other"]
+
+    def test_sessions_are_separate(self, message_store):
+        """Test that sessions only load their own messages"""
+        SQLiteChatMessageHistory("a", message_store).add_messages([HumanMessage(content="from a")])
+        SQLiteChatMessageHistory("b", message_store).add_messages([HumanMessage(content="from b")])
+
+        assert [m.content for m in SQLiteChatMessageHistory("a", message_store).messages] == ["from a"]
+
+    def test_async_append_on_loaded_session(self, message_store):
+        """Test async append and read on a loaded session"""
+        history = SQLiteChatMessageHistory("async", message_store)
+        history.messages
+
+        async def turn():
+            await history.aadd_messages([HumanMessage(content="Hi"), AIMessage(content="Hello")])
+            return await history.aget_messages()
+
+        messages = asyncio.run(turn())
+
+        assert [m.content for m in messages] == ["Hi", "Hello"]
+        message_store.flush()
+        assert len(SQLiteChatMessageHistory("async", message_store).messages) == 2
+
+    def test_writes_are_batched(self, message_store):
+        """Test that queued appends are committed by the writer and visible after flush"""
+        history = SQLiteChatMessageHistory("batch", message_store)
+        for i in range(200):
+            history.add_messages([HumanMessage(content=f"m{i}")])
+
+        message_store.flush()
+        count = message_store._read_conn.execute(
+            "SELECT COUNT(*) FROM messages WHERE session_id = ?", ("batch",)
+        ).fetchone()[0]
+
+        assert count == 200
+
+    def test_writer_survives_database_errors(self, message_store, monkeypatch):
+        """Test that a failed prune does not stop the writer from saving later turns"""
+        def locked(conn):
+            raise sqlite3.OperationalError("database is locked")
+
+        monkeypatch.setattr(message_store, "_maybe_prune", locked)
+        time.sleep(0.05)
+        SQLiteChatMessageHistory("survivor", message_store).add_messages([HumanMessage(content="Hi")])
+
+        assert message_store.flush(timeout=2) is True
+        assert message_store._writer.is_alive()
+        assert len(SQLiteChatMessageHistory("survivor", message_store).messages) == 1
+
+    def test_flush_without_writer_does_not_hang(self, message_store):
+        """Test that reads go ahead when the writer thread is gone"""
+        message_store._queue.put(None)
+        message_store._writer.join(timeout=2)
+
+        started = time.monotonic()
+        assert message_store.flush() is False
+        assert SQLiteChatMessageHistory("orphan", message_store).messages == []
+        assert time.monotonic() - started < 1
+
+    def test_prune_runs_under_steady_writes(self, tmp_path):
+        """Test that expired sessions are pruned even when the writer is never idle"""
+        message_store = SQLiteMessageStore(
+            str(tmp_path / "busy.db"), flush_interval=60, retention_seconds=0.05, prune_interval=0
+        )
+        try:
+            SQLiteChatMessageHistory("expired", message_store).add_messages([HumanMessage(content="old")])
+            message_store.flush()
+            time.sleep(0.1)
+
+            SQLiteChatMessageHistory("active", message_store).add_messages([HumanMessage(content="new")])
+            message_store.flush()
+            message_store.flush()
+
+            sessions = {row[0] for row in message_store._read_conn.execute("SELECT session_id FROM messages")}
+            assert sessions == {"active"}
+        finally:
+            message_store.close()
@@ -0,0 +1,160 @@
+"""
+Unit tests for the rolling summary memory
+"""
+import pytest
+from concurrent.futures import Future
+from unittest.mock import MagicMock
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from agents.summary_memory import SummaryMemory
+
+
+class InlineExecutor:
+    """Runs submitted jobs later, when the test decides"""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, fn, *args):
+        self.jobs.append((fn, args))
+        return Future()
+
+    def run_all(self):
+        jobs, self.jobs = self.jobs, []
+        for fn, args in jobs:
+            fn(*args)
+
+
+def make_model(*summaries):
+    model = MagicMock()
+    model.invoke.side_effect = [MagicMock(content=s) for s in summaries]
+    return model
+
+
+def turn(i, words=40):
+    return [HumanMessage(content=f"question {i} " + "word " * words), AIMessage(content=f"answer {i} " + "word " * words)]
+
+
+class TestSummaryMemory:
+    """Test SummaryMemory functionality"""
+
+    def test_short_history_is_untouched(self):
+        """Test that nothing is summarized below the threshold"""
+        executor = InlineExecutor()
+        memory = SummaryMemory(make_model(), threshold_tokens=10000, recent_tokens=100, executor=executor)
+        messages = turn(0) + [HumanMessage(content="new")]
+
+        assert memory.apply(messages, "s1") == messages
+        assert executor.jobs == []
+
+    def test_summary_is_built_off_the_request_path(self):
+        """Test that the first call schedules work and still sends full history"""
+        executor = InlineExecutor()
+        memory = SummaryMemory(make_model("Learner is Amy."), threshold_tokens=200, recent_tokens=100, executor=executor)
+        history = turn(0) + turn(1) + turn(2) + turn(3)
+
+        sent = memory.apply(history + [HumanMessage(content="new")], "s1")
+
+        assert len(sent) == len(history) + 1
+        assert len(executor.jobs) == 1
+
+    def test_summary_replaces_older_turns(self):
+        """Test that later calls send the summary plus the recent window"""
+        executor = InlineExecutor()
+        memory = SummaryMemory(make_model("Learner is Amy."), threshold_tokens=200, recent_tokens=100, executor=executor)
+        history = turn(0) + turn(1) + turn(2) + turn(3)
+        memory.apply(history + [HumanMessage(content="new")], "s1")
+        executor.run_all()
+
+        history += [HumanMessage(content="new"), AIMessage(content="reply")]
+        sent = memory.apply(history + [HumanMessage(content="newer")], "s1")
+
+        assert isinstance(sent[0], SystemMessage)
+        assert "Learner is Amy." in sent[0].content
+        assert isinstance(sent[1], HumanMessage)
+        assert sent[-1].content == "newer"
+        assert len(sent) < len(history) + 1
+        assert memory.stats()["last_tokens_saved"] > 0
+        assert memory.stats()["summaries"] == 1
+
+    def test_savings_are_exported(self):
+        """Test that summaries and the tokens saved per turn reach /metrics, labelled by agent"""
+        from utils.metrics import registry
+
+        executor = InlineExecutor()
+        memory = SummaryMemory(make_model("Learner is Amy."), threshold_tokens=200, recent_tokens=100,
+                               executor=executor, agent="summary_metrics")
+        history = turn(0) + turn(1) + turn(2) + turn(3)
+        memory.apply(history + [HumanMessage(content="new")], "s1")
+        executor.run_all()
+        memory.apply(history + [HumanMessage(content="new")], "s1")
+
+        labels = {"agent": "summary_metrics"}
+        assert registry.get_sample_value("language_mentor_summaries_total", labels) == 1
+        assert registry.get_sample_value("language_mentor_summary_tokens_saved_count", labels) == 2
+        assert registry.get_sample_value("language_mentor_summary_tokens_saved_sum", labels) == memory.stats()["tokens_saved_total"]
+
+    def test_summarization_is_incremental(self):
+        """Test that a second summary only receives the new overflow and the old summary"""
+        executor = InlineExecutor()
+        model = make_model("Summary one.", "Summary two.")
+        memory = SummaryMemory(model, threshold_tokens=200, recent_tokens=100, executor=executor)
+        history = turn(0) + turn(1) + turn(2) + turn(3)
+        memory.apply(history + [HumanMessage(content="x")], "s1")
+        executor.run_all()
+
+        history += turn(4) + turn(5) + turn(6)
+        memory.apply(history + [HumanMessage(content="y")], "s1")
+        executor.run_all()
+
+        second_request = model.invoke.call_args_list[1][0][0][1].content
+        assert "Summary one." in second_request
+        assert "question 0" not in second_request
+        assert "question 4" in second_request
+
+    def test_cleared_session_drops_summary(self):
+        """Test that a new history for the same session does not reuse the old summary"""
+        executor = InlineExecutor()
+        memory = SummaryMemory(make_model("Old summary."), threshold_tokens=200, recent_tokens=100, executor=executor)
+        history = turn(0) + turn(1) + turn(2) + turn(3)
+        memory.apply(history + [HumanMessage(content="x")], "s1")
+        executor.run_all()
+
+        fresh = turn(10) + [HumanMessage(content="hello again")]
+        sent = memory.apply(fresh, "s1")
+
+        assert sent == fresh
+
+    def test_cleared_session_drops_summary_when_ids_are_reused(self, monkeypatch):
+        """Test that a cleared store history is not taken for the summarized one, whatever the message ids"""
+        import agents.summary_memory
+        from langchain_core.chat_history import InMemoryChatMessageHistory
+
+        # CPython usually hands the freed first message's id to the next one; make it certain
+        monkeypatch.setattr(agents.summary_memory, "id", lambda obj: 0, raising=False)
+        executor = InlineExecutor()
+        memory = SummaryMemory(make_model("Learner is Alice from Paris."), threshold_tokens=200,
+                               recent_tokens=100, executor=executor)
+        history = InMemoryChatMessageHistory()
+        history.add_messages(turn(0) + turn(1) + turn(2) + turn(3))
+        memory.apply(history.messages + [HumanMessage(content="x")], "s1")
+        executor.run_all()
+
+        history.clear()
+        history.add_messages(turn(10) + turn(11) + turn(12) + [HumanMessage(content="I'm Bob"), AIMessage(content="Hi Bob")])
+        messages = history.messages + [HumanMessage(content="who am I?")]
+
+        assert memory.apply(messages, "s1") == messages
+
+    def test_failed_summary_keeps_full_history(self):
+        """Test that a summarizer error is logged and the turn is unaffected"""
+        executor = InlineExecutor()
+        model = MagicMock()
+        model.invoke.side_effect = RuntimeError("model down")
+        memory = SummaryMemory(model, threshold_tokens=200, recent_tokens=100, executor=executor)
+        history = turn(0) + turn(1) + turn(2) + turn(3)
+        messages = history + [HumanMessage(content="x")]
+        memory.apply(messages, "s1")
+        executor.run_all()
+
+        assert memory.apply(messages, "s1") == messages
+        assert memory.stats()["summaries"] == 0
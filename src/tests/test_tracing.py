@@ -0,0 +1,102 @@
+"""
+Unit tests for tracing
+"""
+import asyncio
+
+import pytest
+from opentelemetry import trace
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from utils.tracing import NOOP_SPAN, configure_tracing, shutdown_tracing, span, traced, traced_stream
+
+
+async def words(*items):
+    for item in items:
+        with span("inner"):
+            yield item
+
+
+def by_name(exporter):
+    return {s.name: s for s in exporter.get_finished_spans()}
+
+
+class TestTracingDisabled:
+    """Test that tracing costs nothing when off"""
+
+    def test_noop(self):
+        """Test that spans and streams pass through untouched"""
+        shutdown_tracing()
+        stream = words("a")
+
+        assert span("turn") is NOOP_SPAN
+        assert traced_stream("turn", stream) is stream
+
+
+class TestTracing:
+    """Test spans, their parents and attributes"""
+
+    def test_stream_spans_nest_across_tasks(self, span_exporter):
+        """Test that spans started by a stream are its children, even when resumed from other tasks"""
+        async def consume():
+            stream = traced_stream("turn", words("a", "b"), {"session.id": "conversation:abc"})
+            chunks = []
+            while True:
+                # Gradio may run each step of a generator handler in a new task
+                try:
+                    chunks.append(await asyncio.create_task(stream.__anext__()))
+                except StopAsyncIteration:
+                    return chunks
+
+        assert asyncio.run(consume()) == ["a", "b"]
+
+        spans = span_exporter.get_finished_spans()
+        turn = next(s for s in spans if s.name == "turn")
+        inner = [s for s in spans if s.name == "inner"]
+        assert len(inner) == 2
+        assert all(s.parent.span_id == turn.context.span_id for s in inner)
+        assert turn.attributes["session.id"] == "conversation:abc"
+        assert not trace.get_current_span().get_span_context().is_valid
+
+    def test_stream_error_recorded(self, span_exporter):
+        """Test that a failing stream marks its span as an error"""
+        async def failing():
+            yield "a"
+            raise TimeoutError()
+
+        async def consume():
+            return [chunk async for chunk in traced_stream("turn", failing())]
+
+        with pytest.raises(TimeoutError):
+            asyncio.run(consume())
+
+        turn = by_name(span_exporter)["turn"]
+        assert not turn.status.is_ok
+        assert turn.events[0].name == "exception"
+
+    def test_traced_coroutine(self, span_exporter):
+        """Test the decorator on a coroutine function, with attributes from its arguments"""
+        @traced("lookup", lambda key: {"key": key})
+        async def lookup(key):
+            with span("child"):
+                return key.upper()
+
+        assert asyncio.run(lookup("abc")) == "ABC"
+
+        spans = by_name(span_exporter)
+        assert spans["lookup"].attributes["key"] == "abc"
+        assert spans["child"].parent.span_id == spans["lookup"].context.span_id
+
+    def test_sampling(self):
+        """Test that unsampled turns record nothing"""
+        exporter = InMemorySpanExporter()
+        configure_tracing(enabled=True, sample_rate=0.0, span_processor=SimpleSpanProcessor(exporter))
+        try:
+            for _ in range(20):
+                with span("turn"):
+                    with span("child"):
+                        pass
+        finally:
+            shutdown_tracing()
+
+        assert exporter.get_finished_spans() == ()
@@ -102,3 +102,65 @@ class TestVocabAgent:
             # VocabAgent should not pass intro_file
             assert 'intro_file' not in call_kwargs or call_kwargs.get('intro_file') is None
 
+
+    def test_arestart_session_clears_history(self, clear_session_store):
+        """Test that async restart clears the session history"""
+        import asyncio
+        from agents.session_history import get_session_history
+        from langchain_core.messages import HumanMessage
+
+        with patch('agents.vocab_agent.VocabAgent.__init__') as mock_init:
+            mock_init.return_value = None
+            agent = VocabAgent.__new__(VocabAgent)
+            agent.name = "vocab_study"
+            agent.session_id = "async_vocab_session"
+
+        get_session_history("async_vocab_session").add_message(HumanMessage(content="old round"))
+
+        history = asyncio.run(agent.arestart_session())
+
+        assert history.messages == []
+
+    def _make_agent(self, session_id):
+        from agents.round_pool import RoundPool
+
+        with patch('agents.vocab_agent.VocabAgent.__init__') as mock_init:
+            mock_init.return_value = None
+            agent = VocabAgent.__new__(VocabAgent)
+            agent.name = "vocab_study"
+            agent.session_id = session_id
+        agent.round_pool = RoundPool(lambda: "unused", depth=0)
+        return agent
+
+    def test_astart_next_round_uses_pooled_round(self, clear_session_store):
+        """Test that a ready round is placed into the new session without a model call"""
+        import asyncio
+        from unittest.mock import AsyncMock
+        from agents.session_history import get_session_history
+        from langchain_core.messages import HumanMessage, AIMessage
+
+        agent = self._make_agent("pooled_session")
+        agent.round_pool.pop = MagicMock(return_value="1: Innovate\n2: Resilient")
+        agent.achat_with_history = AsyncMock()
+        get_session_history("pooled_session").add_message(HumanMessage(content="previous round"))
+
+        result = asyncio.run(agent.astart_next_round())
+
+        assert result == "1: Innovate\n2: Resilient"
+        agent.achat_with_history.assert_not_awaited()
+        messages = get_session_history("pooled_session").messages
+        assert [type(m) for m in messages] == [HumanMessage, AIMessage]
+        assert messages[1].content == result
+
+    def test_astart_next_round_falls_back_when_pool_empty(self, clear_session_store):
+        """Test that an empty pool falls back to generating the round in-session"""
+        import asyncio
+        from unittest.mock import AsyncMock
+
+        agent = self._make_agent("empty_pool_session")
+        agent.achat_with_history = AsyncMock(return_value="fresh round")
+
+        result = asyncio.run(agent.astart_next_round())
+
+        assert result == "fresh round"
+        agent.achat_with_history.assert_awaited_once_with("Let's do it", "empty_pool_session")
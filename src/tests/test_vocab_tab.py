@@ -1,8 +1,18 @@
 """
 Unit tests for vocab_tab module
 """
+import asyncio
 import pytest
-from unittest.mock import MagicMock, patch, mock_open
+from unittest.mock import AsyncMock, MagicMock, patch, mock_open
+
+
+async def _astream(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def _collect(agen):
+    return [item async for item in agen]
 
 
 class TestVocabTab:
@@ -31,50 +41,73 @@ class TestVocabTab:
         """Test restarting vocab study chatbot"""
         from tabs.vocab_tab import restart_vocab_study_chatbot
 
-        mock_agent.restart_session.return_value = None
-        mock_agent.chat_with_history.return_value = "Let's learn 10 new words today!"
+        mock_agent.get_session_id.return_value = "vocab_study:abc"
+        mock_agent.astart_next_round = AsyncMock(return_value="Let's learn 10 new words today!")
 
-        result = restart_vocab_study_chatbot()
+        result = asyncio.run(restart_vocab_study_chatbot(MagicMock(session_hash="abc")))
 
         assert result == [{"role": "assistant", "content": "Let's learn 10 new words today!"}]
-        mock_agent.restart_session.assert_called_once()
-        mock_agent.chat_with_history.assert_called_once_with("Let's do it")
+        mock_agent.get_session_id.assert_called_once_with("abc")
+        mock_agent.astart_next_round.assert_awaited_once_with("vocab_study:abc")
 
     @patch('tabs.vocab_tab.vocab_agent')
     def test_handle_vocab(self, mock_agent):
         """Test handling vocab interaction"""
         from tabs.vocab_tab import handle_vocab
 
-        mock_agent.chat_with_history.return_value = "Excellent! The word means..."
+        mock_agent.get_session_id.return_value = "vocab_study"
+        mock_agent.astream_with_history.return_value = _astream("Excellent! ", "The word means...")
 
-        result = handle_vocab("What does 'serendipity' mean?", [])
+        result = asyncio.run(_collect(handle_vocab("What does 'serendipity' mean?")))
 
-        assert result == "Excellent! The word means..."
-        mock_agent.chat_with_history.assert_called_once_with("What does 'serendipity' mean?")
+        assert result == ["Excellent! ", "Excellent! The word means..."]
+        mock_agent.get_session_id.assert_called_once_with(None)
+        mock_agent.astream_with_history.assert_called_once_with("What does 'serendipity' mean?", "vocab_study")
 
     @patch('tabs.vocab_tab.vocab_agent')
-    def test_handle_vocab_with_history(self, mock_agent):
-        """Test handling vocab with existing chat history"""
+    def test_handle_vocab_empty_message(self, mock_agent):
+        """Test that an empty message does not reach the agent"""
         from tabs.vocab_tab import handle_vocab
 
-        mock_agent.chat_with_history.return_value = "That's correct! Next word..."
+        result = asyncio.run(_collect(handle_vocab("  ")))
 
-        chat_history = [
-            {"role": "assistant", "content": "What's the meaning of 'ephemeral'?"},
-            {"role": "user", "content": "Lasting for a short time"}
-        ]
+        assert result == []
+        mock_agent.astream_with_history.assert_not_called()
 
-        result = handle_vocab("Is that right?", chat_history)
-
-        assert result == "That's correct! Next word..."
-
-    def test_vocab_agent_initialized(self):
-        """Test that vocab agent is properly initialized"""
-        from tabs.vocab_tab import vocab_agent
-
-        assert vocab_agent is not None
-        assert hasattr(vocab_agent, 'chat_with_history')
-        assert hasattr(vocab_agent, 'restart_session')
+    @patch('tabs.vocab_tab.vocab_agent')
+    def test_rewind_vocab(self, mock_agent, clear_session_store):
+        """Test that undoing the first answer keeps the word round, opened by a hidden learner message"""
+        from langchain_core.messages import AIMessage, HumanMessage
+
+        from agents.session_history import get_session_history
+        from agents.vocab_agent import NEXT_ROUND_INPUT
+        from tabs.vocab_tab import rewind_vocab
+
+        mock_agent.get_session_id.return_value = "vocab_study:abc"
+        history = get_session_history("vocab_study:abc")
+        history.add_messages([
+            HumanMessage(content=NEXT_ROUND_INPUT), AIMessage(content="Round 1: serendipity"),
+            HumanMessage(content="A lucky find"), AIMessage(content="Correct!"),
+        ])
+
+        # The chat shows the round and one answer, so undo drops one turn
+        rewind_vocab(1, MagicMock(session_hash="abc"))
+
+        assert [m.content for m in history.messages] == [NEXT_ROUND_INPUT, "Round 1: serendipity"]
+        mock_agent.get_session_id.assert_called_once_with("abc")
+
+    def test_vocab_agent_built_on_first_use(self, monkeypatch):
+        """Test that the vocab agent is created once, on first use, with its round pool started"""
+        import tabs.vocab_tab as vocab_tab
+
+        monkeypatch.setattr(vocab_tab, "vocab_agent", None)
+        with patch('agents.vocab_agent.VocabAgent') as mock_agent_class:
+            first = vocab_tab.get_vocab_agent()
+            second = vocab_tab.get_vocab_agent()
+
+        assert first is second is vocab_tab.vocab_agent
+        mock_agent_class.assert_called_once_with()
+        first.round_pool.start.assert_called_once_with()
 
     def test_feature_constant(self):
         """Test that feature constant is set correctly"""
@@ -0,0 +1,295 @@
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+
+from utils.metrics import ADMISSION_WAIT
+
+# Lower values are admitted first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+PRIORITY_LABELS = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BACKGROUND: "background"}
+
+BUSY_MESSAGE = "老师现在有点忙，请稍后再试。The tutor is busy right now, please try again in a moment."
+
+
+def usage_tokens(response):
+    """
+    Total tokens reported for a model response
+    :param response: AIMessage
+    :return: token count, or None when the model did not report usage
+    """
+    usage = getattr(response, "usage_metadata", None)
+    return usage.get("total_tokens") if isinstance(usage, dict) else None
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a model call would wait in the admission queue longer than allowed
+    """
+    def __init__(self, expected_wait, user_message=BUSY_MESSAGE):
+        super().__init__(f"Admission queue wait of {expected_wait:.1f}s exceeds the limit")
+        self.expected_wait = expected_wait
+        self.user_message = user_message
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "tokens", "wake")
+
+    def __init__(self, priority, seq, tokens, wake):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.wake = wake
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class AdmissionController:
+    """
+    Token-bucket admission for model calls against the deployment's TPM and RPM quotas.
+
+    Both buckets hold one minute of quota and refill continuously. A call takes its
+    estimated tokens and one request; when either bucket is short, it queues behind calls
+    of equal or higher priority (lower value) and is admitted in priority, then arrival,
+    order. A call whose expected wait already exceeds ``max_wait`` for its priority is
+    rejected up front, and so is one still waiting when that time runs out. Like the
+    ModelCallLimiter, sync callers and asyncio tasks share the same queue.
+    A quota of 0 disables that bucket.
+    """
+    def __init__(self, tpm=0, rpm=0, max_wait=None, clock=time.monotonic):
+        self.tpm = tpm
+        self.rpm = rpm
+        self.max_wait = {PRIORITY_INTERACTIVE: 10.0, PRIORITY_BACKGROUND: 120.0, **(max_wait or {})}
+        self.clock = clock
+
+        self._tokens = float(tpm)
+        self._requests = float(rpm)
+        self._refilled_at = clock()
+        self._queue = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+
+        self.admitted = 0
+        self.rejected = 0
+        self.queued = 0
+        self._waits = deque(maxlen=1000)
+
+    @property
+    def enabled(self):
+        return self.tpm > 0 or self.rpm > 0
+
+    def admit(self, tokens, priority=PRIORITY_INTERACTIVE):
+        """
+        Wait until the call fits the quotas
+        :param tokens: estimated tokens of the call, prompt and completion
+        :param priority:
+        :return: seconds waited
+        """
+        if not self.enabled:
+            return 0.0
+        started = self.clock()
+        with self._cond:
+            waiter = self._enqueue(tokens, priority, self._cond.notify_all)
+            if waiter is None:
+                return self._record_wait(0.0, priority)
+            try:
+                while True:
+                    timeout = self._try_admit(waiter, started)
+                    if timeout is None:
+                        return self._record_wait(self.clock() - started, priority)
+                    self._cond.wait(timeout)
+            except BaseException:
+                self._discard(waiter)
+                raise
+
+    async def aadmit(self, tokens, priority=PRIORITY_INTERACTIVE):
+        """
+        Async version of admit
+        """
+        if not self.enabled:
+            return 0.0
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        started = self.clock()
+
+        def wake():
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Event loop already closed
+                pass
+
+        with self._lock:
+            waiter = self._enqueue(tokens, priority, wake)
+            if waiter is None:
+                return self._record_wait(0.0, priority)
+        try:
+            while True:
+                with self._lock:
+                    timeout = self._try_admit(waiter, started)
+                    if timeout is None:
+                        return self._record_wait(self.clock() - started, priority)
+                    event.clear()
+                try:
+                    await asyncio.wait_for(event.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            with self._lock:
+                self._discard(waiter)
+            raise
+
+    def try_admit(self, tokens):
+        """
+        Admit a call only if it fits right away, without queueing behind waiting calls
+        :param tokens: estimated tokens of the call, prompt and completion
+        :return: True if admitted
+        """
+        if not self.enabled:
+            return True
+        with self._lock:
+            tokens = min(tokens, self.tpm) if self.tpm > 0 else tokens
+            self._refill()
+            if self._queue or not self._fits(tokens):
+                return False
+            self._take(tokens)
+            return True
+
+    def settle(self, estimated_tokens, actual_tokens):
+        """
+        Correct the token bucket once the real usage of an admitted call is known
+        :param estimated_tokens: tokens taken at admission
+        :param actual_tokens:
+        """
+        if self.tpm <= 0 or not actual_tokens:
+            return
+        with self._lock:
+            self._refill()
+            # May go negative, later calls then wait for the overdraft to refill
+            self._tokens = min(self._tokens + estimated_tokens - actual_tokens, float(self.tpm))
+            self._wake_all()
+
+    def stats(self):
+        with self._lock:
+            self._refill()
+            waits = sorted(self._waits)
+            return {
+                "queue_depth": len(self._queue),
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "queued": self.queued,
+                "tokens_available": self._tokens if self.tpm > 0 else None,
+                "requests_available": self._requests if self.rpm > 0 else None,
+                "avg_wait_ms": sum(waits) / len(waits) * 1000 if waits else 0.0,
+                "p95_wait_ms": waits[int(len(waits) * 0.95)] * 1000 if waits else 0.0,
+                "max_wait_ms": waits[-1] * 1000 if waits else 0.0,
+            }
+
+    def _refill(self):
+        now = self.clock()
+        elapsed = now - self._refilled_at
+        self._refilled_at = now
+        if self.tpm > 0:
+            self._tokens = min(self._tokens + elapsed * self.tpm / 60, float(self.tpm))
+        if self.rpm > 0:
+            self._requests = min(self._requests + elapsed * self.rpm / 60, float(self.rpm))
+
+    def _fits(self, tokens):
+        return (self.tpm <= 0 or self._tokens >= tokens) and (self.rpm <= 0 or self._requests >= 1)
+
+    def _take(self, tokens):
+        if self.tpm > 0:
+            self._tokens -= tokens
+        if self.rpm > 0:
+            self._requests -= 1
+        self.admitted += 1
+
+    def _seconds_until(self, tokens, requests):
+        """
+        Time for the buckets to refill enough for ``tokens`` and ``requests``
+        """
+        wait = 0.0
+        if self.tpm > 0:
+            wait = max(wait, (tokens - self._tokens) * 60 / self.tpm)
+        if self.rpm > 0:
+            wait = max(wait, (requests - self._requests) * 60 / self.rpm)
+        return wait
+
+    def _enqueue(self, tokens, priority, wake):
+        """
+        Admit right away or queue a waiter; must hold the lock
+        :return: None if admitted, else the queued waiter
+        """
+        # A call larger than the whole bucket would never fit
+        tokens = min(tokens, self.tpm) if self.tpm > 0 else tokens
+        self._refill()
+        if not self._queue and self._fits(tokens):
+            self._take(tokens)
+            return None
+
+        ahead = [waiter for waiter in self._queue if waiter.priority <= priority]
+        expected_wait = self._seconds_until(tokens + sum(w.tokens for w in ahead), len(ahead) + 1)
+        if expected_wait > self._max_wait(priority):
+            self.rejected += 1
+            raise AdmissionRejected(expected_wait)
+
+        waiter = _Waiter(priority, next(self._seq), tokens, wake)
+        heapq.heappush(self._queue, waiter)
+        self.queued += 1
+        self._wake_all()
+        return waiter
+
+    def _try_admit(self, waiter, started):
+        """
+        Admit the waiter if it is first in line and fits; must hold the lock
+        :return: None if admitted, else seconds to wait before checking again
+        """
+        self._refill()
+        if self._queue[0] is waiter and self._fits(waiter.tokens):
+            heapq.heappop(self._queue)
+            self._take(waiter.tokens)
+            self._wake_all()
+            return None
+
+        remaining = self._max_wait(waiter.priority) - (self.clock() - started)
+        if remaining <= 0:
+            self.rejected += 1
+            raise AdmissionRejected(self.clock() - started)
+        if self._queue[0] is waiter:
+            return min(max(self._seconds_until(waiter.tokens, 1), 0.001), remaining)
+        # Not first in line: woken when the queue changes, the timeout only enforces max_wait
+        return remaining
+
+    def _discard(self, waiter):
+        if waiter in self._queue:
+            self._queue.remove(waiter)
+            heapq.heapify(self._queue)
+            self._wake_all()
+
+    def _wake_all(self):
+        for waiter in self._queue:
+            waiter.wake()
+
+    def _max_wait(self, priority):
+        return self.max_wait.get(priority, self.max_wait[PRIORITY_BACKGROUND])
+
+    def _record_wait(self, waited, priority):
+        self._waits.append(waited)
+        ADMISSION_WAIT.labels(PRIORITY_LABELS.get(priority, str(priority))).observe(waited)
+        return waited
+
+
+model_admission = AdmissionController(
+    tpm=int(os.getenv("MODEL_TPM_LIMIT", "0")),
+    rpm=int(os.getenv("MODEL_RPM_LIMIT", "0")),
+    max_wait={
+        PRIORITY_INTERACTIVE: float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "10")),
+        PRIORITY_BACKGROUND: float(os.getenv("ADMISSION_BACKGROUND_MAX_WAIT_SECONDS", "120")),
+    },
+)
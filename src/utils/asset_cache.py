@@ -0,0 +1,217 @@
+import json
+import os
+import threading
+import time
+import weakref
+
+from utils.logger import LOG
+
+_MISSING = object()
+
+
+def _signature(path):
+    """
+    What identifies a version of a file on disk
+    :return: (mtime_ns, size), or None when the file does not exist
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _parse_json(text):
+    return json.loads(text)
+
+
+class _Asset:
+    __slots__ = ("value", "signature", "checked_at")
+
+    def __init__(self, value, signature, checked_at):
+        self.value = value
+        self.signature = signature
+        self.checked_at = checked_at
+
+
+class AssetCache:
+    """
+    In-memory cache of prompt and content files.
+
+    Files are read once and served from memory. A cached file is checked against its
+    mtime and size at most every ``revalidate_seconds``: on the read path when it is due,
+    and for every cached file by the background thread of ``start``, so changes are seen
+    even for files nobody reads again (an agent's prompt). When a file changes, the new
+    content is loaded and the callbacks registered with ``watch`` are called with its
+    path. Missing files are cached as missing and picked up once they appear.
+    """
+    def __init__(self, revalidate_seconds=2.0, clock=time.monotonic):
+        self.revalidate_seconds = revalidate_seconds
+        self.clock = clock
+
+        self._assets = {}
+        self._watchers = {}
+        self._lock = threading.RLock()
+        self._thread = None
+        self._stopped = threading.Event()
+        self.hits = 0
+        self.loads = 0
+        self.reloads = 0
+
+    def read_text(self, path):
+        """
+        Content of a text file
+        :param path:
+        :return: str
+        :raises FileNotFoundError:
+        """
+        return self._get(path, None)
+
+    def read_json(self, path):
+        """
+        Parsed content of a JSON file
+        :param path:
+        :return: parsed value
+        :raises FileNotFoundError:
+        :raises json.JSONDecodeError:
+        """
+        return self._get(path, _parse_json)
+
+    def watch(self, path, callback):
+        """
+        Call ``callback(path)`` whenever the file changes. Bound methods are held weakly,
+        so watching does not keep an agent alive
+        :param path:
+        :param callback:
+        """
+        ref = weakref.WeakMethod(callback) if hasattr(callback, "__self__") else (lambda: callback)
+        with self._lock:
+            self._watchers.setdefault(os.path.abspath(path), []).append(ref)
+
+    def revalidate(self, force=True):
+        """
+        Reload cached files that changed on disk and notify their watchers
+        :param force: check every file, not only those due for revalidation
+        :return: paths that changed
+        """
+        now = self.clock()
+        with self._lock:
+            keys = [key for key, asset in self._assets.items()
+                    if force or now - asset.checked_at >= self.revalidate_seconds]
+        changed = [path for path, parse in keys if self._refresh(path, parse, now)]
+        for path in dict.fromkeys(changed):
+            self._notify(path)
+        return changed
+
+    def start(self):
+        """
+        Revalidate every cached file from a background thread
+        """
+        if self._thread is not None or self.revalidate_seconds <= 0:
+            return
+        self._thread = threading.Thread(target=self._run, name="asset-cache", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def clear(self):
+        with self._lock:
+            self._assets.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "assets": len(self._assets),
+                "hits": self.hits,
+                "loads": self.loads,
+                "reloads": self.reloads,
+            }
+
+    def _run(self):
+        while not self._stopped.wait(self.revalidate_seconds):
+            try:
+                self.revalidate()
+            except Exception as e:
+                LOG.error(f"[AssetCache] revalidation failed: {e}")
+
+    def _get(self, path, parse):
+        key = (os.path.abspath(path), parse)
+        now = self.clock()
+        with self._lock:
+            asset = self._assets.get(key)
+            if asset is not None and now - asset.checked_at < self.revalidate_seconds:
+                self.hits += 1
+                return self._value(asset, path)
+
+        if asset is None:
+            asset = self._load(key[0], parse, now)
+            with self._lock:
+                self._assets[key] = asset
+                self.loads += 1
+        elif self._refresh(key[0], parse, now):
+            self._notify(key[0])
+        with self._lock:
+            return self._value(self._assets[key], path)
+
+    @staticmethod
+    def _value(asset, path):
+        if asset.value is _MISSING:
+            raise FileNotFoundError(path)
+        return asset.value
+
+    @staticmethod
+    def _load(path, parse, now):
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                text = file.read()
+        except FileNotFoundError:
+            return _Asset(_MISSING, None, now)
+        return _Asset(parse(text) if parse else text, _signature(path), now)
+
+    def _refresh(self, path, parse, now):
+        """
+        Reload one cached file if its signature changed
+        :return: True if the content changed
+        """
+        key = (path, parse)
+        signature = _signature(path)
+        with self._lock:
+            asset = self._assets.get(key)
+            if asset is None:
+                return False
+            asset.checked_at = now
+            if signature is not None and signature == asset.signature:
+                return False
+            if signature is None and asset.value is _MISSING:
+                return False
+        try:
+            fresh = self._load(path, parse, now)
+        except ValueError as e:
+            # Likely a file caught mid-write; keep serving the last good version
+            LOG.error(f"[AssetCache] keeping previous {path}: {e}")
+            return False
+        with self._lock:
+            previous = self._assets.get(key)
+            self._assets[key] = fresh
+            self.reloads += 1
+        if previous is not None and previous.value == fresh.value:
+            return False
+        LOG.info(f"[AssetCache] reloaded {path}")
+        return True
+
+    def _notify(self, path):
+        with self._lock:
+            refs = list(self._watchers.get(path, []))
+            self._watchers[path] = [ref for ref in refs if ref() is not None]
+        for ref in refs:
+            callback = ref()
+            if callback is None:
+                continue
+            try:
+                callback(path)
+            except Exception as e:
+                LOG.error(f"[AssetCache] reload callback for {path} failed: {e}")
+
+
+asset_cache = AssetCache(revalidate_seconds=float(os.getenv("ASSET_REVALIDATE_SECONDS", "2")))
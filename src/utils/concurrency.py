@@ -0,0 +1,112 @@
+import asyncio
+import os
+import threading
+from collections import deque
+
+
+class ModelCallLimiter:
+    """
+    Global cap on outstanding model calls, shared by sync threads and asyncio tasks.
+
+    Use ``with limiter:`` on worker threads and ``async with limiter:`` on the event loop;
+    both draw from the same pool of slots and wait in a single FIFO queue, so neither kind
+    can starve the other. ``max_in_flight <= 0`` disables the limit.
+    """
+    def __init__(self, max_in_flight):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        # (loop, future) for tasks, (None, threading.Event) for threads
+        self._waiters = deque()
+
+    def _try_acquire(self):
+        if self.max_in_flight <= 0 or self.in_flight < self.max_in_flight:
+            self.in_flight += 1
+            return True
+        return False
+
+    def try_acquire(self):
+        """
+        Take a slot only if one is free right away, without queueing behind waiters
+        :return: True if a slot was taken, to be given back with release()
+        """
+        with self._lock:
+            if self._waiters:
+                return False
+            return self._try_acquire()
+
+    def acquire(self):
+        with self._lock:
+            if not self._waiters and self._try_acquire():
+                return
+            event = threading.Event()
+            self._waiters.append((None, event))
+        # Set once release() hands the slot over
+        event.wait()
+
+    async def aacquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._waiters and self._try_acquire():
+                return
+            future = loop.create_future()
+            self._waiters.append((loop, future))
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before the cancellation landed
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                # The slot is handed over directly to the oldest waiter, in_flight stays unchanged
+                loop, waiter = self._waiters.popleft()
+                if loop is None:
+                    waiter.set()
+                    return
+                try:
+                    loop.call_soon_threadsafe(self._hand_over, waiter)
+                    return
+                except RuntimeError:
+                    # Event loop already closed, try the next waiter
+                    continue
+
+            self.in_flight -= 1
+
+    def _hand_over(self, future):
+        if future.done():
+            self.release()
+        else:
+            future.set_result(None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_in_flight": self.max_in_flight,
+                "in_flight": self.in_flight,
+                "waiting_sync": sum(1 for loop, _ in self._waiters if loop is None),
+                "waiting_async": sum(1 for loop, _ in self._waiters if loop is not None),
+            }
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    async def __aenter__(self):
+        await self.aacquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+model_call_limiter = ModelCallLimiter(int(os.getenv("MODEL_MAX_CONCURRENCY", "64")))
+
+__all__ = ["ModelCallLimiter", "model_call_limiter"]
@@ -0,0 +1,258 @@
+import asyncio
+import importlib.util
+import os
+import threading
+import time
+
+import httpx
+
+from utils.logger import LOG
+
+
+class _TrackedTransport(httpx.BaseTransport):
+    def __init__(self, inner, on_request):
+        self.inner = inner
+        self.on_request = on_request
+
+    def handle_request(self, request):
+        self.on_request()
+        return self.inner.handle_request(request)
+
+    def close(self):
+        self.inner.close()
+
+
+class _AsyncTrackedTransport(httpx.AsyncBaseTransport):
+    def __init__(self, inner, on_request):
+        self.inner = inner
+        self.on_request = on_request
+
+    async def handle_async_request(self, request):
+        self.on_request()
+        return await self.inner.handle_async_request(request)
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+def _pool_stats(transport):
+    # httpcore keeps its pool behind a private attribute; custom transports have none
+    pool = getattr(transport, "_pool", None)
+    connections = list(getattr(pool, "connections", []))
+    idle = sum(1 for connection in connections if connection.is_idle())
+    return {"connections": len(connections), "idle": idle, "active": len(connections) - idle}
+
+
+class PooledHttpClients:
+    """
+    One sync and one async httpx client with tuned pooling, shared by every OpenAI client.
+
+    Both clients keep up to ``max_keepalive_connections`` idle connections alive for
+    ``keepalive_expiry`` seconds, so bursts after a quiet period reuse warm TLS sessions
+    instead of handshaking again. The time of the last request on each pool is tracked for
+    the ``ConnectionWarmer``.
+    """
+    def __init__(self, max_connections=100, max_keepalive_connections=20, keepalive_expiry=90.0,
+                 connect_timeout=5.0, read_timeout=60.0, http2=False, transport=None, async_transport=None,
+                 clock=time.monotonic):
+        if http2 and importlib.util.find_spec("h2") is None:
+            LOG.warning("[HttpPool] HTTP/2 needs the 'h2' package (pip install httpx[http2]), using HTTP/1.1")
+            http2 = False
+
+        self.max_connections = max_connections
+        self.http2 = http2
+        self.clock = clock
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+
+        self.last_request_at = clock()
+        self.last_async_request_at = clock()
+        self.requests = 0
+        self.async_requests = 0
+
+        self._transport = transport or httpx.HTTPTransport(limits=self.limits, http2=http2)
+        self._async_transport = async_transport or httpx.AsyncHTTPTransport(limits=self.limits, http2=http2)
+        self.client = httpx.Client(
+            transport=_TrackedTransport(self._transport, self._on_request),
+            timeout=self.timeout,
+        )
+        self.async_client = httpx.AsyncClient(
+            transport=_AsyncTrackedTransport(self._async_transport, self._on_async_request),
+            timeout=self.timeout,
+        )
+
+    def _on_request(self):
+        self.requests += 1
+        self.last_request_at = self.clock()
+
+    def _on_async_request(self):
+        self.async_requests += 1
+        self.last_async_request_at = self.clock()
+
+    def stats(self):
+        sync_pool = _pool_stats(self._transport)
+        async_pool = _pool_stats(self._async_transport)
+        active = sync_pool["active"] + async_pool["active"]
+        return {
+            "max_connections": self.max_connections,
+            "requests": self.requests,
+            "async_requests": self.async_requests,
+            "sync_connections": sync_pool["connections"],
+            "sync_idle": sync_pool["idle"],
+            "sync_utilization": self._utilization(sync_pool["active"]),
+            "async_connections": async_pool["connections"],
+            "async_idle": async_pool["idle"],
+            "async_utilization": self._utilization(async_pool["active"]),
+            "utilization": self._utilization(active) / 2,
+        }
+
+    def _utilization(self, active):
+        return active / self.max_connections if self.max_connections else 0.0
+
+
+class ConnectionWarmer:
+    """
+    Keeps the pooled connections to the model endpoint open.
+
+    ``warm`` sends ``connections`` concurrent cheap requests (listing models costs no
+    tokens) so that many connections are established and kept alive. After start-up, a
+    pool that has been idle for ``interval`` seconds is warmed again, which keeps its
+    connections from hitting the keep-alive expiry. The async pool belongs to the event
+    loop that serves the app, so ``ensure_async_started`` must run on that loop.
+    """
+    def __init__(self, clients, url, headers=None, interval=30.0, connections=2):
+        self.clients = clients
+        self.url = url
+        self.headers = headers or {}
+        self.interval = interval
+        self.connections = connections
+
+        self.warmups = 0
+        self.failures = 0
+        self.last_warmup_ms = None
+        # Per pool, "sync" and "async"
+        self.pool_warmups = {"sync": 0, "async": 0}
+        self.pool_failures = {"sync": 0, "async": 0}
+
+        self._thread = None
+        self._task = None
+        self._stopped = threading.Event()
+
+    def warm(self):
+        started = time.perf_counter()
+        threads = [threading.Thread(target=self._get, daemon=True) for _ in range(self.connections)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self._record(started, "sync")
+
+    async def awarm(self):
+        started = time.perf_counter()
+        await asyncio.gather(*(self._aget() for _ in range(self.connections)))
+        self._record(started, "async")
+
+    def tick(self):
+        """
+        Warm the sync pool if it has been idle for a full interval
+        :return: True if a warm-up ran
+        """
+        if self.clients.clock() - self.clients.last_request_at < self.interval:
+            return False
+        self.warm()
+        return True
+
+    async def atick(self):
+        if self.clients.clock() - self.clients.last_async_request_at < self.interval:
+            return False
+        await self.awarm()
+        return True
+
+    def start(self):
+        """
+        Warm the sync pool now and keep it warm from a background thread
+        """
+        if self._thread is not None or self.interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._run, name="connection-warmer", daemon=True)
+        self._thread.start()
+
+    def ensure_async_started(self):
+        """
+        Warm the async pool now and keep it warm from a task on the running event loop
+        """
+        if self.interval <= 0 or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.get_running_loop().create_task(self._arun())
+
+    def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    def stats(self):
+        return {
+            "warmups": self.warmups,
+            "failures": self.failures,
+            "last_warmup_ms": self.last_warmup_ms,
+            "sync_warmups": self.pool_warmups["sync"],
+            "sync_failures": self.pool_failures["sync"],
+            "async_warmups": self.pool_warmups["async"],
+            "async_failures": self.pool_failures["async"],
+            **self.clients.stats(),
+        }
+
+    def _run(self):
+        self.warm()
+        while not self._stopped.wait(self.interval):
+            self.tick()
+            LOG.debug(f"[HttpPool] {self.clients.stats()}")
+
+    async def _arun(self):
+        await self.awarm()
+        while not self._stopped.is_set():
+            await asyncio.sleep(self.interval)
+            await self.atick()
+
+    def _get(self):
+        try:
+            self.clients.client.get(self.url, headers=self.headers).close()
+        except httpx.HTTPError as e:
+            self._failed("sync")
+            LOG.warning(f"[HttpPool] warm-up request failed: {e}")
+
+    async def _aget(self):
+        try:
+            response = await self.clients.async_client.get(self.url, headers=self.headers)
+            await response.aclose()
+        except httpx.HTTPError as e:
+            self._failed("async")
+            LOG.warning(f"[HttpPool] async warm-up request failed: {e}")
+
+    def _failed(self, pool):
+        self.failures += 1
+        self.pool_failures[pool] += 1
+
+    def _record(self, started, pool):
+        self.warmups += 1
+        self.pool_warmups[pool] += 1
+        self.last_warmup_ms = (time.perf_counter() - started) * 1000
+
+
+def http_clients_from_env():
+    """
+    Shared HTTP clients configured by AZURE_HTTP_* variables
+    :return: PooledHttpClients
+    """
+    return PooledHttpClients(
+        max_connections=int(os.getenv("AZURE_HTTP_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("AZURE_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")),
+        keepalive_expiry=float(os.getenv("AZURE_HTTP_KEEPALIVE_EXPIRY_SECONDS", "90")),
+        connect_timeout=float(os.getenv("AZURE_HTTP_CONNECT_TIMEOUT", "5")),
+        read_timeout=float(os.getenv("AZURE_HTTP_READ_TIMEOUT", "60")),
+        http2=os.getenv("AZURE_HTTP2", "false").lower() == "true",
+    )
@@ -0,0 +1,78 @@
+import os
+import re
+import uuid
+from http.cookies import CookieError, SimpleCookie
+
+LEARNER_COOKIE = os.getenv("LEARNER_COOKIE_NAME", "lm_learner")
+LEARNER_COOKIE_MAX_AGE = int(os.getenv("LEARNER_COOKIE_MAX_AGE_SECONDS", str(365 * 24 * 3600)))
+
+_LEARNER_ID = re.compile(r"[0-9a-f]{32}")
+
+
+def _valid(value):
+    return isinstance(value, str) and _LEARNER_ID.fullmatch(value) is not None
+
+
+def learner_id(request):
+    """
+    Stable id of the learner behind a request: the learner cookie, which outlives page
+    reloads and server restarts, else the page's session hash
+    :param request: gr.Request
+    :return: learner id, or None without a request
+    """
+    try:
+        cookies = dict(getattr(request, "cookies", None) or {})
+    except (TypeError, ValueError):
+        cookies = {}
+    value = cookies.get(LEARNER_COOKIE)
+    if _valid(value):
+        return value
+    return getattr(request, "session_hash", None)
+
+
+class LearnerCookieMiddleware:
+    """
+    ASGI middleware giving each browser a random learner id cookie.
+
+    The cookie is only set on page (text/html) responses, so the requests a page makes
+    afterwards all carry the same id instead of racing to set different ones.
+    """
+    def __init__(self, app, cookie_name=LEARNER_COOKIE, max_age=LEARNER_COOKIE_MAX_AGE):
+        self.app = app
+        self.cookie_name = cookie_name
+        self.max_age = max_age
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self._has_cookie(scope):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and self._is_page(message):
+                cookie = (
+                    f"{self.cookie_name}={uuid.uuid4().hex}; Path=/; Max-Age={self.max_age}; "
+                    f"HttpOnly; SameSite=Lax"
+                )
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode())]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+    def _has_cookie(self, scope):
+        for name, value in scope.get("headers", []):
+            if name == b"cookie":
+                cookie = SimpleCookie()
+                try:
+                    cookie.load(value.decode("latin-1"))
+                except CookieError:
+                    continue
+                if self.cookie_name in cookie and _valid(cookie[self.cookie_name].value):
+                    return True
+        return False
+
+    @staticmethod
+    def _is_page(message):
+        for name, value in message.get("headers", []):
+            if name.lower() == b"content-type":
+                return value.startswith(b"text/html")
+        return False
@@ -1,16 +1,211 @@
+import atexit
+import json
+import os
+import queue
+import random
 import sys
+import threading
 
 from loguru import logger
 
 log_format = "{time:YYYY-MM-DD HH:mm:ss} | {level} | {module}:{function}:{line} - {message}"
 
-logger.remove()
 
-logger.add(sys.stdout, level="DEBUG", format=log_format, colorize=True)
-logger.add(sys.stderr, level="ERROR", format=log_format, colorize=True)
+def json_format(record):
+    """
+    One JSON object per line, with the fields bound to the record (turn id, timings, ...)
+    """
+    fields = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "location": f"{record['module']}:{record['function']}:{record['line']}",
+        "message": record["message"],
+        **record["extra"],
+    }
+    if record["exception"] is not None:
+        fields["exception"] = repr(record["exception"].value)
+    record["extra"]["_json"] = json.dumps(fields, ensure_ascii=False, default=str)
+    return "{extra[_json]}\n"
 
-logger.add("logs/app.log", rotation="1 MB", level="DEBUG", format=log_format)
+
+class RotatingFile:
+    """
+    Append-only log file, rotated to ``path.1`` ... ``path.<backups>`` when it reaches ``max_bytes``
+    """
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backups=5):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = open(path, "a", encoding="utf-8")
+        self.size = self.file.tell()
+
+    def write(self, text):
+        if self.max_bytes and self.size and self.size + len(text) > self.max_bytes:
+            self._rotate()
+        self.file.write(text)
+        self.size += len(text)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def _rotate(self):
+        self.file.close()
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{index}"):
+                os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.size = 0
+
+
+class BackgroundWriter:
+    """
+    Log sink whose writes are queued and done by a daemon thread, so a turn never waits
+    on a slow terminal, pipe or disk. Records are formatted by loguru before they are
+    queued; only the write is deferred. Pending lines are written at exit
+    """
+    def __init__(self, stream, name="log-writer", close_stream=False):
+        self.stream = stream
+        self.close_stream = close_stream
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def write(self, message):
+        self._queue.put(str(message))
+
+    def drain(self, timeout=5.0):
+        """
+        Wait until everything queued so far is written
+        :param timeout: seconds
+        :return: True if drained in time
+        """
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            while True:
+                if item is None:
+                    self._flush()
+                    if self.close_stream:
+                        self.stream.close()
+                    return
+                if isinstance(item, threading.Event):
+                    self._flush()
+                    item.set()
+                else:
+                    try:
+                        self.stream.write(item)
+                    except (OSError, ValueError):
+                        pass
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            # Flushed once per batch, not per line
+            self._flush()
+
+    def _flush(self):
+        try:
+            self.stream.flush()
+        except (OSError, ValueError):
+            pass
+
+
+_writers = []
+
+
+def flush_logs(timeout=5.0):
+    """
+    Wait for the background writers to write what is queued
+    """
+    for writer in list(_writers):
+        writer.drain(timeout)
+
+
+def _close_writers():
+    while _writers:
+        _writers.pop().close()
+
+
+atexit.register(_close_writers)
+
+
+def configure_logging(level=None, structured=None, enqueue=None, log_file=None):
+    """
+    Set up the stdout, stderr and file sinks from LOG_* settings
+    :param level: overrides LOG_LEVEL
+    :param structured: JSON lines instead of text, overrides LOG_FORMAT=json
+    :param enqueue: write from background threads, overrides LOG_ENQUEUE
+    :param log_file: overrides LOG_FILE, empty for no file sink
+    """
+    level = level or os.getenv("LOG_LEVEL", "INFO").upper()
+    if structured is None:
+        structured = os.getenv("LOG_FORMAT", "text") == "json"
+    if enqueue is None:
+        enqueue = os.getenv("LOG_ENQUEUE", "true").lower() == "true"
+    if log_file is None:
+        log_file = os.getenv("LOG_FILE", "logs/app.log")
+
+    logger.remove()
+    _close_writers()
+
+    def sink(stream, name, close_stream=False):
+        if not enqueue:
+            return stream
+        writer = BackgroundWriter(stream, name=name, close_stream=close_stream)
+        _writers.append(writer)
+        return writer
+
+    text_format = json_format if structured else log_format
+    logger.add(sink(sys.stdout, "log-stdout"), level=level, format=text_format, colorize=not structured)
+    logger.add(sink(sys.stderr, "log-stderr"), level="ERROR", format=text_format, colorize=not structured)
+    if log_file:
+        log = RotatingFile(
+            log_file,
+            max_bytes=int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+            backups=int(os.getenv("LOG_BACKUP_COUNT", "5")),
+        )
+        logger.add(sink(log, "log-file", close_stream=True), level=level, format=text_format, colorize=False)
+
+
+RESPONSE_SAMPLE_RATE = float(os.getenv("LOG_RESPONSE_SAMPLE_RATE", "0.05"))
+RESPONSE_MAX_CHARS = int(os.getenv("LOG_RESPONSE_MAX_CHARS", "200"))
+
+
+def response_preview(text, sample_rate=None, max_chars=None):
+    """
+    Part of a model response worth logging: only a sample of responses, truncated
+    :param text:
+    :param sample_rate: share of responses logged, defaults to LOG_RESPONSE_SAMPLE_RATE
+    :param max_chars: defaults to LOG_RESPONSE_MAX_CHARS (0 = no limit)
+    :return: str, or None when this response is not sampled
+    """
+    sample_rate = RESPONSE_SAMPLE_RATE if sample_rate is None else sample_rate
+    max_chars = RESPONSE_MAX_CHARS if max_chars is None else max_chars
+    if sample_rate <= 0 or (sample_rate < 1 and random.random() >= sample_rate):
+        return None
+    if max_chars and len(text) > max_chars:
+        return text[:max_chars] + f"... ({len(text)} chars)"
+    return text
+
+
+configure_logging()
 
 LOG = logger
 
-__all__ = ["LOG"]
\ No newline at end of file
+__all__ = ["LOG"]
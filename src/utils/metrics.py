@@ -0,0 +1,244 @@
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.process_collector import ProcessCollector
+
+from utils.tracing import set_attributes
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0)
+
+registry = CollectorRegistry()
+ProcessCollector(registry=registry)
+
+TURN_LATENCY = Histogram(
+    "language_mentor_turn_latency_seconds", "Duration of a chat turn, from input to the full reply",
+    ["agent"], buckets=LATENCY_BUCKETS, registry=registry,
+)
+TIME_TO_FIRST_TOKEN = Histogram(
+    "language_mentor_time_to_first_token_seconds", "Time from input to the first streamed reply chunk",
+    ["agent"], buckets=LATENCY_BUCKETS, registry=registry,
+)
+MODEL_LATENCY = Histogram(
+    "language_mentor_model_latency_seconds", "Duration of model calls, without admission and history work",
+    ["agent"], buckets=LATENCY_BUCKETS, registry=registry,
+)
+TURNS = Counter(
+    "language_mentor_turns", "Chat turns by outcome: ok, cached, rejected or error",
+    ["agent", "outcome"], registry=registry,
+)
+PROMPT_TOKENS = Counter(
+    "language_mentor_prompt_tokens", "Prompt tokens sent to the model, reported or estimated",
+    ["agent"], registry=registry,
+)
+COMPLETION_TOKENS = Counter(
+    "language_mentor_completion_tokens", "Completion tokens received from the model, reported or estimated",
+    ["agent"], registry=registry,
+)
+ERRORS = Counter(
+    "language_mentor_model_errors", "Failed model calls by error type",
+    ["agent", "error"], registry=registry,
+)
+MODEL_CALLS_IN_FLIGHT = Gauge(
+    "language_mentor_model_calls_in_flight", "Model calls currently running",
+    ["agent"], registry=registry,
+)
+ADMISSION_WAIT = Histogram(
+    "language_mentor_admission_wait_seconds", "Time model calls waited for TPM/RPM quota",
+    ["priority"], buckets=(0.001, 0.01, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0), registry=registry,
+)
+SUMMARY_TOKENS_SAVED = Histogram(
+    "language_mentor_summary_tokens_saved", "Prompt tokens saved per turn by the rolling summary memory",
+    ["agent"], buckets=(0, 100, 250, 500, 1000, 2000, 4000, 8000), registry=registry,
+)
+SUMMARIES = Counter(
+    "language_mentor_summaries", "Rolling summaries written by the summary memory",
+    ["agent"], registry=registry,
+)
+API_WEBSOCKETS_OPEN = Gauge(
+    "language_mentor_api_websockets_open", "Open WebSocket connections of the headless API",
+    registry=registry,
+)
+
+
+class Turn:
+    """
+    Measurements of one chat turn of an agent
+    """
+    def __init__(self, agent):
+        self.id = uuid.uuid4().hex[:12]
+        self.agent = agent
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.latency = None
+        self.outcome = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.backend = None
+
+    @contextmanager
+    def model_call(self):
+        """
+        Count the call in flight and time it; failures are counted by error type
+        """
+        MODEL_CALLS_IN_FLIGHT.labels(self.agent).inc()
+        started = time.perf_counter()
+        try:
+            yield self
+        except Exception as e:
+            self._failed(e)
+            raise
+        finally:
+            MODEL_CALLS_IN_FLIGHT.labels(self.agent).dec()
+            MODEL_LATENCY.labels(self.agent).observe(time.perf_counter() - started)
+
+    @asynccontextmanager
+    async def amodel_call(self):
+        """
+        Async version of model_call, for ``async with`` blocks
+        """
+        with self.model_call():
+            yield self
+
+    def first_token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+            TIME_TO_FIRST_TOKEN.labels(self.agent).observe(self.first_token_at - self.started)
+
+    def finish(self, outcome="ok", prompt_tokens=0, completion_tokens=0, backend=None):
+        self.latency = time.perf_counter() - self.started
+        self.outcome, self.prompt_tokens, self.completion_tokens = outcome, prompt_tokens, completion_tokens
+        self.backend = backend
+        TURN_LATENCY.labels(self.agent).observe(self.latency)
+        TURNS.labels(self.agent, outcome).inc()
+        if prompt_tokens:
+            PROMPT_TOKENS.labels(self.agent).inc(prompt_tokens)
+        if completion_tokens:
+            COMPLETION_TOKENS.labels(self.agent).inc(completion_tokens)
+        # The same numbers on the turn's trace span, when it is sampled
+        set_attributes({
+            "turn.id": self.id,
+            "turn.outcome": outcome,
+            "gen_ai.usage.input_tokens": prompt_tokens,
+            "gen_ai.usage.output_tokens": completion_tokens,
+        })
+
+    def log_fields(self):
+        """
+        The turn's measurements as structured log fields
+        :return: dict
+        """
+        return {
+            "turn_id": self.id,
+            "agent": self.agent,
+            "outcome": self.outcome,
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "ttft_ms": round((self.first_token_at - self.started) * 1000, 1) if self.first_token_at else None,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "backend": self.backend,
+        }
+
+    def _failed(self, error):
+        ERRORS.labels(self.agent, type(error).__name__).inc()
+        TURNS.labels(self.agent, "error").inc()
+
+
+class SessionStoreCollector:
+    """
+    Session gauges read from the session store at scrape time
+    """
+    def __init__(self, store):
+        self.store = store
+
+    def collect(self):
+        stats = self.store.stats()
+        for key, description in (
+            ("sessions", "Chat sessions held by the session store"),
+            ("messages", "Messages held by the session store"),
+            ("bytes", "Message content bytes held by the session store"),
+        ):
+            yield GaugeMetricFamily(f"language_mentor_session_store_{key}", description, value=stats[key])
+
+        active = GaugeMetricFamily(
+            "language_mentor_active_sessions", "Chat sessions held by the session store per agent", labels=["agent"]
+        )
+        per_agent = {}
+        for session_id in self.store.session_ids():
+            agent = session_id.split(":", 1)[0]
+            per_agent[agent] = per_agent.get(agent, 0) + 1
+        for agent, count in sorted(per_agent.items()):
+            active.add_metric([agent], count)
+        yield active
+
+
+class AdmissionCollector:
+    """
+    Admission queue gauges read from the admission controller at scrape time
+    """
+    def __init__(self, admission):
+        self.admission = admission
+
+    def collect(self):
+        stats = self.admission.stats()
+        yield GaugeMetricFamily(
+            "language_mentor_admission_queue_depth", "Model calls waiting for TPM/RPM quota",
+            value=stats["queue_depth"],
+        )
+        for key, description in (
+            ("admitted", "Model calls admitted against the TPM/RPM quotas"),
+            ("rejected", "Model calls rejected because their quota wait was too long"),
+            ("queued", "Model calls that had to queue for quota"),
+        ):
+            yield CounterMetricFamily(f"language_mentor_admission_{key}", description, value=stats[key])
+
+
+class HttpPoolCollector:
+    """
+    Connection pool gauges and warm-up counters of the model HTTP clients, read at scrape time
+    """
+    POOLS = ("sync", "async")
+
+    def __init__(self, warmer):
+        self.warmer = warmer
+
+    def collect(self):
+        stats = self.warmer.stats()
+        for key, name, description, family in (
+            ("connections", "http_pool_connections", "Open connections to the model endpoint", GaugeMetricFamily),
+            ("idle", "http_pool_idle_connections", "Idle kept-alive connections to the model endpoint", GaugeMetricFamily),
+            ("utilization", "http_pool_utilization", "Share of the pool's max connections in use", GaugeMetricFamily),
+            ("warmups", "http_pool_warmups", "Connection warm-up runs", CounterMetricFamily),
+            ("failures", "http_pool_warmup_failures", "Failed connection warm-up requests", CounterMetricFamily),
+        ):
+            metric = family(f"language_mentor_{name}", description, labels=["pool"])
+            for pool in self.POOLS:
+                metric.add_metric([pool], stats[f"{pool}_{key}"])
+            yield metric
+
+
+def start_turn(agent):
+    """
+    Start measuring a chat turn
+    :param agent: agent name, the ``agent`` label
+    :return: Turn
+    """
+    return Turn(agent)
+
+
+def register_app_collectors(store, admission, warmer=None):
+    """
+    Expose the session store, admission queue and model connection pools on /metrics
+    """
+    registry.register(SessionStoreCollector(store))
+    registry.register(AdmissionCollector(admission))
+    if warmer is not None:
+        registry.register(HttpPoolCollector(warmer))
+
+
+async def metrics_endpoint(request):
+    from starlette.responses import Response
+
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,301 @@
+"""
+OpenTelemetry spans for chat turns.
+
+Tracing is off unless TRACING_ENABLED=true; ``span`` and ``traced_stream`` then cost a
+single check. When on, spans are sampled per trace with TRACING_SAMPLE_RATE and exported
+in batches from a background thread, to a JSON lines file or an OTLP collector.
+The OpenTelemetry packages are only imported when tracing is enabled.
+"""
+import functools
+import os
+
+from utils.logger import LOG
+
+_tracer = None
+_provider = None
+
+
+class _NoopSpan:
+    """
+    Stand-in for a span when tracing is off, also usable as a context manager
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, attributes):
+        pass
+
+    def is_recording(self):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def tracing_enabled():
+    return _tracer is not None
+
+
+def _create_exporter(exporter):
+    if exporter == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        # Endpoint and headers come from the standard OTEL_EXPORTER_OTLP_* variables
+        return OTLPSpanExporter()
+    if exporter == "file":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+        path = os.getenv("TRACING_FILE_PATH", "logs/traces.jsonl")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        return ConsoleSpanExporter(
+            out=open(path, "a", encoding="utf-8"),
+            formatter=lambda span: span.to_json(indent=None) + "\n",
+        )
+    if exporter == "console":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+        return ConsoleSpanExporter()
+    raise ValueError(f"Unknown TRACING_EXPORTER {exporter}")
+
+
+def configure_tracing(enabled=None, sample_rate=None, exporter=None, span_processor=None):
+    """
+    Set up the tracer provider from TRACING_* settings
+    :param enabled: overrides TRACING_ENABLED
+    :param sample_rate: share of traces recorded, overrides TRACING_SAMPLE_RATE
+    :param exporter: file | otlp | console, overrides TRACING_EXPORTER
+    :param span_processor: use this processor instead of a batch exporter, e.g. in tests
+    :return: True if tracing is on
+    """
+    global _tracer, _provider
+    if enabled is None:
+        enabled = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+    if not enabled:
+        _tracer = None
+        return False
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    if sample_rate is None:
+        sample_rate = float(os.getenv("TRACING_SAMPLE_RATE", "0.1"))
+    if span_processor is None:
+        span_processor = BatchSpanProcessor(_create_exporter(exporter or os.getenv("TRACING_EXPORTER", "file")))
+
+    # Child spans follow the decision taken for the whole turn, so a trace is never partial
+    provider = TracerProvider(
+        sampler=ParentBased(TraceIdRatioBased(sample_rate)),
+        resource=Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", "language-mentor")}),
+    )
+    provider.add_span_processor(span_processor)
+    if _provider is not None:
+        _provider.shutdown()
+    _provider = provider
+    _tracer = provider.get_tracer("language_mentor")
+    LOG.info(f"[Tracing] enabled, sampling {sample_rate:.0%} of turns")
+    return True
+
+
+def shutdown_tracing():
+    """
+    Flush pending spans and turn tracing off
+    """
+    global _tracer, _provider
+    if _provider is not None:
+        _provider.shutdown()
+    _tracer = None
+    _provider = None
+
+
+def _record_error(span, error):
+    from opentelemetry.trace import Status, StatusCode
+
+    span.record_exception(error)
+    span.set_status(Status(StatusCode.ERROR, type(error).__name__))
+
+
+class _Span:
+    """
+    A span that is the current span while the ``with`` block runs
+    """
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.span = None
+        self.token = None
+
+    def __enter__(self):
+        from opentelemetry import context, trace
+
+        self.span = _tracer.start_span(self.name, attributes=self.attributes)
+        self.token = context.attach(trace.set_span_in_context(self.span))
+        return self.span
+
+    def __exit__(self, exc_type, error, traceback):
+        from opentelemetry import context
+
+        if error is not None and self.span.is_recording():
+            _record_error(self.span, error)
+        context.detach(self.token)
+        self.span.end()
+        return False
+
+
+def span(name, attributes=None):
+    """
+    Trace a block of code that does not yield
+    :param name:
+    :param attributes: initial span attributes
+    :return: context manager giving the span, or NOOP_SPAN when tracing is off
+    """
+    if _tracer is None:
+        return NOOP_SPAN
+    return _Span(name, attributes)
+
+
+def current_span():
+    """
+    The span of the code running now
+    :return: span, or NOOP_SPAN when tracing is off
+    """
+    if _tracer is None:
+        return NOOP_SPAN
+    from opentelemetry import trace
+
+    return trace.get_current_span()
+
+
+def set_attributes(attributes):
+    """
+    Add attributes to the current span
+    :param attributes: dict
+    """
+    if _tracer is not None:
+        current_span().set_attributes(attributes)
+
+
+async def _traced_stream(name, stream, attributes):
+    from opentelemetry import context, trace
+
+    current = _tracer.start_span(name, attributes=attributes)
+    span_context = trace.set_span_in_context(current)
+    try:
+        while True:
+            # Attached only while the stream runs: Gradio may resume a generator from another
+            # task, and a context attached across a yield could not be detached there
+            token = context.attach(span_context)
+            try:
+                chunk = await stream.__anext__()
+            except StopAsyncIteration:
+                break
+            finally:
+                context.detach(token)
+            yield chunk
+    except BaseException as e:
+        if not isinstance(e, GeneratorExit) and current.is_recording():
+            _record_error(current, e)
+        close = getattr(stream, "aclose", None)
+        if close is not None:
+            await close()
+        raise
+    finally:
+        current.end()
+
+
+def _traced_iter(name, iterator, attributes):
+    from opentelemetry import context, trace
+
+    current = _tracer.start_span(name, attributes=attributes)
+    span_context = trace.set_span_in_context(current)
+    try:
+        while True:
+            token = context.attach(span_context)
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                context.detach(token)
+            yield chunk
+    except BaseException as e:
+        if not isinstance(e, GeneratorExit) and current.is_recording():
+            _record_error(current, e)
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+        raise
+    finally:
+        current.end()
+
+
+def traced_stream(name, stream, attributes=None):
+    """
+    Trace an async generator from its first to its last chunk. The span is current
+    while the generator runs, so spans it starts are its children
+    :param name:
+    :param stream: async generator
+    :param attributes: initial span attributes
+    :return: async generator of the same chunks
+    """
+    if _tracer is None:
+        return stream
+    return _traced_stream(name, stream, attributes)
+
+
+def traced_iter(name, iterator, attributes=None):
+    """
+    Sync version of traced_stream
+    """
+    if _tracer is None:
+        return iterator
+    return _traced_iter(name, iter(iterator), attributes)
+
+
+def traced(name, attributes=None):
+    """
+    Decorator tracing each call of a function, coroutine function or (async) generator function
+    :param name: span name
+    :param attributes: callable(*args, **kwargs) -> dict of span attributes, called only when tracing is on
+    """
+    def decorator(fn):
+        import inspect
+
+        def span_attributes(args, kwargs):
+            return attributes(*args, **kwargs) if attributes is not None else None
+
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if _tracer is None:
+                    return fn(*args, **kwargs)
+                return _traced_stream(name, fn(*args, **kwargs), span_attributes(args, kwargs))
+        elif inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if _tracer is None:
+                    return fn(*args, **kwargs)
+                return _traced_iter(name, fn(*args, **kwargs), span_attributes(args, kwargs))
+        elif inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                if _tracer is None:
+                    return await fn(*args, **kwargs)
+                with _Span(name, span_attributes(args, kwargs)):
+                    return await fn(*args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if _tracer is None:
+                    return fn(*args, **kwargs)
+                with _Span(name, span_attributes(args, kwargs)):
+                    return fn(*args, **kwargs)
+        return wrapper
+    return decorator